@@ -0,0 +1,117 @@
+"""Compare request throughput of the ASGI instrumentation middleware with
+the `@app.middleware("http")` version it replaces.
+
+Builds the same small FastAPI app three ways (no metrics, the old
+`BaseHTTPMiddleware` function and `InstrumentationMiddleware`) and calls
+each directly as an ASGI app, without a server or sockets. What is left is
+the cost of the application stack itself, which is where the middleware
+overhead shows.
+
+Usage:
+    python golden-paths/common/python/benchmarks/instrumentation_benchmark.py --requests 20000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from fastapi import FastAPI, Request
+from prometheus_client import Counter, Histogram
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "instrumentation"))
+from instrumentation import InstrumentationMiddleware  # noqa: E402
+
+LEGACY_COUNT = Counter('legacy_http_requests_total', 'Total HTTP requests', ['method', 'endpoint', 'status'])
+LEGACY_LATENCY = Histogram('legacy_http_request_duration_seconds', 'HTTP request latency', ['method', 'endpoint'])
+
+
+def build_app(variant: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        return {"item_id": item_id}
+
+    if variant == "base_http_middleware":
+        @app.middleware("http")
+        async def metrics_middleware(request: Request, call_next):
+            import time
+            start = time.time()
+            response = await call_next(request)
+            duration = time.time() - start
+            LEGACY_COUNT.labels(method=request.method, endpoint=request.url.path, status=response.status_code).inc()
+            LEGACY_LATENCY.labels(method=request.method, endpoint=request.url.path).observe(duration)
+            return response
+    elif variant == "asgi_middleware":
+        app.add_middleware(InstrumentationMiddleware)
+    return app
+
+
+async def call(app: FastAPI, path: str) -> None:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+
+    sent_body = False
+
+    async def receive():
+        # Like a server: the body once, then block until the client disconnects
+        nonlocal sent_body
+        if not sent_body:
+            sent_body = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def measure(app: FastAPI, requests: int, concurrency: int) -> float:
+    """Return requests per second for `requests` calls, `concurrency` at a time."""
+    # Warm up routing, label children and the middleware stack
+    for i in range(200):
+        await call(app, f"/items/{i}")
+
+    async def worker(offset: int) -> None:
+        for i in range(offset, requests, concurrency):
+            await call(app, f"/items/{i}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(offset) for offset in range(concurrency)))
+    return requests / (time.perf_counter() - start)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=3, help="Best of this many runs per variant")
+    args = parser.parse_args()
+
+    results = {}
+    for variant in ("no_middleware", "base_http_middleware", "asgi_middleware"):
+        app = build_app(variant)
+        results[variant] = max([await measure(app, args.requests, args.concurrency) for _ in range(args.rounds)])
+
+    baseline = results["base_http_middleware"]
+    print(f"{'variant':>22} {'req/s':>10} {'vs @app.middleware':>20}")
+    for variant, rps in results.items():
+        print(f"{variant:>22} {rps:>10.0f} {(rps / baseline - 1) * 100:>+19.1f}%")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
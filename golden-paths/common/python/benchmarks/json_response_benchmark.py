@@ -0,0 +1,181 @@
+"""Compare FastAPI's default JSON response with `FastJSONResponse`.
+
+Builds the same app three ways: FastAPI's default `JSONResponse`, and
+`FastJSONResponse` as `default_response_class` with the standard library
+fallback and with orjson. Each is called directly as an ASGI app, without
+a server or sockets, on these routes:
+
+- `/health`: a small dict, like a probe endpoint
+- `/items`: a dict with a list of `--items` rows
+- `/items/direct`: the same list, returned as `FastJSONResponse(payload)`
+  by the `FastJSONResponse` variants so FastAPI's `jsonable_encoder` pass
+  is skipped. This is where large payloads spend most of their time.
+- `/chat`: a pydantic model with `response_model=`, like the RAG `/chat`.
+  The `FastJSONResponse` variants return `FastJSONResponse(model)` so the
+  model is serialized by pydantic without the encoder pass.
+
+The responses are checked to decode to the same JSON before timing.
+
+Usage:
+    python golden-paths/common/python/benchmarks/json_response_benchmark.py --requests 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "responses"))
+import responses  # noqa: E402
+from responses import FastJSONResponse  # noqa: E402
+
+CREATED_AT = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class ChatResponse(BaseModel):
+    answer: str
+    sources: list[dict]
+    conversation_id: str
+
+
+def make_items(count: int) -> list[dict]:
+    return [
+        {
+            "id": i,
+            "name": f"item {i}",
+            "description": "An item with a description of typical length for a list view.",
+            "price": i * 1.25,
+            "tags": ["alpha", "beta"],
+            "created_at": CREATED_AT,
+        }
+        for i in range(count)
+    ]
+
+
+def make_chat_response() -> ChatResponse:
+    return ChatResponse(
+        answer="The service indexes uploaded documents and answers questions about them. " * 8,
+        sources=[
+            {"title": f"handbook.pdf#{i}", "content": "Relevant passage from the handbook. " * 10, "score": 0.9 - i / 100}
+            for i in range(10)
+        ],
+        conversation_id="0b9e6c1a-4d3f-4a8e-9d61-2f5c7b1e8a90",
+    )
+
+
+def build_app(variant: str, item_count: int) -> FastAPI:
+    fast = variant != "JSONResponse"
+    app = FastAPI(default_response_class=FastJSONResponse if fast else JSONResponse)
+    items = make_items(item_count)
+    chat_response = make_chat_response()
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "timestamp": CREATED_AT}
+
+    @app.get("/items")
+    async def list_items():
+        return {"items": items, "next_cursor": None}
+
+    @app.get("/items/direct")
+    async def list_items_direct():
+        payload = {"items": items, "next_cursor": None}
+        return FastJSONResponse(payload) if fast else payload
+
+    @app.get("/chat", response_model=ChatResponse)
+    async def chat():
+        return FastJSONResponse(chat_response) if fast else chat_response
+
+    return app
+
+
+async def call(app: FastAPI, path: str) -> bytes:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+    body = bytearray()
+    sent_body = False
+
+    async def receive():
+        # Like a server: the body once, then block until the client disconnects
+        nonlocal sent_body
+        if not sent_body:
+            sent_body = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.extend(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return bytes(body)
+
+
+def use_backend(variant: str) -> None:
+    responses.dumps = responses._stdlib_dumps if variant == "FastJSONResponse/json" else responses._orjson_dumps
+
+
+async def measure(app: FastAPI, path: str, requests: int) -> float:
+    """Return requests per second for `requests` sequential calls."""
+    for _ in range(50):
+        await call(app, path)
+    start = time.perf_counter()
+    for _ in range(requests):
+        await call(app, path)
+    return requests / (time.perf_counter() - start)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000, help="Calls per route and variant (a tenth for the lists)")
+    parser.add_argument("--items", type=int, default=1000, help="Rows in the /items payload")
+    parser.add_argument("--rounds", type=int, default=3, help="Best of this many runs per variant")
+    args = parser.parse_args()
+
+    variants = ["JSONResponse", "FastJSONResponse/json"]
+    if responses.orjson is not None:
+        variants.append("FastJSONResponse/orjson")
+    else:
+        print("orjson is not installed; only the standard library fallback is measured")
+    apps = {variant: build_app(variant, args.items) for variant in variants}
+    list_requests = max(args.requests // 10, 1)
+    routes = {"/health": args.requests, "/items": list_requests, "/items/direct": list_requests, "/chat": args.requests}
+
+    for path in routes:
+        bodies = set()
+        for variant, app in apps.items():
+            use_backend(variant)
+            bodies.add(json.dumps(json.loads(await call(app, path)), sort_keys=True))
+        if len(bodies) != 1:
+            raise SystemExit(f"{path}: the variants returned different JSON")
+
+    print(f"{'route':>14} {'variant':>24} {'req/s':>10} {'vs JSONResponse':>16}")
+    for path, requests in routes.items():
+        baseline = None
+        for variant, app in apps.items():
+            use_backend(variant)
+            rps = max([await measure(app, path, requests) for _ in range(args.rounds)])
+            baseline = baseline or rps
+            print(f"{path:>14} {variant:>24} {rps:>10.0f} {(rps / baseline - 1) * 100:>+15.1f}%")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
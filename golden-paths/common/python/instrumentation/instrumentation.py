@@ -0,0 +1,183 @@
+"""HTTP request instrumentation shared by the Python service templates.
+
+`InstrumentationMiddleware` is plain ASGI rather than
+`@app.middleware("http")`. Starlette's `BaseHTTPMiddleware` runs every
+request in an extra task and re-streams the response through memory
+streams, which costs throughput on small, fast endpoints. This middleware
+only wraps `send` to see the status and body sizes.
+
+Requests are labelled with the route template (`/items/{item_id}`), not
+the raw path, so the number of time series stays bounded by the number of
+routes. Paths that match no route share one `unmatched` label, and a cap on
+distinct templates sends anything beyond it to `overflow`. Label children
+are looked up once per method, route and status and then reused.
+
+With several worker processes, set `PROMETHEUS_MULTIPROC_DIR` to an empty
+directory shared by the workers; each worker then writes its samples there
+and `MetricsExporter` aggregates them.
+
+This file is copied into each generated service from
+golden-paths/common/python/instrumentation.
+"""
+import os
+import threading
+import time
+from typing import Any
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+UNMATCHED = "unmatched"
+OVERFLOW = "overflow"
+METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+REQUEST_COUNT = Counter('http_requests_total', 'Total HTTP requests', ['method', 'endpoint', 'status'])
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'HTTP request latency', ['method', 'endpoint'])
+REQUEST_SIZE = Histogram(
+    'http_request_size_bytes',
+    'HTTP request body size, from Content-Length',
+    ['method', 'endpoint'],
+    buckets=SIZE_BUCKETS,
+)
+RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes',
+    'HTTP response body size',
+    ['method', 'endpoint'],
+    buckets=SIZE_BUCKETS,
+)
+
+
+class LabelLimiter:
+    """Caps the distinct values of a label, mapping new ones to `overflow`."""
+
+    def __init__(self, max_values: int = 200):
+        """Initialize the limiter with room for `max_values` distinct values."""
+        self.max_values = max_values
+        self._seen: set[str] = set()
+
+    def __call__(self, value: str) -> str:
+        if value in self._seen:
+            return value
+        if len(self._seen) >= self.max_values:
+            return OVERFLOW
+        self._seen.add(value)
+        return value
+
+
+def route_template(scope: Scope) -> str:
+    """Return the path template of the route that handled the request in `scope`."""
+    route = scope.get("route")
+    if route is not None:
+        return str(route.path)
+    # Plain Starlette routes (docs, mounts) do not record themselves in the scope
+    app = scope.get("app")
+    if app is None:
+        return UNMATCHED
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return str(getattr(route, "path", UNMATCHED))
+    return UNMATCHED
+
+
+class _RequestMetrics:
+    """The label children for one method, route and status."""
+
+    __slots__ = ("count", "latency", "request_size", "response_size")
+
+    def __init__(self, method: str, endpoint: str, status: int):
+        self.count = REQUEST_COUNT.labels(method=method, endpoint=endpoint, status=status)
+        self.latency = REQUEST_LATENCY.labels(method=method, endpoint=endpoint)
+        self.request_size = REQUEST_SIZE.labels(method=method, endpoint=endpoint)
+        self.response_size = RESPONSE_SIZE.labels(method=method, endpoint=endpoint)
+
+
+class InstrumentationMiddleware:
+    """Records count, latency, status and body sizes of every HTTP request."""
+
+    def __init__(self, app: ASGIApp, max_endpoints: int = 200):
+        """Wrap `app`, keeping at most `max_endpoints` distinct endpoint labels."""
+        self.app = app
+        self.endpoint_label = LabelLimiter(max_endpoints)
+        self._children: dict[tuple[str, str, int], _RequestMetrics] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        response_size = 0
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, response_size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            method = scope["method"] if scope["method"] in METHODS else "other"
+            key = (method, route_template(scope), status)
+            children = self._children.get(key)
+            if children is None:
+                children = self._children[key] = _RequestMetrics(method, self.endpoint_label(key[1]), status)
+            children.count.inc()
+            children.latency.observe(duration)
+            children.request_size.observe(_content_length(scope))
+            children.response_size.observe(response_size)
+
+
+def _content_length(scope: Scope) -> int:
+    for name, value in scope["headers"]:
+        if name == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return 0
+    return 0
+
+
+class MetricsExporter:
+    """Renders `/metrics`, reusing the output for `cache_seconds`.
+
+    Rendering walks every time series, so concurrent or frequent scrapes
+    share one rendering instead of each paying for it.
+    """
+
+    def __init__(self, cache_seconds: float = 1.0):
+        """Initialize the exporter, aggregating across workers in multiprocess mode."""
+        self.cache_seconds = cache_seconds
+        self.content_type = CONTENT_TYPE_LATEST
+        self._lock = threading.Lock()
+        self._body: bytes | None = None
+        self._rendered_at = 0.0
+
+        self.registry: Any = REGISTRY
+        if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+            self.registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(self.registry)  # type: ignore[no-untyped-call]
+
+    def render(self) -> bytes:
+        """Return the exposition text, rendering it at most once per interval."""
+        with self._lock:
+            now = time.monotonic()
+            if self._body is None or now - self._rendered_at >= self.cache_seconds:
+                self._body = generate_latest(self.registry)
+                self._rendered_at = now
+            return self._body
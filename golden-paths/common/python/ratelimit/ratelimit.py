@@ -0,0 +1,283 @@
+"""Rate limiting and load shedding shared by the Python service templates.
+
+`RateLimitMiddleware` protects a service from overload in two ways:
+
+- Per-client token buckets. Each client (by default the client address;
+  run uvicorn with `--proxy-headers` behind an ingress) may send `rate`
+  requests per second with bursts of up to `burst`. The buckets live in
+  the process (`InMemoryRateLimiter`) or in Redis (`RedisRateLimiter`),
+  where one Lua script refills and takes a token atomically so every
+  replica shares the same budget. Clients over their rate get a 429.
+- A concurrency cap for the whole process (`ConcurrencyLimiter`). Requests
+  beyond it wait in a FIFO queue, but only while the expected wait stays
+  under `queue_target`. A request that would wait longer is rejected with
+  a 503 at once, so a spike costs the excess requests a fast retry
+  instead of making every request slow.
+
+Both rejections carry `Retry-After`. Health, readiness and metrics paths
+are exempt so probes keep working under load.
+
+This file is copied into each generated service from
+golden-paths/common/python/ratelimit.
+"""
+import asyncio
+import json
+import logging
+import math
+import time
+from collections import OrderedDict, deque
+from collections.abc import Callable, Iterable
+from typing import Any
+
+from prometheus_client import Counter, Gauge, Histogram
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXEMPT_PATHS = ("/health", "/ready", "/metrics")
+
+ADMISSIONS = Counter('http_admission_total', 'Requests accepted or rejected by load protection', ['outcome'])
+IN_FLIGHT = Gauge('http_requests_in_flight', 'Requests holding a concurrency slot', multiprocess_mode='livesum')
+QUEUE_WAIT = Histogram(
+    'http_request_queue_seconds',
+    'Time requests waited for a concurrency slot',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+BACKEND_ERRORS = Counter(
+    'http_rate_limit_backend_errors_total',
+    'Rate limit checks let through because the backend failed',
+)
+
+# KEYS[1]: bucket; ARGV: rate per second, burst. Returns the seconds to wait, 0 when a token was taken.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class InMemoryRateLimiter:
+    """Token buckets per client, kept in this process.
+
+    Each replica counts on its own, so with N replicas a client gets up to
+    N times the rate. The least recently seen clients are forgotten beyond
+    `max_clients`.
+    """
+
+    def __init__(self, rate: float, burst: int, max_clients: int = 100_000):
+        """Allow `rate` requests per second per client, in bursts of up to `burst`."""
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def acquire(self, key: str) -> float:
+        """Take a token for `key`; return 0, or the seconds until one is available."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return wait
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisRateLimiter:
+    """Token buckets per client in Redis, shared by every replica.
+
+    Takes a `redis.asyncio` compatible client. The bucket is updated by a
+    Lua script, so concurrent requests from one client cannot both take the
+    last token, and the clock is Redis's own. If Redis fails, requests are
+    let through rather than rejected.
+    """
+
+    def __init__(self, client: Any, rate: float, burst: int, key_prefix: str = "ratelimit:"):
+        """Allow `rate` requests per second per client, in bursts of up to `burst`."""
+        self.client = client
+        self.rate = rate
+        self.burst = burst
+        self.key_prefix = key_prefix
+        self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    @classmethod
+    def from_url(cls, url: str, rate: float, burst: int, **kwargs: Any) -> "RedisRateLimiter":
+        """Create a limiter with a pooled client for `url`."""
+        from redis.asyncio import Redis
+
+        return cls(Redis.from_url(url), rate, burst, **kwargs)
+
+    async def acquire(self, key: str) -> float:
+        """Take a token for `key`; return 0, or the seconds until one is available."""
+        try:
+            return float(await self._script(keys=[self.key_prefix + key], args=[self.rate, self.burst]))
+        except Exception as e:
+            # An unavailable limiter must not take the service down with it
+            BACKEND_ERRORS.inc()
+            logger.debug(f"Rate limit check failed, letting the request through: {e}")
+            return 0.0
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+class ConcurrencyLimiter:
+    """Caps requests in flight, queueing the excess only while it is worth it.
+
+    The expected wait for a new request is the queue length times the
+    average time a request holds its slot, divided by the slots. Requests
+    whose expected wait exceeds `queue_target`, that find `max_queue`
+    requests already waiting, or that are still queued after `queue_target`
+    are rejected.
+    """
+
+    def __init__(self, max_concurrency: int = 100, queue_target: float = 0.5, max_queue: int | None = None):
+        """Initialize the limiter; `max_queue` defaults to twice `max_concurrency`."""
+        self.max_concurrency = max_concurrency
+        self.queue_target = queue_target
+        self.max_queue = max_queue if max_queue is not None else 2 * max_concurrency
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future[None]] = deque()
+        self._average_duration = 0.0
+
+    def expected_wait(self) -> float:
+        """Seconds a request arriving now would likely wait for a slot."""
+        return (len(self._waiters) + 1) * self._average_duration / self.max_concurrency
+
+    async def acquire(self) -> float:
+        """Take a slot; return 0, or the seconds a rejected client should wait."""
+        if self.in_flight < self.max_concurrency and not self._waiters:
+            self._enter()
+            return 0.0
+        expected_wait = self.expected_wait()
+        if expected_wait > self.queue_target or len(self._waiters) >= self.max_queue:
+            return max(expected_wait, self.queue_target)
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        start = time.monotonic()
+        try:
+            # Shielded so a timeout leaves the future to be checked below
+            await asyncio.wait_for(asyncio.shield(future), self.queue_target)
+        except (TimeoutError, asyncio.CancelledError) as e:
+            handed_over = future.done() and not future.cancelled()
+            if not handed_over:
+                future.cancel()
+                if future in self._waiters:
+                    self._waiters.remove(future)
+            if isinstance(e, asyncio.CancelledError):
+                if handed_over:
+                    self._release()
+                raise
+            if not handed_over:
+                return max(self.expected_wait(), self.queue_target)
+        QUEUE_WAIT.observe(time.monotonic() - start)
+        return 0.0
+
+    def release(self, duration: float) -> None:
+        """Give back a slot held for `duration` seconds."""
+        self._average_duration += (duration - self._average_duration) * 0.1
+        self._release()
+
+    def _enter(self) -> None:
+        self.in_flight += 1
+        IN_FLIGHT.set(self.in_flight)
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        # Hand freed slots straight to waiters, in arrival order
+        while self._waiters and self.in_flight < self.max_concurrency:
+            future = self._waiters.popleft()
+            if not future.done():
+                self._enter()
+                future.set_result(None)
+        IN_FLIGHT.set(self.in_flight)
+
+
+def client_address(scope: Scope) -> str:
+    """Key requests by client address."""
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class RateLimitMiddleware:
+    """Rejects requests over a client's rate (429) or the concurrency cap (503)."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        rate_limiter: Any | None = None,
+        concurrency_limiter: ConcurrencyLimiter | None = None,
+        exempt_paths: Iterable[str] = DEFAULT_EXEMPT_PATHS,
+        key_func: Callable[[Scope], str] = client_address,
+    ):
+        """Wrap `app`; either limiter may be left out."""
+        self.app = app
+        self.rate_limiter = rate_limiter
+        self.concurrency_limiter = concurrency_limiter
+        self.exempt_paths = frozenset(exempt_paths)
+        self.key_func = key_func
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        if self.rate_limiter is not None:
+            wait = await self.rate_limiter.acquire(self.key_func(scope))
+            if wait > 0:
+                ADMISSIONS.labels(outcome="rate_limited").inc()
+                await _reject(send, 429, "Too many requests", wait)
+                return
+
+        if self.concurrency_limiter is None:
+            ADMISSIONS.labels(outcome="accepted").inc()
+            await self.app(scope, receive, send)
+            return
+
+        wait = await self.concurrency_limiter.acquire()
+        if wait > 0:
+            ADMISSIONS.labels(outcome="shed").inc()
+            await _reject(send, 503, "Service is overloaded, retry later", wait)
+            return
+        ADMISSIONS.labels(outcome="accepted").inc()
+        start = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.concurrency_limiter.release(time.monotonic() - start)
+
+
+async def _reject(send: Send, status: int, detail: str, retry_after: float) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
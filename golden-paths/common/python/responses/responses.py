@@ -0,0 +1,69 @@
+"""Fast JSON responses shared by the Python service templates.
+
+`FastJSONResponse` is a drop-in `JSONResponse` for `default_response_class`.
+It serializes with orjson when it is installed and falls back to the
+standard library otherwise, producing the same compact JSON either way with
+one exception: non-finite floats (NaN, infinities) are written as `null` by
+orjson, while the standard library raises `ValueError` for them, as
+Starlette's `JSONResponse` does. Do not rely on either behavior; convert
+such values before returning them.
+
+FastAPI still runs `jsonable_encoder` on what a route returns before the
+response class sees it, and for large payloads that pass costs far more
+than the serialization itself. Routes that return big lists or pydantic
+models skip it by returning `FastJSONResponse(content)` themselves. Models
+are then written straight from pydantic's core serializer. Everything else
+goes to orjson, which handles datetimes, UUIDs and dataclasses natively.
+Keep `response_model=` on the route so the OpenAPI schema stays the same.
+`benchmarks/json_response_benchmark.py` measures the difference.
+
+This file is copied into each generated service from
+golden-paths/common/python/responses.
+"""
+import json
+from collections.abc import Callable
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    # The optional dependency is missing; callers check for None
+    orjson = None  # type: ignore[assignment]
+
+
+def _default(value: Any) -> Any:
+    # Anything the serializer does not know natively (models inside dicts, sets, Decimal...)
+    return jsonable_encoder(value)
+
+
+def _orjson_dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _stdlib_dumps(content: Any) -> bytes:
+    # The same settings as Starlette's JSONResponse
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+        default=_default,
+    ).encode("utf-8")
+
+
+dumps: Callable[[Any], bytes] = _orjson_dumps if orjson is not None else _stdlib_dumps
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson, or the standard library without it."""
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return content.__pydantic_serializer__.to_json(content, by_alias=True)
+        return dumps(content)
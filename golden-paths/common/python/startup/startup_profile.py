@@ -0,0 +1,246 @@
+"""Profile how long a generated service takes to start.
+
+Everything runs in fresh interpreters, so nothing is already imported:
+
+- Interpreter: `python -c pass`, the floor no service can go below.
+- Imports: `python -X importtime -c "import <module>"`, summed per
+  top-level package so a heavy SDK shows up as one line however many
+  submodules it loads. The service's own package is listed per module.
+- Time to healthy: uvicorn is started on a free port and the health path
+  polled until it answers 200. uvicorn finishes the lifespan startup before
+  it accepts connections, so this is what a readiness probe (and an HPA
+  scale-out) waits for. What is left after the interpreter and the imports
+  is uvicorn itself and the lifespan.
+
+Each measurement is repeated `--runs` times and the median reported. The
+results are written to a JSON file; pass an earlier file with `--compare`
+to see what changed, and `--max-regression` to exit with status 1 when the
+imports or time to healthy got slower by more than that fraction, so CI can
+guard cold-start time.
+
+Usage (from the service directory, with its settings in the environment):
+    python benchmarks/startup_profile.py src.main:app --runs 5 --output startup.json
+    python benchmarks/startup_profile.py src.main:app --compare startup.json --max-regression 0.2
+    python benchmarks/startup_profile.py app.main:app --app-dir src
+    python benchmarks/startup_profile.py src.main:app --app-env RETRIEVER_BACKEND=local
+
+This file is copied into each generated service from
+golden-paths/common/python/startup.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from typing import Any
+
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|\s*(\S+)")
+# Settings whose values are not written to the results file
+SECRET_MARKERS = ("KEY", "SECRET", "TOKEN", "PASSWORD", "CREDENTIAL", "CONNECTION_STRING")
+URL_PASSWORD = re.compile(r"(://[^:/@]*:)[^@]*@")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+def time_interpreter(python: str, cwd: str, env: dict[str, str]) -> float:
+    """Return the seconds a bare interpreter takes to start and exit."""
+    start = time.perf_counter()
+    subprocess.run([python, "-c", "pass"], cwd=cwd, env=env, check=True)
+    return time.perf_counter() - start
+
+
+def profile_imports(python: str, module: str, cwd: str, env: dict[str, str]) -> dict[str, float]:
+    """Return import seconds per package for importing `module` in a fresh interpreter."""
+    process = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    if process.returncode != 0:
+        errors = [line for line in process.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError(f"import {module} failed:\n" + "\n".join(errors[-20:]))
+
+    own_package = module.split(".")[0]
+    packages: dict[str, float] = {}
+    for line in process.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match is None:
+            continue
+        name = match[3]
+        # Self times add up to the total without counting nested imports twice
+        package = name if name.split(".")[0] == own_package else name.split(".")[0]
+        packages[package] = packages.get(package, 0.0) + int(match[1]) / 1_000_000
+    return packages
+
+
+def time_to_healthy(
+    python: str, app: str, cwd: str, env: dict[str, str], health_path: str, log_path: str, timeout: float,
+) -> float:
+    """Start uvicorn and return the seconds until `health_path` first answers 200."""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}{health_path}"
+    with open(log_path, "wb") as log:
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [python, "-m", "uvicorn", app, "--port", str(port), "--log-level", "warning"],
+            cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+        try:
+            while time.perf_counter() - start < timeout:
+                if process.poll() is not None:
+                    raise RuntimeError(f"{app} exited with code {process.returncode}, see {log_path}")
+                try:
+                    with urllib.request.urlopen(url, timeout=1.0) as response:
+                        if response.status == 200:
+                            return time.perf_counter() - start
+                except (urllib.error.URLError, ConnectionError, OSError):
+                    pass
+                time.sleep(0.005)
+            raise RuntimeError(f"{url} was not healthy after {timeout}s, see {log_path}")
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def summarize(runs: list[dict[str, Any]]) -> dict[str, Any]:
+    """Median of every measurement over the runs."""
+    packages = {name for run in runs for name in run["packages"]}
+    return {
+        "interpreter_seconds": statistics.median(run["interpreter_seconds"] for run in runs),
+        "import_seconds": statistics.median(sum(run["packages"].values()) for run in runs),
+        "healthy_seconds": statistics.median(run["healthy_seconds"] for run in runs),
+        "packages": {
+            name: statistics.median(run["packages"].get(name, 0.0) for run in runs)
+            for name in sorted(packages)
+        },
+    }
+
+
+def print_summary(summary: dict[str, Any], module: str, top: int) -> None:
+    rest = summary["healthy_seconds"] - summary["interpreter_seconds"] - summary["import_seconds"]
+    print(f"{'interpreter':>24} {summary['interpreter_seconds'] * 1000:>9.1f} ms")
+    print(f"{'import ' + module:>24} {summary['import_seconds'] * 1000:>9.1f} ms")
+    print(f"{'uvicorn + lifespan':>24} {max(rest, 0.0) * 1000:>9.1f} ms")
+    print(f"{'time to healthy':>24} {summary['healthy_seconds'] * 1000:>9.1f} ms")
+
+    print(f"\nSlowest imports (of {summary['import_seconds'] * 1000:.1f} ms):")
+    packages = sorted(summary["packages"].items(), key=lambda item: item[1], reverse=True)
+    for name, seconds in packages[:top]:
+        share = seconds / summary["import_seconds"] * 100 if summary["import_seconds"] else 0.0
+        print(f"{name:>40} {seconds * 1000:>9.1f} ms {share:>5.1f}%")
+
+
+def compare(summary: dict[str, Any], baseline_path: str, max_regression: float | None) -> bool:
+    """Print changes against an earlier results file; return False on a regression."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["summary"]
+    print(f"\nCompared with {baseline_path}:")
+    ok = True
+    for key in ("interpreter_seconds", "import_seconds", "healthy_seconds"):
+        old, new = baseline[key], summary[key]
+        change = (new - old) / old if old else 0.0
+        regressed = max_regression is not None and key != "interpreter_seconds" and change > max_regression
+        ok = ok and not regressed
+        marker = "  REGRESSION" if regressed else ""
+        print(f"{key:>24} {old * 1000:>9.1f} -> {new * 1000:>9.1f} ms ({change * 100:+.1f}%){marker}")
+
+    # New or slower packages usually mean a heavy SDK is imported eagerly again
+    grown = [
+        (name, baseline["packages"].get(name, 0.0), seconds)
+        for name, seconds in summary["packages"].items()
+        if seconds - baseline["packages"].get(name, 0.0) > 0.005
+    ]
+    if grown:
+        print("\nImports that grew by more than 5 ms:")
+        for name, old, new in sorted(grown, key=lambda item: item[2] - item[1], reverse=True):
+            print(f"{name:>40} {old * 1000:>9.1f} -> {new * 1000:>9.1f} ms")
+    return ok
+
+
+def redact(env: dict[str, str]) -> dict[str, str]:
+    """Hide secret settings and URL passwords before they are saved."""
+    return {
+        name: "***" if any(marker in name.upper() for marker in SECRET_MARKERS) else URL_PASSWORD.sub(r"\1***@", value)
+        for name, value in env.items()
+    }
+
+
+def git_revision(cwd: str) -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=cwd, stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("app", help="ASGI app as module:attribute, e.g. src.main:app")
+    parser.add_argument("--app-dir", default=".", help="Directory the app is imported from")
+    parser.add_argument("--app-env", nargs="*", default=[], metavar="KEY=VALUE", help="Extra app settings")
+    parser.add_argument("--health-path", default="/health")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Packages to list in the import breakdown")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for the app to become healthy")
+    parser.add_argument("--python", default=sys.executable, help="Interpreter of the service's environment")
+    parser.add_argument("--output", default="startup-profile.json")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--max-regression", type=float, help="Fail when a median got slower by more than this fraction")
+    args = parser.parse_args()
+
+    module = args.app.split(":")[0]
+    cwd = os.path.abspath(args.app_dir)
+    app_env = dict(item.split("=", 1) for item in args.app_env)
+    env = {**os.environ, **app_env}
+    scratch = tempfile.mkdtemp(prefix="startup-profile-")
+
+    runs: list[dict[str, Any]] = []
+    for i in range(args.runs):
+        runs.append({
+            "interpreter_seconds": time_interpreter(args.python, cwd, env),
+            "packages": profile_imports(args.python, module, cwd, env),
+            "healthy_seconds": time_to_healthy(
+                args.python, args.app, cwd, env, args.health_path, os.path.join(scratch, f"app-{i}.log"), args.timeout,
+            ),
+        })
+        print(f"run {i + 1}/{args.runs}: healthy after {runs[-1]['healthy_seconds'] * 1000:.1f} ms", file=sys.stderr)
+    summary = summarize(runs)
+    print_summary(summary, module, args.top)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_revision": git_revision(cwd),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "app_env": redact(app_env),
+            "args": {**vars(args), "app_env": [f"{k}={v}" for k, v in redact(app_env).items()]},
+        },
+        "summary": summary,
+        "runs": runs,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}, app logs in {scratch}")
+
+    if args.compare and not compare(summary, args.compare, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,8 +7,13 @@ from collections.abc import AsyncGenerator
 import structlog
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
+from app.instrumentation import InstrumentationMiddleware
+from app.ratelimit import ConcurrencyLimiter, InMemoryRateLimiter, RateLimitMiddleware
+from app.responses import FastJSONResponse
 from app.routes.health import router as health_router
+from app.routes.metrics import router as metrics_router
 
 logger = structlog.get_logger()
 
@@ -26,9 +31,25 @@ app = FastAPI(
     description="${{ values.description }}",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=(
+        FastJSONResponse if os.getenv("FAST_JSON_RESPONSES", "false").lower() == "true" else JSONResponse
+    ),
 )
 
-# Middleware
+# Middleware (load protection innermost, so rejections still get CORS headers and are counted)
+rate_limit_per_second = float(os.getenv("RATE_LIMIT_PER_SECOND", "0"))
+max_concurrent_requests = int(os.getenv("MAX_CONCURRENT_REQUESTS", "100"))
+app.add_middleware(
+    RateLimitMiddleware,
+    rate_limiter=InMemoryRateLimiter(
+        rate=rate_limit_per_second,
+        burst=int(os.getenv("RATE_LIMIT_BURST", "20")),
+    ) if rate_limit_per_second > 0 else None,
+    concurrency_limiter=ConcurrencyLimiter(
+        max_concurrency=max_concurrent_requests,
+        queue_target=float(os.getenv("QUEUE_TARGET_SECONDS", "0.5")),
+    ) if max_concurrent_requests > 0 else None,
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -36,9 +57,11 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(InstrumentationMiddleware)
 
 # Routes
 app.include_router(health_router)
+app.include_router(metrics_router)
 
 
 @app.get("/api/v1/info")
@@ -0,0 +1,18 @@
+"""Prometheus metrics route."""
+
+from fastapi import APIRouter
+from starlette.responses import Response
+
+from app.instrumentation import MetricsExporter
+
+router = APIRouter()
+exporter = MetricsExporter()
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics() -> Response:
+    """Prometheus metrics endpoint.
+
+    Synchronous so rendering runs in the threadpool, off the event loop.
+    """
+    return Response(content=exporter.render(), media_type=exporter.content_type)
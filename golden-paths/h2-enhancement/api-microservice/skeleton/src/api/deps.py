@@ -0,0 +1,40 @@
+"""Route dependencies."""
+from typing import AsyncIterator
+
+import asyncpg
+from fastapi import HTTPException, Request
+from redis.asyncio import Redis
+
+from ..core.cache import ResponseCache
+from ..core.connections import PostgresPool, RedisPool
+
+
+def get_postgres(request: Request) -> PostgresPool:
+    """Return the PostgreSQL pool, for routes that check out connections themselves.
+
+    Cached routes use this rather than `get_db`, so a cache hit does not
+    hold a connection.
+    """
+    postgres: PostgresPool = request.app.state.postgres
+    if postgres is None:
+        raise HTTPException(status_code=503, detail="Database is not configured")
+    return postgres
+
+
+async def get_db(request: Request) -> AsyncIterator[asyncpg.Connection]:
+    """Check out a PostgreSQL connection for the duration of the request."""
+    async with get_postgres(request).acquire() as connection:
+        yield connection
+
+
+def get_redis(request: Request) -> Redis:
+    """Return the pooled Redis client."""
+    redis: RedisPool = request.app.state.redis
+    if redis is None:
+        raise HTTPException(status_code=503, detail="Redis is not configured")
+    return redis.client
+
+
+def get_cache(request: Request) -> ResponseCache:
+    """Return the response cache, e.g. to invalidate a namespace from a write path."""
+    return request.app.state.cache
@@ -0,0 +1,46 @@
+"""Cursor pagination and NDJSON streaming helpers."""
+import base64
+import binascii
+import json
+from typing import AsyncIterator, Mapping
+
+from fastapi import HTTPException
+
+from ..core.responses import dumps
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def encode_cursor(last_id: int) -> str:
+    """Return the continuation token for the page after `last_id`."""
+    payload = json.dumps({"after": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    """Return the id a continuation token points after; 400 if it is malformed."""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        after = json.loads(payload)["after"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(after, int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return after
+
+
+async def ndjson_chunks(rows: AsyncIterator[Mapping], chunk_bytes: int = 64 * 1024) -> AsyncIterator[bytes]:
+    """Encode rows as newline-delimited JSON, in chunks of about `chunk_bytes`.
+
+    Sending each row as its own body message would cost a write per row;
+    buffering everything would hold the whole result in memory.
+    """
+    buffer = bytearray()
+    async for row in rows:
+        buffer += dumps(dict(row))
+        buffer += b"\n"
+        if len(buffer) >= chunk_bytes:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
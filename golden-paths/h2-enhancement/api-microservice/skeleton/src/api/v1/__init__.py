@@ -1,5 +1,15 @@
 """API v1 router."""
-from fastapi import APIRouter
+from typing import AsyncIterator, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from ...core.cache import cached
+from ...core.config import settings
+from ...core.connections import PostgresPool
+from ...repositories import items
+from ..deps import get_postgres
+from ..pagination import NDJSON_MEDIA_TYPE, decode_cursor, encode_cursor, ndjson_chunks
 
 router = APIRouter()
 
@@ -11,12 +21,45 @@ async def root():
 
 
 @router.get("/items")
-async def list_items():
-    """List all items."""
-    return {"items": []}
+@cached("items", ttl=settings.cache_ttl_seconds)
+async def list_items(
+    cursor: Optional[str] = Query(None, description="`next_cursor` of the previous page"),
+    limit: int = Query(settings.items_page_size, ge=1, le=settings.items_max_page_size),
+    postgres: PostgresPool = Depends(get_postgres),
+):
+    """List items a page at a time; `next_cursor` is null on the last page."""
+    after = decode_cursor(cursor) if cursor else items.FIRST_ID
+    async with postgres.acquire() as connection:
+        # One extra row tells whether another page follows
+        rows = await items.list_items(connection, after, limit + 1)
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1]["id"]) if len(rows) > limit else None
+    return {"items": [dict(row) for row in page], "next_cursor": next_cursor}
+
+
+@router.get("/items/stream")
+async def stream_items(
+    cursor: Optional[str] = Query(None, description="Start after this `next_cursor`"),
+    postgres: PostgresPool = Depends(get_postgres),
+):
+    """Stream every item as newline-delimited JSON, straight from a database cursor."""
+    after = decode_cursor(cursor) if cursor else items.FIRST_ID
+
+    async def body() -> AsyncIterator[bytes]:
+        # The connection is held until the last row is sent or the client goes away
+        async with postgres.acquire() as connection:
+            async for chunk in ndjson_chunks(items.iter_items(connection, after, settings.items_stream_prefetch)):
+                yield chunk
+
+    return StreamingResponse(body(), media_type=NDJSON_MEDIA_TYPE)
 
 
 @router.get("/items/{item_id}")
-async def get_item(item_id: int):
+@cached("items", ttl=settings.cache_ttl_seconds)
+async def get_item(item_id: int, postgres: PostgresPool = Depends(get_postgres)):
     """Get a single item."""
-    return {"item_id": item_id}
+    async with postgres.acquire() as connection:
+        item = await items.get_item(connection, item_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return dict(item)
@@ -0,0 +1,353 @@
+"""Read-through response cache for GET routes.
+
+`@cached("items", ttl=30)` serves a route's JSON body from two tiers: a
+small in-process LRU (L1) in front of Redis (L2) shared by every replica.
+On a miss the route runs once per key and process, however many requests
+are waiting for it (single-flight). Entries are refreshed in the background
+shortly before they expire, with a probability that rises as expiry nears
+and with how long the route took to compute (probabilistic early
+expiration, "XFetch"), so hot keys never expire under load.
+
+Every cached response carries an ETag; a request whose `If-None-Match`
+matches gets a 304 with no body. Write routes decorated with
+`@invalidates("items")` drop a namespace after they succeed and bump its
+generation in Redis; a load that started before the bump, on any replica,
+does not write its result. L1 entries live at most `l1_ttl` seconds, which
+bounds how long other replicas keep serving a value invalidated elsewhere.
+
+Only cache routes whose response does not depend on the caller.
+"""
+import asyncio
+import functools
+import hashlib
+import inspect
+import logging
+import math
+import random
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+from fastapi import Request
+from prometheus_client import Counter
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from starlette.responses import Response
+
+from .responses import dumps
+
+logger = logging.getLogger(__name__)
+
+CACHE_REQUESTS = Counter('cache_requests_total', 'Response cache lookups', ['namespace', 'result'])
+CACHE_NOT_MODIFIED = Counter('cache_not_modified_total', 'Requests answered 304 from a matching ETag', ['namespace'])
+CACHE_EARLY_REFRESHES = Counter('cache_early_refreshes_total', 'Entries refreshed before they expired', ['namespace'])
+CACHE_COALESCED = Counter('cache_coalesced_total', 'Misses that waited for a load already in flight', ['namespace'])
+CACHE_INVALIDATIONS = Counter('cache_invalidations_total', 'Namespace invalidations', ['namespace'])
+CACHE_ERRORS = Counter('cache_redis_errors_total', 'Redis errors ignored by the response cache', ['operation'])
+
+# Part of every entry key; bump it when `CachedResponse.pack` changes, so
+# replicas on either side of a rolling deploy never read each other's entries
+ENTRY_FORMAT = "v1"
+
+# Writes an entry only if the namespace generation is still the one the load
+# started with, and keeps the namespace's key set alive as long as its entries.
+FILL_SCRIPT = """
+if (redis.call('GET', KEYS[1]) or '0') ~= ARGV[1] then
+    return 0
+end
+local ttl = tonumber(ARGV[3])
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ttl)
+redis.call('SADD', KEYS[3], KEYS[2])
+if redis.call('TTL', KEYS[3]) < ttl then
+    redis.call('EXPIRE', KEYS[3], ttl)
+end
+return 1
+"""
+
+
+@dataclass
+class CachedResponse:
+    """A cached JSON body and what is needed to revalidate and refresh it."""
+
+    body: bytes
+    etag: str
+    expires_at: float  # wall clock, so replicas agree
+    delta: float  # seconds the route took to compute the body
+
+    def should_refresh(self, beta: float, now: float) -> bool:
+        """XFetch: refresh early with a probability that grows near expiry."""
+        return now - self.delta * beta * math.log(1.0 - random.random()) >= self.expires_at
+
+    def pack(self) -> bytes:
+        return f"{self.etag}\n{self.expires_at}\n{self.delta}\n".encode() + self.body
+
+    @classmethod
+    def unpack(cls, data: bytes) -> "CachedResponse":
+        etag, expires_at, delta, body = data.split(b"\n", 3)
+        return cls(body=body, etag=etag.decode(), expires_at=float(expires_at), delta=float(delta))
+
+
+class ResponseCache:
+    """Two-tier cache of response bodies with single-flight loading."""
+
+    def __init__(
+        self,
+        redis: Optional[Redis] = None,
+        l1_max_entries: int = 1000,
+        l1_ttl: float = 5.0,
+        beta: float = 1.0,
+        key_prefix: str = "cache",
+    ):
+        """Initialize the cache; without `redis` only the in-process tier is used."""
+        self.redis = redis
+        self.l1_max_entries = l1_max_entries
+        self.l1_ttl = l1_ttl
+        self.beta = beta
+        self.key_prefix = key_prefix
+        self._l1: OrderedDict[str, tuple[CachedResponse, float]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._generations: dict[str, int] = {}
+        self._fill_script = redis.register_script(FILL_SCRIPT) if redis is not None else None
+
+    async def get_or_load(
+        self,
+        namespace: str,
+        key: str,
+        load: Callable[[], Awaitable[bytes]],
+        ttl: float,
+    ) -> CachedResponse:
+        """Return the cached body for `key`, calling `load` on a miss."""
+        full_key = f"{self.key_prefix}:{namespace}:{ENTRY_FORMAT}:{key}"
+        now = time.time()
+
+        entry, tier = self._l1_get(full_key, now), "l1_hit"
+        if entry is None:
+            entry, tier = await self._redis_get(full_key), "l2_hit"
+            if entry is not None and entry.expires_at > now:
+                self._l1_put(full_key, entry, now)
+
+        if entry is not None and entry.expires_at > now:
+            CACHE_REQUESTS.labels(namespace=namespace, result=tier).inc()
+            if full_key not in self._inflight and entry.should_refresh(self.beta, now):
+                CACHE_EARLY_REFRESHES.labels(namespace=namespace).inc()
+                self._start_load(namespace, full_key, load, ttl, background=True)
+            return entry
+
+        CACHE_REQUESTS.labels(namespace=namespace, result="miss").inc()
+        task = self._inflight.get(full_key)
+        if task is not None:
+            CACHE_COALESCED.labels(namespace=namespace).inc()
+        else:
+            task = self._start_load(namespace, full_key, load, ttl)
+        # Shielded so one caller going away does not cancel the load for the others
+        return await asyncio.shield(task)
+
+    def _start_load(self, namespace: str, full_key: str, load, ttl: float, background: bool = False) -> asyncio.Task:
+        task = asyncio.create_task(self._fill(namespace, full_key, load, ttl))
+        self._inflight[full_key] = task
+        task.add_done_callback(functools.partial(self._load_done, full_key, background))
+        return task
+
+    def _load_done(self, full_key: str, background: bool, task: asyncio.Task) -> None:
+        if self._inflight.get(full_key) is task:
+            del self._inflight[full_key]
+        # Retrieving the exception also keeps asyncio from warning when nobody awaited it
+        error = None if task.cancelled() else task.exception()
+        if error is not None and background:
+            logger.warning(f"Refreshing {full_key} failed: {error!r}")
+
+    async def _fill(self, namespace: str, full_key: str, load, ttl: float) -> CachedResponse:
+        generation = self._generations.get(namespace, 0)
+        shared_generation = await self._redis_generation(namespace)
+        start = time.perf_counter()
+        body = await load()
+        entry = CachedResponse(
+            body=body,
+            etag=f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"',
+            expires_at=time.time() + ttl,
+            delta=time.perf_counter() - start,
+        )
+        # A namespace invalidated while loading, here or on another replica, may have produced stale data
+        if self._generations.get(namespace, 0) == generation and await self._redis_put(
+            namespace, full_key, entry, ttl, shared_generation
+        ):
+            self._l1_put(full_key, entry, time.time())
+        return entry
+
+    def _l1_get(self, full_key: str, now: float) -> Optional[CachedResponse]:
+        item = self._l1.get(full_key)
+        if item is None:
+            return None
+        entry, l1_expires_at = item
+        if l1_expires_at <= now:
+            del self._l1[full_key]
+            return None
+        self._l1.move_to_end(full_key)
+        return entry
+
+    def _l1_put(self, full_key: str, entry: CachedResponse, now: float) -> None:
+        self._l1[full_key] = (entry, min(entry.expires_at, now + self.l1_ttl))
+        self._l1.move_to_end(full_key)
+        while len(self._l1) > self.l1_max_entries:
+            self._l1.popitem(last=False)
+
+    async def _redis_get(self, full_key: str) -> Optional[CachedResponse]:
+        if self.redis is None:
+            return None
+        try:
+            data = await self.redis.get(full_key)
+        except RedisError as e:
+            CACHE_ERRORS.labels(operation="get").inc()
+            logger.debug(f"Cache read of {full_key} failed: {e}")
+            return None
+        if data is None:
+            return None
+        try:
+            return CachedResponse.unpack(data)
+        except ValueError as e:
+            # Treated as a miss; the reload overwrites it
+            CACHE_ERRORS.labels(operation="decode").inc()
+            logger.warning(f"Ignoring malformed cache entry {full_key}: {e}")
+            return None
+
+    async def _redis_generation(self, namespace: str) -> Optional[int]:
+        if self.redis is None:
+            return None
+        try:
+            return int(await self.redis.get(self._generation_key(namespace)) or 0)
+        except RedisError as e:
+            CACHE_ERRORS.labels(operation="get").inc()
+            logger.debug(f"Cache generation read of {namespace} failed: {e}")
+            return None
+
+    async def _redis_put(
+        self, namespace: str, full_key: str, entry: CachedResponse, ttl: float, generation: Optional[int]
+    ) -> bool:
+        """Write `entry` to Redis; False when the namespace was invalidated since `generation`."""
+        # Without a generation to check against, only the in-process tier is filled
+        if self._fill_script is None or generation is None:
+            return True
+        try:
+            written = await self._fill_script(
+                keys=[self._generation_key(namespace), full_key, self._keys_set(namespace)],
+                args=[generation, entry.pack(), max(1, math.ceil(ttl))],
+            )
+        except RedisError as e:
+            CACHE_ERRORS.labels(operation="set").inc()
+            logger.debug(f"Cache write of {full_key} failed: {e}")
+            return True
+        return bool(written)
+
+    def _keys_set(self, namespace: str) -> str:
+        return f"{self.key_prefix}:{namespace}:_keys"
+
+    def _generation_key(self, namespace: str) -> str:
+        return f"{self.key_prefix}:{namespace}:_generation"
+
+    async def invalidate(self, namespace: str) -> None:
+        """Drop every cached response in `namespace`."""
+        CACHE_INVALIDATIONS.labels(namespace=namespace).inc()
+        self._generations[namespace] = self._generations.get(namespace, 0) + 1
+        prefix = f"{self.key_prefix}:{namespace}:"
+        for full_key in [key for key in self._l1 if key.startswith(prefix)]:
+            del self._l1[full_key]
+        if self.redis is None:
+            return
+        try:
+            # Loads that finish after this can no longer write, and new ones start a fresh key set
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.incr(self._generation_key(namespace))
+                pipe.smembers(self._keys_set(namespace))
+                pipe.delete(self._keys_set(namespace))
+                _, keys, _ = await pipe.execute()
+            if keys:
+                await self.redis.delete(*keys)
+        except RedisError as e:
+            CACHE_ERRORS.labels(operation="invalidate").inc()
+            logger.warning(f"Cache invalidation of {namespace} failed: {e}")
+
+    @staticmethod
+    def respond(request: Request, entry: CachedResponse, namespace: str) -> Response:
+        """Answer with the cached body, or 304 when the client already has it."""
+        headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+        if _etag_matches(request.headers.get("if-none-match"), entry.etag):
+            CACHE_NOT_MODIFIED.labels(namespace=namespace).inc()
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+    async def close(self) -> None:
+        """Cancel loads still in flight."""
+        for task in list(self._inflight.values()):
+            task.cancel()
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def _with_request(endpoint: Callable, wrapper: Callable) -> Callable:
+    """Give `wrapper` the signature of `endpoint` plus a `request` parameter.
+
+    FastAPI reads the signature to resolve parameters, so the wrapper must
+    look like the route it wraps. Routes that already take a `Request` keep
+    their signature unchanged.
+    """
+    signature = inspect.signature(endpoint)
+    parameters = list(signature.parameters.values())
+    wrapper._adds_request = not any(p.annotation is Request for p in parameters)
+    if wrapper._adds_request:
+        parameters.append(inspect.Parameter("request", inspect.Parameter.KEYWORD_ONLY, annotation=Request))
+    wrapper.__signature__ = signature.replace(parameters=parameters)
+    return wrapper
+
+
+def _pop_request(wrapper: Callable, kwargs: dict) -> Request:
+    if wrapper._adds_request:
+        return kwargs.pop("request")
+    return next(value for value in kwargs.values() if isinstance(value, Request))
+
+
+def cached(namespace: str, ttl: float = 30.0) -> Callable:
+    """Serve a GET route's JSON response from the response cache.
+
+    The key is the request path and sorted query string.
+    """
+    def decorator(endpoint: Callable) -> Callable:
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            request = _pop_request(wrapper, kwargs)
+            cache: ResponseCache = request.app.state.cache
+            key = request.url.path
+            if request.query_params:
+                key += "?" + "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+
+            async def load() -> bytes:
+                result = await endpoint(*args, **kwargs)
+                return dumps(result)
+
+            entry = await cache.get_or_load(namespace, key, load, ttl)
+            return cache.respond(request, entry, namespace)
+
+        return _with_request(endpoint, wrapper)
+    return decorator
+
+
+def invalidates(*namespaces: str) -> Callable:
+    """Drop the given cache namespaces after a write route succeeds."""
+    def decorator(endpoint: Callable) -> Callable:
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            request = _pop_request(wrapper, kwargs)
+            result = await endpoint(*args, **kwargs)
+            cache: ResponseCache = request.app.state.cache
+            for namespace in namespaces:
+                await cache.invalidate(namespace)
+            return result
+
+        return _with_request(endpoint, wrapper)
+    return decorator
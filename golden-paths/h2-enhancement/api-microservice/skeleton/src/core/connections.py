@@ -0,0 +1,247 @@
+"""Pooled PostgreSQL and Redis connections.
+
+Both pools are bounded: a request that finds every connection busy waits
+up to the pool timeout and then fails, instead of opening more connections
+than the database allows. The pools are opened and warmed in the
+application lifespan, handed to routes through dependencies (`api/deps.py`)
+and closed on shutdown. A pool that cannot connect at startup is opened
+again by the readiness probe, so the process keeps running meanwhile.
+
+`ReadinessProbe` checks both in the background, so `/ready` answers from the
+last result without touching the network.
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import asyncpg
+from prometheus_client import Counter, Gauge, Histogram
+from redis.asyncio import BlockingConnectionPool, Redis
+
+logger = logging.getLogger(__name__)
+
+POOL_SIZE = Gauge('db_pool_connections', 'Open pooled connections', ['pool'], multiprocess_mode='livesum')
+POOL_IN_USE = Gauge('db_pool_connections_in_use', 'Pooled connections checked out', ['pool'], multiprocess_mode='livesum')
+POOL_MAX = Gauge('db_pool_connections_max', 'Pool size limit', ['pool'], multiprocess_mode='livesum')
+POOL_WAIT = Histogram(
+    'db_pool_wait_seconds',
+    'Time spent waiting to check out a pooled connection',
+    ['pool'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+POOL_CHECKOUTS = Counter('db_pool_checkouts_total', 'Pooled connection checkouts', ['pool', 'outcome'])
+
+
+class PostgresPool:
+    """Bounded asyncpg connection pool."""
+
+    def __init__(
+        self,
+        database_url: str,
+        min_size: int = 2,
+        max_size: int = 10,
+        acquire_timeout: float = 5.0,
+        command_timeout: float = 30.0,
+    ):
+        """Initialize pool settings. Call `open` inside the event loop.
+
+        `database_url` may use the SQLAlchemy form (`postgresql+asyncpg://`).
+        """
+        self.dsn = database_url.replace("postgresql+asyncpg://", "postgresql://", 1)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.command_timeout = command_timeout
+        self._pool: Optional[asyncpg.Pool] = None
+
+    async def open(self) -> "PostgresPool":
+        """Create the pool; `min_size` connections are opened up front."""
+        self._pool = await asyncpg.create_pool(
+            self.dsn,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            command_timeout=self.command_timeout,
+        )
+        POOL_MAX.labels(pool="postgres").set(self.max_size)
+        self._update_gauges()
+        logger.info(f"Opened PostgreSQL pool ({self.min_size}-{self.max_size} connections)")
+        return self
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[asyncpg.Connection]:
+        """Check out a connection, waiting at most `acquire_timeout`."""
+        if self._pool is None:
+            raise RuntimeError("PostgreSQL pool is not open")
+        start = time.perf_counter()
+        try:
+            connection = await self._pool.acquire(timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            POOL_CHECKOUTS.labels(pool="postgres", outcome="timeout").inc()
+            raise
+        POOL_WAIT.labels(pool="postgres").observe(time.perf_counter() - start)
+        POOL_CHECKOUTS.labels(pool="postgres", outcome="ok").inc()
+        self._update_gauges()
+        try:
+            yield connection
+        finally:
+            await self._pool.release(connection)
+            self._update_gauges()
+
+    async def ping(self) -> None:
+        """Run a trivial query on a pooled connection, opening the pool if it is not open yet."""
+        if self._pool is None:
+            await self.open()
+        async with self.acquire() as connection:
+            await connection.fetchval("SELECT 1")
+
+    def _update_gauges(self) -> None:
+        size = self._pool.get_size()
+        POOL_SIZE.labels(pool="postgres").set(size)
+        POOL_IN_USE.labels(pool="postgres").set(size - self._pool.get_idle_size())
+
+    async def close(self) -> None:
+        """Close the pool, waiting for checked-out connections to be returned."""
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+            POOL_SIZE.labels(pool="postgres").set(0)
+            POOL_IN_USE.labels(pool="postgres").set(0)
+        logger.info("Closed PostgreSQL pool")
+
+
+class _InstrumentedRedisPool(BlockingConnectionPool):
+    """Blocking Redis pool that records checkout waits and connections in use."""
+
+    async def get_connection(self, command_name, *keys, **options):
+        start = time.perf_counter()
+        try:
+            connection = await super().get_connection(command_name, *keys, **options)
+        except Exception:
+            POOL_CHECKOUTS.labels(pool="redis", outcome="timeout").inc()
+            raise
+        POOL_WAIT.labels(pool="redis").observe(time.perf_counter() - start)
+        POOL_CHECKOUTS.labels(pool="redis", outcome="ok").inc()
+        self._update_gauges()
+        return connection
+
+    async def release(self, connection) -> None:
+        await super().release(connection)
+        self._update_gauges()
+
+    def _update_gauges(self) -> None:
+        in_use = len(self._in_use_connections)
+        POOL_SIZE.labels(pool="redis").set(in_use + len(self._available_connections))
+        POOL_IN_USE.labels(pool="redis").set(in_use)
+
+
+class RedisPool:
+    """Bounded Redis connection pool and the client that uses it."""
+
+    def __init__(self, redis_url: str, max_connections: int = 20, timeout: float = 5.0, warm_connections: int = 2):
+        """Initialize pool settings. Call `open` inside the event loop."""
+        self.redis_url = redis_url
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.warm_connections = min(warm_connections, max_connections)
+        self._client: Optional[Redis] = None
+
+    async def open(self) -> "RedisPool":
+        """Create the pool and open `warm_connections` connections up front."""
+        pool = _InstrumentedRedisPool.from_url(
+            self.redis_url,
+            max_connections=self.max_connections,
+            timeout=self.timeout,
+            socket_connect_timeout=self.timeout,
+        )
+        self._client = Redis(connection_pool=pool)
+        # Concurrent pings each need their own connection
+        await asyncio.gather(*(self._client.ping() for _ in range(self.warm_connections)))
+        POOL_MAX.labels(pool="redis").set(self.max_connections)
+        logger.info(f"Opened Redis pool (up to {self.max_connections} connections)")
+        return self
+
+    @property
+    def client(self) -> Redis:
+        """Redis client backed by the pool."""
+        if self._client is None:
+            raise RuntimeError("Redis pool is not open")
+        return self._client
+
+    async def ping(self) -> None:
+        """Ping Redis, opening the pool if it is not open yet."""
+        if self._client is None:
+            await self.open()
+        await self.client.ping()
+
+    async def close(self) -> None:
+        """Close the client and every pooled connection."""
+        if self._client is not None:
+            await self._client.aclose(close_connection_pool=True)
+            self._client = None
+            POOL_SIZE.labels(pool="redis").set(0)
+            POOL_IN_USE.labels(pool="redis").set(0)
+        logger.info("Closed Redis pool")
+
+
+class ReadinessProbe:
+    """Checks dependencies every `interval` seconds and caches the result."""
+
+    def __init__(
+        self,
+        postgres: Optional[PostgresPool] = None,
+        redis: Optional[RedisPool] = None,
+        interval: float = 5.0,
+        timeout: float = 1.0,
+    ):
+        """Initialize the probe for whichever pools are configured."""
+        self.checks = {}
+        if postgres is not None:
+            self.checks["postgres"] = postgres.ping
+        if redis is not None:
+            self.checks["redis"] = redis.ping
+        self.interval = interval
+        self.timeout = timeout
+        self.results: dict[str, bool] = {}
+        self.checked_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        """Whether every check passed recently enough to be trusted."""
+        fresh = time.monotonic() - self.checked_at < self.interval * 3
+        return fresh and all(self.results.values())
+
+    async def start(self) -> None:
+        """Run the first check, then keep checking in the background."""
+        await self.check()
+        self._task = asyncio.create_task(self._run())
+
+    async def check(self) -> None:
+        """Run every check concurrently and record the outcome."""
+        names = list(self.checks)
+        outcomes = await asyncio.gather(
+            *(asyncio.wait_for(self.checks[name](), self.timeout) for name in names),
+            return_exceptions=True,
+        )
+        for name, outcome in zip(names, outcomes):
+            healthy = not isinstance(outcome, BaseException)
+            if not healthy and self.results.get(name, True):
+                logger.warning(f"Readiness check {name} failed: {outcome!r}")
+            self.results[name] = healthy
+        self.checked_at = time.monotonic()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.check()
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -9,10 +9,14 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
 from starlette.responses import Response
 
+from .core.cache import ResponseCache
 from .core.config import settings
+from .core.connections import PostgresPool, ReadinessProbe, RedisPool
+from .core.instrumentation import InstrumentationMiddleware, MetricsExporter
+from .core.ratelimit import ConcurrencyLimiter, InMemoryRateLimiter, RateLimitMiddleware, RedisRateLimiter
+from .core.responses import FastJSONResponse
 from .api.v1 import router as api_v1_router
 
 # Logging
@@ -23,18 +27,63 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Metrics
-REQUEST_COUNT = Counter('http_requests_total', 'Total HTTP requests', ['method', 'endpoint', 'status'])
-REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'HTTP request latency', ['method', 'endpoint'])
+metrics_exporter = MetricsExporter(cache_seconds=settings.metrics_cache_seconds)
+
+
+async def open_pool(name: str, pool):
+    """Open `pool`; if that fails, keep running and let the readiness probe retry."""
+    try:
+        return await pool.open()
+    except Exception as e:
+        logger.warning(f"{name} is unavailable at startup, /ready reports not ready until it connects: {e!r}")
+        return pool
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager."""
     logger.info("Starting application...")
-    # Startup: connect to database, redis, etc.
+    app.state.postgres = None
+    app.state.redis = None
+    if settings.database_enabled:
+        app.state.postgres = await open_pool("PostgreSQL", PostgresPool(
+            settings.database_url,
+            min_size=settings.database_pool_min_size,
+            max_size=settings.database_pool_max_size,
+            acquire_timeout=settings.database_pool_timeout,
+            command_timeout=settings.database_command_timeout,
+        ))
+    if settings.redis_enabled:
+        app.state.redis = await open_pool("Redis", RedisPool(
+            settings.redis_url,
+            max_connections=settings.redis_max_connections,
+            timeout=settings.redis_pool_timeout,
+        ))
+    app.state.readiness = ReadinessProbe(
+        postgres=app.state.postgres,
+        redis=app.state.redis,
+        interval=settings.ready_probe_interval_seconds,
+        timeout=settings.ready_probe_timeout_seconds,
+    )
+    await app.state.readiness.start()
+    app.state.cache = ResponseCache(
+        redis=app.state.redis.client if app.state.redis is not None else None,
+        l1_max_entries=settings.cache_l1_max_entries,
+        l1_ttl=settings.cache_l1_ttl_seconds,
+        beta=settings.cache_early_refresh_beta,
+    )
+
     yield
-    # Shutdown: close connections
+
     logger.info("Shutting down application...")
+    await app.state.cache.close()
+    if rate_limiter is not None:
+        await rate_limiter.close()
+    await app.state.readiness.stop()
+    if app.state.redis is not None:
+        await app.state.redis.close()
+    if app.state.postgres is not None:
+        await app.state.postgres.close()
 
 
 app = FastAPI(
@@ -44,6 +93,25 @@ app = FastAPI(
     docs_url="/docs",
     redoc_url="/redoc",
     lifespan=lifespan,
+    default_response_class=FastJSONResponse if settings.fast_json_responses else JSONResponse,
+)
+
+# Load protection (innermost, so rejections still get CORS headers and are counted)
+rate_limiter = None
+if settings.rate_limit_per_second > 0:
+    if settings.rate_limit_backend == "redis":
+        rate_limiter = RedisRateLimiter.from_url(
+            settings.redis_url, rate=settings.rate_limit_per_second, burst=settings.rate_limit_burst
+        )
+    else:
+        rate_limiter = InMemoryRateLimiter(rate=settings.rate_limit_per_second, burst=settings.rate_limit_burst)
+app.add_middleware(
+    RateLimitMiddleware,
+    rate_limiter=rate_limiter,
+    concurrency_limiter=ConcurrencyLimiter(
+        max_concurrency=settings.max_concurrent_requests,
+        queue_target=settings.queue_target_seconds,
+    ) if settings.max_concurrent_requests > 0 else None,
 )
 
 # CORS
@@ -55,28 +123,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-
-# Middleware for metrics
-@app.middleware("http")
-async def metrics_middleware(request: Request, call_next):
-    """Record request metrics."""
-    import time
-    start = time.time()
-    response = await call_next(request)
-    duration = time.time() - start
-
-    REQUEST_COUNT.labels(
-        method=request.method,
-        endpoint=request.url.path,
-        status=response.status_code
-    ).inc()
-
-    REQUEST_LATENCY.labels(
-        method=request.method,
-        endpoint=request.url.path
-    ).observe(duration)
-
-    return response
+# Request metrics (outermost, so CORS handling is timed too)
+app.add_middleware(InstrumentationMiddleware, max_endpoints=settings.metrics_max_endpoints)
 
 
 # Health endpoints
@@ -87,16 +135,21 @@ async def health():
 
 
 @app.get("/ready")
-async def ready():
-    """Readiness check endpoint."""
-    # TODO: Check database and redis connections
-    return {"status": "ready"}
+async def ready(request: Request):
+    """Readiness check endpoint, answered from the last background probe."""
+    readiness = request.app.state.readiness
+    if not readiness.ready:
+        return JSONResponse(status_code=503, content={"status": "not ready", "checks": readiness.results})
+    return {"status": "ready", "checks": readiness.results}
 
 
 @app.get("/metrics")
-async def metrics():
-    """Prometheus metrics endpoint."""
-    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+def metrics():
+    """Prometheus metrics endpoint.
+
+    Synchronous so rendering runs in the threadpool, off the event loop.
+    """
+    return Response(content=metrics_exporter.render(), media_type=metrics_exporter.content_type)
 
 
 # API routes
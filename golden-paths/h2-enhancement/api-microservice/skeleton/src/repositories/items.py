@@ -0,0 +1,45 @@
+"""Item queries.
+
+Lists use keyset pagination: a page starts after the last id of the
+previous one (`WHERE id > $1 ORDER BY id LIMIT $2`), which the primary key
+index answers by seeking straight to the start of the page. OFFSET would
+read and discard every skipped row first, so it gets slower the deeper the
+page.
+"""
+from typing import AsyncIterator, Optional
+
+import asyncpg
+
+# Lower than any id, for the first page
+FIRST_ID = -(2 ** 63)
+
+COLUMNS = "id, name, description, created_at"
+
+
+async def list_items(connection: asyncpg.Connection, after: int, limit: int) -> list[asyncpg.Record]:
+    """Return up to `limit` items with an id greater than `after`, by id."""
+    return await connection.fetch(
+        f"SELECT {COLUMNS} FROM items WHERE id > $1 ORDER BY id LIMIT $2",
+        after,
+        limit,
+    )
+
+
+async def iter_items(connection: asyncpg.Connection, after: int, prefetch: int = 500) -> AsyncIterator[asyncpg.Record]:
+    """Yield every item with an id greater than `after`, by id.
+
+    Rows come from a server-side cursor `prefetch` at a time, so memory
+    does not grow with the number of rows.
+    """
+    async with connection.transaction(readonly=True):
+        async for record in connection.cursor(
+            f"SELECT {COLUMNS} FROM items WHERE id > $1 ORDER BY id",
+            after,
+            prefetch=prefetch,
+        ):
+            yield record
+
+
+async def get_item(connection: asyncpg.Connection, item_id: int) -> Optional[asyncpg.Record]:
+    """Return the item with `item_id`, or None."""
+    return await connection.fetchrow(f"SELECT {COLUMNS} FROM items WHERE id = $1", item_id)
@@ -1,13 +1,38 @@
 from fastapi import FastAPI
+from starlette.responses import Response
 import logging
+import os
+
+from .instrumentation import InstrumentationMiddleware, MetricsExporter
+from .ratelimit import ConcurrencyLimiter, InMemoryRateLimiter, RateLimitMiddleware
+
+rate_limit_per_second = float(os.getenv("RATE_LIMIT_PER_SECOND", "0"))
+max_concurrent_requests = int(os.getenv("MAX_CONCURRENT_REQUESTS", "100"))
 
 app = FastAPI(title="Microservice")
+app.add_middleware(
+    RateLimitMiddleware,
+    rate_limiter=InMemoryRateLimiter(
+        rate=rate_limit_per_second,
+        burst=int(os.getenv("RATE_LIMIT_BURST", "20")),
+    ) if rate_limit_per_second > 0 else None,
+    concurrency_limiter=ConcurrencyLimiter(
+        max_concurrency=max_concurrent_requests,
+        queue_target=float(os.getenv("QUEUE_TARGET_SECONDS", "0.5")),
+    ) if max_concurrent_requests > 0 else None,
+)
+app.add_middleware(InstrumentationMiddleware)
 logger = logging.getLogger(__name__)
+metrics_exporter = MetricsExporter()
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/metrics")
+def metrics():
+    return Response(content=metrics_exporter.render(), media_type=metrics_exporter.content_type)
+
 @app.get("/")
 def root():
     return {"message": "Hello from microservice"}
@@ -0,0 +1,171 @@
+"""Local stand-ins for Azure OpenAI and Azure AI Search.
+
+Serves just enough of both REST APIs for the RAG app to run without Azure:
+embeddings, chat completions (plain and streamed) and the search index's
+search and document-batch endpoints. Embeddings are derived from the input
+text, so equal texts get equal vectors. Uploaded chunks are kept in memory
+and returned by searches. Latencies, quota and failures are set with
+environment variables:
+
+    FAKE_EMBEDDING_LATENCY_MS   per embeddings call (default 20)
+    FAKE_CHAT_LATENCY_MS        before the first chat token (default 200)
+    FAKE_TOKEN_INTERVAL_MS      between streamed tokens (default 10)
+    FAKE_SEARCH_LATENCY_MS      per search or index call (default 15)
+    FAKE_ANSWER_TOKENS          tokens per answer (default 60)
+    FAKE_EMBEDDING_DIM          vector size (default 256)
+    FAKE_TOKENS_PER_MINUTE      OpenAI token quota, answered with 429 once spent (default 0, unlimited)
+    FAKE_ERROR_RATE             fraction of OpenAI calls failing with 500 (default 0)
+
+Every OpenAI response carries `x-ratelimit-remaining-tokens` when a quota is
+set, like Azure OpenAI. Run several copies on different ports to stand in
+for several regional endpoints.
+
+Usage:
+    uvicorn fake_azure:app --app-dir benchmarks --port 9100
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import time
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+EMBEDDING_LATENCY = float(os.getenv("FAKE_EMBEDDING_LATENCY_MS", "20")) / 1000
+CHAT_LATENCY = float(os.getenv("FAKE_CHAT_LATENCY_MS", "200")) / 1000
+TOKEN_INTERVAL = float(os.getenv("FAKE_TOKEN_INTERVAL_MS", "10")) / 1000
+SEARCH_LATENCY = float(os.getenv("FAKE_SEARCH_LATENCY_MS", "15")) / 1000
+ANSWER_TOKENS = int(os.getenv("FAKE_ANSWER_TOKENS", "60"))
+EMBEDDING_DIM = int(os.getenv("FAKE_EMBEDDING_DIM", "256"))
+TOKENS_PER_MINUTE = int(os.getenv("FAKE_TOKENS_PER_MINUTE", "0"))
+ERROR_RATE = float(os.getenv("FAKE_ERROR_RATE", "0"))
+
+SEED_DOCUMENTS = [
+    {
+        "id": f"seed-{i}",
+        "title": f"Handbook section {i}",
+        "content": f"Section {i} of the handbook covers topic {i} in some detail. " * 20,
+        "source": "handbook.md",
+    }
+    for i in range(20)
+]
+
+app = FastAPI(title="Fake Azure OpenAI and AI Search")
+documents: dict[str, dict] = {}
+quota = {"window_start": time.monotonic(), "used": 0}
+
+
+def _embedding(text: str) -> list[float]:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIM)
+    return (vector / np.linalg.norm(vector)).round(6).tolist()
+
+
+def _answer_tokens() -> list[str]:
+    return [f" word{i}" for i in range(ANSWER_TOKENS - 1)] + [" [1]"]
+
+
+def _charge(tokens: int):
+    """Spend quota for a call; return an error response, or the rate limit headers."""
+    if ERROR_RATE and random.random() < ERROR_RATE:
+        return JSONResponse({"error": {"code": "InternalServerError", "message": "Injected failure"}}, status_code=500)
+    if not TOKENS_PER_MINUTE:
+        return {}
+    now = time.monotonic()
+    if now - quota["window_start"] >= 60:
+        quota["window_start"], quota["used"] = now, 0
+    if quota["used"] + tokens > TOKENS_PER_MINUTE:
+        retry_after = 60 - (now - quota["window_start"])
+        return JSONResponse(
+            {"error": {"code": "429", "message": "Rate limit exceeded"}},
+            status_code=429,
+            headers={"retry-after": str(int(retry_after) + 1), "retry-after-ms": str(int(retry_after * 1000))},
+        )
+    quota["used"] += tokens
+    return {"x-ratelimit-remaining-tokens": str(TOKENS_PER_MINUTE - quota["used"])}
+
+
+@app.post("/openai/deployments/{deployment}/embeddings")
+async def embeddings(deployment: str, request: Request):
+    body = await request.json()
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    headers = _charge(len(inputs) * 8)
+    if isinstance(headers, JSONResponse):
+        return headers
+    await asyncio.sleep(EMBEDDING_LATENCY)
+    return JSONResponse({
+        "object": "list",
+        "model": deployment,
+        "data": [{"object": "embedding", "index": i, "embedding": _embedding(str(text))} for i, text in enumerate(inputs)],
+        "usage": {"prompt_tokens": len(inputs) * 8, "total_tokens": len(inputs) * 8},
+    }, headers=headers)
+
+
+@app.post("/openai/deployments/{deployment}/chat/completions")
+async def chat_completions(deployment: str, request: Request):
+    body = await request.json()
+    prompt_tokens = sum(len(str(m.get("content", ""))) // 4 for m in body.get("messages", []))
+    tokens = _answer_tokens()
+    usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens), "total_tokens": prompt_tokens + len(tokens)}
+    headers = _charge(usage["total_tokens"])
+    if isinstance(headers, JSONResponse):
+        return headers
+    await asyncio.sleep(CHAT_LATENCY)
+
+    if not body.get("stream"):
+        return JSONResponse({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": deployment,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+            "usage": usage,
+        }, headers=headers)
+
+    async def stream():
+        for token in tokens:
+            chunk = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": deployment,
+                "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(TOKEN_INTERVAL)
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=headers)
+
+
+@app.post("/indexes('{index}')/docs/search.index")
+async def index_documents(index: str, request: Request):
+    body = await request.json()
+    await asyncio.sleep(SEARCH_LATENCY)
+    results = []
+    for document in body.get("value", []):
+        action = document.pop("@search.action", "mergeOrUpload")
+        if action == "delete":
+            documents.pop(document["id"], None)
+        else:
+            document.pop("content_vector", None)
+            documents[document["id"]] = {**documents.get(document["id"], {}), **document}
+        results.append({"key": document["id"], "status": True, "errorMessage": None, "statusCode": 200})
+    return {"value": results}
+
+
+@app.post("/indexes('{index}')/docs/search.post.search")
+async def search(index: str, request: Request):
+    body = await request.json()
+    await asyncio.sleep(SEARCH_LATENCY)
+    pool = list(documents.values()) or SEED_DOCUMENTS
+    match = re.match(r"source eq '(.*)'$", body.get("filter") or "")
+    if match:
+        source = match.group(1).replace("''", "'")
+        return {"value": [{**d, "@search.score": 1.0} for d in pool if d.get("source") == source]}
+    top = body.get("top") or 50
+    return {"value": [{**d, "@search.score": 1.0 / (rank + 1)} for rank, d in enumerate(pool[:top])]}
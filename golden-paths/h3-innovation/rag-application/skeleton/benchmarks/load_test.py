@@ -0,0 +1,89 @@
+"""Concurrent /chat load test.
+
+Sends a fixed number of chat requests at increasing concurrency levels and
+reports throughput for each level. With async Azure clients, throughput
+should grow with concurrency until the backends or the pools saturate.
+
+Usage:
+    uvicorn src.main:app --port 8000
+    python benchmarks/load_test.py --url http://localhost:8000 --requests 200
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+DEFAULT_QUERIES = [
+    "What is this service for?",
+    "How do I upload a document?",
+    "Which models are used for embeddings?",
+    "How are sources cited in answers?",
+]
+
+
+async def _worker(client: httpx.AsyncClient, queue: asyncio.Queue, latencies: list, errors: list) -> None:
+    """Drain the queue, recording the latency of each request."""
+    while True:
+        try:
+            query = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        start = time.perf_counter()
+        try:
+            response = await client.post("/chat", json={"query": query})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+        except httpx.HTTPError as e:
+            errors.append(str(e))
+
+
+async def run_level(url: str, concurrency: int, total: int, timeout: float) -> dict:
+    """Run `total` requests with `concurrency` in flight and summarise them."""
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(DEFAULT_QUERIES[i % len(DEFAULT_QUERIES)])
+
+    latencies: list[float] = []
+    errors: list[str] = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(_worker(client, queue, latencies, errors) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000 if latencies else 0.0,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    print(f"{'concurrency':>11} {'ok':>6} {'errors':>6} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'scaling':>8}")
+    baseline = None
+    for concurrency in args.concurrency:
+        result = await run_level(args.url, concurrency, args.requests, args.timeout)
+        baseline = baseline or result["throughput_rps"] or None
+        scaling = result["throughput_rps"] / baseline if baseline else 0.0
+        print(
+            f"{result['concurrency']:>11} {result['requests']:>6} {result['errors']:>6} "
+            f"{result['throughput_rps']:>8.1f} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {scaling:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
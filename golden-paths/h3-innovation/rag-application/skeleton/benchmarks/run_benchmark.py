@@ -0,0 +1,388 @@
+"""Benchmark the RAG app end to end against fake Azure backends.
+
+Starts `fake_azure.py` and the app (`src.main:app`) as subprocesses, then
+drives `/chat`, `/chat/stream` and `/documents` at each concurrency level.
+Reports p50/p95/p99 latency, throughput and the app's resident memory, and
+writes everything to a JSON file. Pass an earlier file with `--compare` to
+see the change per scenario and level.
+
+Usage (from the skeleton directory):
+    python benchmarks/run_benchmark.py --concurrency 1 8 32 --output bench.json
+    python benchmarks/run_benchmark.py --compare bench.json --output bench-new.json
+    python benchmarks/run_benchmark.py --app-env SEARCH_MODE=pipelined RERANKER=local
+    python benchmarks/run_benchmark.py --openai-endpoints 3 --tokens-per-minute 20000 --error-rate 0.05
+
+Memory is read from /proc, so it is only reported on Linux.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+
+import httpx
+
+SKELETON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_QUERIES = [
+    "What is this service for?",
+    "How do I upload a document?",
+    "Which models are used for embeddings?",
+    "How are sources cited in answers?",
+    "What does section 3 of the handbook cover?",
+    "Who owns the platform?",
+    "How is access to the index controlled?",
+    "What happens when a document is re-uploaded?",
+]
+
+# The app under test talks only to the fakes and keeps its state in a scratch directory
+APP_ENV = {
+    "AZURE_OPENAI_API_KEY": "fake",
+    "AZURE_SEARCH_API_KEY": "fake",
+    "SEMANTIC_CACHE_ENABLED": "false",
+    "EMBEDDING_CACHE_ENABLED": "false",
+    "CONTENT_SAFETY_ENABLED": "false",
+}
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """Return the nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def rss_mb(pid: int, field: str = "VmRSS") -> Optional[float]:
+    """Return a memory field of /proc/<pid>/status in MB, or None off Linux."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+class MemorySampler:
+    """Sample a process's resident memory while a scenario runs."""
+
+    def __init__(self, pid: int, interval: float = 0.1):
+        self.pid = pid
+        self.interval = interval
+        self.samples: list[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "MemorySampler":
+        self._task = asyncio.create_task(self._sample())
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._record()
+
+    async def _sample(self) -> None:
+        while True:
+            self._record()
+            await asyncio.sleep(self.interval)
+
+    def _record(self) -> None:
+        value = rss_mb(self.pid)
+        if value is not None:
+            self.samples.append(value)
+
+    def summary(self) -> dict:
+        if not self.samples:
+            return {"rss_start_mb": None, "rss_peak_mb": None, "rss_end_mb": None}
+        return {
+            "rss_start_mb": round(self.samples[0], 1),
+            "rss_peak_mb": round(max(self.samples), 1),
+            "rss_end_mb": round(self.samples[-1], 1),
+        }
+
+
+def summarize(scenario: str, concurrency: int, latencies: list[float], errors: int, elapsed: float) -> dict:
+    """Build the result row of a scenario run."""
+    latencies = sorted(latencies)
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+    }
+
+
+async def _drive(concurrency: int, total: int, request) -> tuple[list[float], int, float]:
+    """Call `request(i)` `total` times with `concurrency` in flight."""
+    counter = iter(range(total))
+    latencies: list[float] = []
+    errors = 0
+
+    async def worker() -> None:
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                await request(i)
+                latencies.append(time.perf_counter() - start)
+            except (httpx.HTTPError, RuntimeError):
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def bench_chat(client: httpx.AsyncClient, concurrency: int, total: int) -> dict:
+    """Measure full `/chat` round trips."""
+    async def request(i: int) -> None:
+        response = await client.post("/chat", json={"query": DEFAULT_QUERIES[i % len(DEFAULT_QUERIES)]})
+        response.raise_for_status()
+
+    latencies, errors, elapsed = await _drive(concurrency, total, request)
+    return summarize("chat", concurrency, latencies, errors, elapsed)
+
+
+async def bench_chat_stream(client: httpx.AsyncClient, concurrency: int, total: int) -> dict:
+    """Measure `/chat/stream`, recording time to first token as well."""
+    first_token: list[float] = []
+
+    async def request(i: int) -> None:
+        start = time.perf_counter()
+        query = DEFAULT_QUERIES[i % len(DEFAULT_QUERIES)]
+        async with client.stream("POST", "/chat/stream", json={"query": query}) as response:
+            response.raise_for_status()
+            seen_token = False
+            async for line in response.aiter_lines():
+                if not seen_token and line == "event: token":
+                    first_token.append(time.perf_counter() - start)
+                    seen_token = True
+
+    latencies, errors, elapsed = await _drive(concurrency, total, request)
+    result = summarize("chat_stream", concurrency, latencies, errors, elapsed)
+    first_token.sort()
+    result["ttft_p50_ms"] = round(percentile(first_token, 0.50) * 1000, 1)
+    result["ttft_p95_ms"] = round(percentile(first_token, 0.95) * 1000, 1)
+    return result
+
+
+async def bench_documents(client: httpx.AsyncClient, concurrency: int, total: int, document_kb: int) -> dict:
+    """Upload documents and wait for their ingestion jobs to finish.
+
+    Latency is upload to job completion; the upload response time alone is
+    reported as `accept_p50_ms`.
+    """
+    words = [f"term{i}" for i in range(2000)]
+    accept: list[float] = []
+
+    async def request(i: int) -> None:
+        # Every document is distinct so incremental indexing cannot skip it
+        body = " ".join(words[(i * 7 + j) % len(words)] for j in range(document_kb * 1024 // 8))
+        start = time.perf_counter()
+        response = await client.post(
+            "/documents",
+            files={"file": (f"bench-{concurrency}-{i}-{time.time_ns()}.txt", body.encode(), "text/plain")},
+        )
+        response.raise_for_status()
+        accept.append(time.perf_counter() - start)
+        job_id = response.json()["job_id"]
+        while True:
+            status = (await client.get(f"/documents/jobs/{job_id}")).json()
+            if status["status"] == "succeeded":
+                return
+            if status["status"] == "failed":
+                raise RuntimeError(status.get("error") or "ingestion failed")
+            await asyncio.sleep(0.05)
+
+    latencies, errors, elapsed = await _drive(concurrency, total, request)
+    result = summarize("documents", concurrency, latencies, errors, elapsed)
+    accept.sort()
+    result["accept_p50_ms"] = round(percentile(accept, 0.50) * 1000, 1)
+    return result
+
+
+def start_process(args: list[str], env: dict, log_path: str) -> subprocess.Popen:
+    log = open(log_path, "wb")
+    return subprocess.Popen(args, cwd=SKELETON_DIR, env={**os.environ, **env}, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def wait_ready(url: str, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url, timeout=2.0) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} exited with code {process.returncode}")
+            try:
+                if (await client.get("/health")).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready in {timeout}s")
+
+
+def stop_process(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def compare(results: list[dict], baseline_path: str) -> None:
+    """Print throughput and p95 changes against an earlier results file."""
+    with open(baseline_path) as f:
+        baseline = {(r["scenario"], r["concurrency"]): r for r in json.load(f)["results"]}
+    print(f"\nCompared with {baseline_path}:")
+    print(f"{'scenario':>12} {'conc':>5} {'rps':>18} {'p95 ms':>20}")
+    for result in results:
+        before = baseline.get((result["scenario"], result["concurrency"]))
+        if before is None:
+            continue
+
+        def change(key: str) -> str:
+            old, new = before[key], result[key]
+            delta = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+            return f"{old:.1f}->{new:.1f} ({delta})"
+
+        print(f"{result['scenario']:>12} {result['concurrency']:>5} {change('throughput_rps'):>18} {change('p95_ms'):>20}")
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SKELETON_DIR, stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", default=["chat", "chat_stream", "documents"],
+                        choices=["chat", "chat_stream", "documents"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--requests", type=int, default=200, help="Chat requests per concurrency level")
+    parser.add_argument("--documents", type=int, default=20, help="Documents per concurrency level")
+    parser.add_argument("--document-kb", type=int, default=64, help="Size of each uploaded document")
+    parser.add_argument("--embedding-latency-ms", type=float, default=20.0)
+    parser.add_argument("--chat-latency-ms", type=float, default=200.0)
+    parser.add_argument("--token-interval-ms", type=float, default=10.0)
+    parser.add_argument("--search-latency-ms", type=float, default=15.0)
+    parser.add_argument("--app-port", type=int, default=8800)
+    parser.add_argument("--fake-port", type=int, default=8801)
+    parser.add_argument("--openai-endpoints", type=int, default=1,
+                        help="Fake Azure OpenAI endpoints to balance over, on consecutive ports")
+    parser.add_argument("--tokens-per-minute", type=int, default=0, help="Token quota of each fake endpoint")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake OpenAI calls failing with 500")
+    parser.add_argument("--app-env", nargs="*", default=[], metavar="KEY=VALUE", help="Extra app settings")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="rag-benchmark-")
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    app_url = f"http://127.0.0.1:{args.app_port}"
+    fake_env = {
+        "FAKE_EMBEDDING_LATENCY_MS": str(args.embedding_latency_ms),
+        "FAKE_CHAT_LATENCY_MS": str(args.chat_latency_ms),
+        "FAKE_TOKEN_INTERVAL_MS": str(args.token_interval_ms),
+        "FAKE_SEARCH_LATENCY_MS": str(args.search_latency_ms),
+        "FAKE_TOKENS_PER_MINUTE": str(args.tokens_per_minute),
+        "FAKE_ERROR_RATE": str(args.error_rate),
+    }
+    fake_ports = [args.fake_port + i for i in range(args.openai_endpoints)]
+    app_env = {
+        **APP_ENV,
+        "AZURE_OPENAI_ENDPOINT": fake_url,
+        "AZURE_SEARCH_ENDPOINT": fake_url,
+        "INGESTION_SPOOL_DIR": os.path.join(scratch, "spool"),
+        "MANIFEST_DIR": os.path.join(scratch, "manifests"),
+        "LOCAL_INDEX_DIR": os.path.join(scratch, "index"),
+        **dict(item.split("=", 1) for item in args.app_env),
+    }
+    if args.openai_endpoints > 1:
+        app_env["AZURE_OPENAI_ENDPOINTS"] = json.dumps([
+            {"name": f"fake-{port}", "endpoint": f"http://127.0.0.1:{port}", "api_key": "fake"}
+            for port in fake_ports
+        ])
+
+    # The first fake also serves the search index
+    fakes = [
+        start_process(
+            [sys.executable, "-m", "uvicorn", "fake_azure:app", "--app-dir", "benchmarks",
+             "--port", str(port), "--log-level", "warning"],
+            fake_env,
+            os.path.join(scratch, f"fake_azure-{port}.log"),
+        )
+        for port in fake_ports
+    ]
+    app = start_process(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(args.app_port), "--log-level", "warning"],
+        app_env,
+        os.path.join(scratch, "app.log"),
+    )
+    results = []
+    try:
+        for port, fake in zip(fake_ports, fakes):
+            await wait_ready(f"http://127.0.0.1:{port}", fake)
+        await wait_ready(app_url, app)
+        limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+        async with httpx.AsyncClient(base_url=app_url, limits=limits, timeout=120.0) as client:
+            print(f"{'scenario':>12} {'conc':>5} {'ok':>5} {'err':>4} {'rps':>8} "
+                  f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'peak MB':>8}")
+            for scenario in args.scenarios:
+                for concurrency in args.concurrency:
+                    async with MemorySampler(app.pid) as memory:
+                        if scenario == "chat":
+                            result = await bench_chat(client, concurrency, args.requests)
+                        elif scenario == "chat_stream":
+                            result = await bench_chat_stream(client, concurrency, args.requests)
+                        else:
+                            result = await bench_documents(client, concurrency, args.documents, args.document_kb)
+                    result.update(memory.summary())
+                    results.append(result)
+                    peak = result["rss_peak_mb"]
+                    print(
+                        f"{scenario:>12} {concurrency:>5} {result['requests']:>5} {result['errors']:>4} "
+                        f"{result['throughput_rps']:>8.1f} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} "
+                        f"{result['p99_ms']:>8.1f} {peak if peak is not None else '-':>8}"
+                    )
+    finally:
+        stop_process(app)
+        for fake in fakes:
+            stop_process(fake)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "fake_backend": fake_env,
+            "app_env": {k: v for k, v in app_env.items() if "KEY" not in k},
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}, process logs in {scratch}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
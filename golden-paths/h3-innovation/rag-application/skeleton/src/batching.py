@@ -0,0 +1,81 @@
+"""Micro-batching of concurrent embedding requests.
+
+Each chat embeds a single query. Under load, sending every query as its own
+`embeddings.create` call spends the request rate limit on one input at a
+time. The batcher holds requests for a few milliseconds, or until enough
+have arrived, then embeds them with one call and hands each caller its
+vector.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+from .metrics import EMBEDDING_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+EmbedFunction = Callable[[list[str]], Awaitable[list[list[float]]]]
+
+
+class EmbeddingBatcher:
+    """Gather embedding requests arriving within a window into one API call."""
+
+    def __init__(self, embed: EmbedFunction, max_batch_size: int = 64, max_wait_ms: float = 5.0):
+        """Initialize the batcher.
+
+        `embed` takes a list of texts and returns their vectors in order. A
+        batch is sent when `max_batch_size` inputs are waiting or
+        `max_wait_ms` after the first of them arrived, whichever is first.
+        """
+        self.embed_many = embed
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._pending: dict[str, list[asyncio.Future]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._in_flight: set[asyncio.Task] = set()
+
+    async def embed(self, text: str) -> list[float]:
+        """Return the embedding of `text`, batched with concurrent callers."""
+        future = asyncio.get_running_loop().create_future()
+        # Identical concurrent texts share one input
+        self._pending.setdefault(text, []).append(future)
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        # The call runs in its own task so a cancelled caller does not cancel the batch
+        task = asyncio.create_task(self._send(batch))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, batch: dict[str, list[asyncio.Future]]) -> None:
+        texts = list(batch)
+        EMBEDDING_BATCH_SIZE.observe(len(texts))
+        try:
+            vectors = await self.embed_many(texts)
+        except Exception as e:
+            logger.warning(f"Embedding batch of {len(texts)} inputs failed: {e}")
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        for text, vector in zip(texts, vectors):
+            for future in batch[text]:
+                if not future.done():
+                    future.set_result(vector)
+
+    async def close(self) -> None:
+        """Send any waiting requests and wait for batches in flight."""
+        self._flush()
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
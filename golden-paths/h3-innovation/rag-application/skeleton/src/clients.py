@@ -0,0 +1,92 @@
+"""Shared HTTP connection pools for the Azure SDK clients."""
+import logging
+from typing import TYPE_CHECKING, Optional
+
+import httpx
+
+if TYPE_CHECKING:
+    import aiohttp
+    from azure.core.pipeline.transport import AioHttpTransport
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPools:
+    """HTTP connection pools shared by every Azure client in the process.
+
+    The OpenAI SDK speaks httpx and the Azure Search SDK speaks aiohttp, so
+    one pool is kept per library. Both are sized from the same settings,
+    opened once in the application lifespan and closed on shutdown. The
+    aiohttp pool (and aiohttp itself) is skipped with `search=False`, for
+    services that do not use Azure AI Search.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 30.0,
+        search: bool = True,
+    ):
+        """Initialize pool settings. Call `open` inside the event loop."""
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self.search = search
+
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._aiohttp_session: Optional["aiohttp.ClientSession"] = None
+
+    async def open(self) -> "ConnectionPools":
+        """Create the underlying pools."""
+        self._http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(self.timeout, connect=5.0),
+        )
+        if self.search:
+            import aiohttp
+
+            self._aiohttp_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_connections,
+                    keepalive_timeout=self.keepalive_expiry,
+                    ttl_dns_cache=300,
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.timeout, connect=5.0),
+            )
+        logger.info(f"Opened HTTP connection pools (max_connections={self.max_connections})")
+        return self
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        """httpx client used by the Azure OpenAI SDK."""
+        if self._http_client is None:
+            raise RuntimeError("Connection pools are not open")
+        return self._http_client
+
+    @property
+    def search_transport(self) -> Optional["AioHttpTransport"]:
+        """Azure Core transport backed by the shared aiohttp session, None with `search=False`."""
+        if self._http_client is None:
+            raise RuntimeError("Connection pools are not open")
+        if self._aiohttp_session is None:
+            return None
+        from azure.core.pipeline.transport import AioHttpTransport
+
+        return AioHttpTransport(session=self._aiohttp_session, session_owner=False)
+
+    async def aclose(self) -> None:
+        """Close the underlying pools."""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+        if self._aiohttp_session is not None:
+            await self._aiohttp_session.close()
+            self._aiohttp_session = None
+        logger.info("Closed HTTP connection pools")
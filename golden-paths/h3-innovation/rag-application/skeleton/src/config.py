@@ -1,7 +1,25 @@
 """Application configuration."""
+from typing import Optional
+
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings
 
 
+class OpenAIEndpointSettings(BaseModel):
+    """One entry of AZURE_OPENAI_ENDPOINTS.
+
+    Deployments default to AZURE_OPENAI_DEPLOYMENT and
+    AZURE_OPENAI_EMBEDDING_DEPLOYMENT.
+    """
+
+    name: str
+    endpoint: str
+    api_key: str
+    deployment: Optional[str] = None
+    embedding_deployment: Optional[str] = None
+    weight: float = 1.0
+
+
 class Settings(BaseSettings):
     """Application settings loaded from environment variables."""
 
@@ -10,21 +28,118 @@ class Settings(BaseSettings):
     azure_openai_api_key: str = ""
     azure_openai_deployment: str = "gpt-4o"
     azure_openai_embedding_deployment: str = "text-embedding-3-large"
+    azure_openai_api_version: str = "2024-02-15-preview"
+    # JSON list of endpoints to balance calls over; overrides the single endpoint above
+    azure_openai_endpoints: list[OpenAIEndpointSettings] = []
+    openai_failures_before_ejection: int = 3
+    openai_ejection_seconds: float = 30.0
 
     # Azure AI Search
     azure_search_endpoint: str = ""
     azure_search_api_key: str = ""
     azure_search_index: str = "documents"
+    search_mode: str = "hybrid"  # hybrid | pipelined
+    search_top_k: int = 5
+    search_rrf_k: int = 60
+
+    # Azure OpenAI adaptive concurrency limits (one per deployment) and retries
+    openai_limiter_enabled: bool = True
+    openai_initial_concurrency: int = 16
+    openai_max_concurrency: int = 128
+    openai_max_queue: int = 200  # calls waiting beyond this fail fast with 503
+    openai_latency_tolerance: float = 2.0  # embedding calls this much slower than usual cut the limit
+    openai_max_retries: int = 3
+    openai_max_backoff_seconds: float = 20.0
+
+    # Retriever backend ("local" keeps an in-process index for offline and dev use)
+    retriever_backend: str = "azure"  # azure | local
+    local_index_dir: str = "/tmp/rag-index"  # empty keeps the index in memory only
+    local_index_mode: str = "exact"  # exact | ivf
+    local_index_nlist: int = 100
+    local_index_nprobe: int = 8
+
+    # Re-ranking of over-fetched candidates
+    reranker: str = "none"  # none | local | llm
+    rerank_candidates: int = 50
+    rerank_lexical_weight: float = 0.5
+    rerank_llm_deployment: str = ""  # defaults to the chat deployment of each endpoint
+    rerank_llm_batch_size: int = 20
 
     # Azure Blob Storage
     azure_storage_connection_string: str = ""
     azure_storage_container: str = "documents"
 
+    # HTTP connection pools (shared by the Azure clients)
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30.0
+    http_timeout: float = 30.0
+
+    # Embedding cache
+    embedding_cache_enabled: bool = True
+    embedding_cache_max_entries: int = 5000
+    embedding_cache_ttl_seconds: float = 86400.0
+    embedding_cache_dir: str = ""  # empty disables the on-disk tier
+    embedding_cache_disk_capacity: int = 100000
+
+    # Query embedding micro-batching across concurrent chats
+    embedding_batch_window_ms: float = 5.0  # 0 disables batching
+    embedding_batch_max_inputs: int = 64
+
+    # Semantic answer cache. Answers are shared by everyone asking a similar
+    # question and only invalidated by ingestion in the same process, so enable
+    # it only when every caller may see every document and a replica serving
+    # answers up to the TTL old after another replica re-ingests is acceptable.
+    semantic_cache_enabled: bool = False
+    semantic_cache_threshold: float = 0.95
+    semantic_cache_max_entries: int = 1000
+    semantic_cache_ttl_seconds: float = 3600.0
+
+    # Load protection (per-client token buckets, concurrency cap for the process)
+    rate_limit_per_second: float = 0.0  # per client address; 0 disables
+    rate_limit_burst: int = 20
+    rate_limit_backend: str = "memory"  # memory | redis (one budget across replicas)
+    rate_limit_redis_url: str = "redis://localhost:6379/0"
+    max_concurrent_requests: int = 100  # streaming chats hold a slot until they finish; 0 disables
+    queue_target_seconds: float = 0.5  # requests expected to wait longer get a 503
+
+    # Conversation history
+    conversation_store: str = "memory"  # memory | redis
+    conversation_redis_url: str = "redis://localhost:6379/0"
+    conversation_max_messages: int = 10
+    conversation_max_conversations: int = 10000
+    conversation_max_bytes: int = 64 * 1024 * 1024
+    conversation_ttl_seconds: float = 86400.0
+
+    # Background ingestion
+    ingestion_queue_backend: str = "memory"  # memory | redis
+    ingestion_queue_redis_url: str = "redis://localhost:6379/0"
+    ingestion_queue_max_size: int = 100
+    ingestion_workers: int = 2
+    ingestion_spool_dir: str = "/tmp/rag-ingestion"  # must be shared storage with the redis backend
+
+    # Document manifests (chunk hashes for incremental re-indexing)
+    manifest_backend: str = "file"  # file | redis | none
+    manifest_dir: str = "/tmp/rag-manifests"  # mount a persistent volume here
+    manifest_redis_url: str = "redis://localhost:6379/0"
+
     # Application
     chunk_size: int = 1000
     chunk_overlap: int = 200
-    max_tokens: int = 4000
+    embedding_batch_size: int = 16
+    index_upload_batch_size: int = 100
+    max_tokens: int = 4000  # prompt budget: system prompt, history, context and question
+    max_history_tokens: int = 1000
+    max_history_messages: int = 4
+    context_duplicate_threshold: float = 0.85  # word-shingle Jaccard similarity
     temperature: float = 0.7
+    fast_json_responses: bool = False  # render responses with orjson (stdlib json if not installed)
+
+    # Tracing (OpenTelemetry, sampled by trace id)
+    tracing_enabled: bool = False
+    tracing_sample_ratio: float = 0.05
+    otel_service_name: str = "${{values.name}}"
+    otel_exporter_otlp_endpoint: str = ""  # e.g. http://otel-collector:4318/v1/traces
 
     # Content Safety
     content_safety_enabled: bool = True
@@ -0,0 +1,164 @@
+"""Token-budgeted prompt assembly.
+
+Search results and conversation history are packed into a fixed prompt
+budget instead of being sent whole. Recent history is kept up to its own
+budget, then chunks are added highest score first, skipping any that is a
+near-duplicate of a chunk already in the prompt (overlapping windows of
+the same document often are) or that no longer fits.
+"""
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+import tiktoken
+
+# Tokens the chat format adds around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+SHINGLE_SIZE = 3
+
+_WORD = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str = "cl100k_base") -> tiktoken.Encoding:
+    """Return a tokenizer, loading each encoding once per process.
+
+    tiktoken downloads an encoding the first time it is used unless it is
+    already in `TIKTOKEN_CACHE_DIR`; the Docker image ships it there.
+    """
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        raise RuntimeError(
+            f"Could not load the {name} tokenizer: {e!r}. Without network access, point "
+            f"TIKTOKEN_CACHE_DIR at a directory where tiktoken.get_encoding({name!r}) has already run."
+        ) from e
+
+
+def _shingles(text: str) -> frozenset:
+    words = _WORD.findall(text.lower())
+    if len(words) <= SHINGLE_SIZE:
+        return frozenset([tuple(words)])
+    return frozenset(tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1))
+
+
+def _relevance(result: dict) -> float:
+    """Return the reranker score of a result, or its search score."""
+    return result.get("@search.reranker_score", result.get("@search.score")) or 0.0
+
+
+def _similarity(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+@dataclass
+class AssembledPrompt:
+    """The context and history chosen for a prompt, with their token counts."""
+
+    context: str
+    history: list[dict]
+    prompt_tokens: int
+    tokens_saved: int
+    chunks_used: int
+    duplicates_dropped: int
+    over_budget_dropped: int
+
+
+class ContextAssembler:
+    """Pack search results and history into a prompt token budget."""
+
+    def __init__(
+        self,
+        max_prompt_tokens: int = 4000,
+        max_history_tokens: int = 1000,
+        max_history_messages: int = 4,
+        duplicate_threshold: float = 0.85,
+        encoding_name: str = "cl100k_base",
+        cache_size: int = 4096,
+    ):
+        """Initialize the assembler.
+
+        Token counts are cached per text, so chunks retrieved again by later
+        queries are not re-tokenized.
+        """
+        self.max_prompt_tokens = max_prompt_tokens
+        self.max_history_tokens = max_history_tokens
+        self.max_history_messages = max_history_messages
+        self.duplicate_threshold = duplicate_threshold
+        self.encoding = get_encoding(encoding_name)
+        self.count_tokens = lru_cache(maxsize=cache_size)(self._count_tokens)
+
+    def _count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode_ordinary(text))
+
+    def message_tokens(self, content: str) -> int:
+        """Return the tokens a chat message with this content takes."""
+        return self.count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+    def assemble(self, system_prompt: str, query: str, results: list, history: list[dict]) -> AssembledPrompt:
+        """Choose the history and context that fit the prompt budget.
+
+        Chunks keep their position in `results` as citation number, so the
+        returned sources still line up with the [n] markers in the answer.
+        """
+        fixed = self.message_tokens(system_prompt) + self.message_tokens(f"Context:\n\n\nQuestion: {query}")
+        kept_history = self._trim_history(history)
+        used = fixed + sum(self.message_tokens(m["content"]) for m in kept_history)
+
+        blocks = [
+            (i, self._format(i, result), _relevance(result))
+            for i, result in enumerate(results, 1)
+        ]
+        selected: list[tuple[int, str]] = []
+        selected_shingles: list[frozenset] = []
+        duplicates = over_budget = 0
+        for i, block, _ in sorted(blocks, key=lambda b: b[2], reverse=True):
+            shingles = _shingles(results[i - 1].get("content", ""))
+            if any(_similarity(shingles, s) >= self.duplicate_threshold for s in selected_shingles):
+                duplicates += 1
+                continue
+            tokens = self.count_tokens(block)
+            if used + tokens > self.max_prompt_tokens:
+                over_budget += 1
+                continue
+            used += tokens
+            selected.append((i, block))
+            selected_shingles.append(shingles)
+
+        # What the prompt would cost with every chunk and the last few messages
+        unbounded = (
+            fixed
+            + sum(self.count_tokens(block) for _, block, _ in blocks)
+            + sum(self.message_tokens(m["content"]) for m in history[-self.max_history_messages:])
+        )
+        return AssembledPrompt(
+            context="\n".join(block for _, block in selected),
+            history=kept_history,
+            prompt_tokens=used,
+            tokens_saved=max(0, unbounded - used),
+            chunks_used=len(selected),
+            duplicates_dropped=duplicates,
+            over_budget_dropped=over_budget,
+        )
+
+    def _trim_history(self, history: list[dict]) -> list[dict]:
+        """Return the most recent messages that fit the history budget."""
+        kept: list[dict] = []
+        tokens = 0
+        for message in reversed(history[-self.max_history_messages:]):
+            tokens += self.message_tokens(message["content"])
+            if tokens > self.max_history_tokens:
+                break
+            kept.append(message)
+        kept.reverse()
+        # Do not open the history with an answer whose question was trimmed
+        if kept and kept[0]["role"] == "assistant":
+            kept = kept[1:]
+        return kept
+
+    @staticmethod
+    def _format(index: int, result: dict) -> str:
+        title = result.get("title", f"Document {index}")
+        return f"[{index}] {title}:\n{result.get('content', '')}\n"
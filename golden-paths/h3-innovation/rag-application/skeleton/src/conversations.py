@@ -0,0 +1,176 @@
+"""Conversation history stores.
+
+History is kept as a compact byte string per conversation: a JSON array of
+`[role, content]` pairs with single-letter roles, zlib-compressed once it
+grows past a few hundred bytes. The in-process store bounds both the
+number of conversations and the bytes held, evicting the least recently
+used; the Redis store shares history across replicas.
+"""
+import json
+import logging
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Optional
+
+from .metrics import CONVERSATION_BYTES, CONVERSATIONS_LIVE
+
+logger = logging.getLogger(__name__)
+
+ROLE_CODES = {"user": "u", "assistant": "a", "system": "s"}
+ROLE_NAMES = {code: role for role, code in ROLE_CODES.items()}
+
+COMPRESS_THRESHOLD = 512
+RAW_PREFIX = b"j"
+COMPRESSED_PREFIX = b"z"
+
+
+def encode_history(history: list[dict]) -> bytes:
+    """Pack conversation messages into a compact byte string."""
+    pairs = [[ROLE_CODES.get(m["role"], m["role"]), m["content"]] for m in history]
+    raw = json.dumps(pairs, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(raw) > COMPRESS_THRESHOLD:
+        return COMPRESSED_PREFIX + zlib.compress(raw, 1)
+    return RAW_PREFIX + raw
+
+
+def decode_history(data: bytes) -> list[dict]:
+    """Unpack a byte string produced by `encode_history`."""
+    prefix, payload = data[:1], data[1:]
+    if prefix == COMPRESSED_PREFIX:
+        payload = zlib.decompress(payload)
+    return [{"role": ROLE_NAMES.get(role, role), "content": content} for role, content in json.loads(payload)]
+
+
+class ConversationStore:
+    """Interface for conversation history backends."""
+
+    def __init__(self, max_messages: int = 10):
+        """Initialize the store. Only the last `max_messages` are kept."""
+        self.max_messages = max_messages
+
+    async def get(self, conversation_id: str) -> list[dict]:
+        """Return the history of a conversation, or an empty list."""
+        raise NotImplementedError
+
+    async def save(self, conversation_id: str, history: list[dict]) -> None:
+        """Replace the history of a conversation."""
+        raise NotImplementedError
+
+    async def append(self, conversation_id: str, history: list[dict], *messages: dict) -> None:
+        """Append messages to `history` and save the most recent ones."""
+        await self.save(conversation_id, (history + list(messages))[-self.max_messages:])
+
+    async def close(self) -> None:
+        """Release backend resources."""
+
+
+class InMemoryConversationStore(ConversationStore):
+    """Process-local store bounded by conversation count, bytes and idle TTL."""
+
+    def __init__(
+        self,
+        max_messages: int = 10,
+        max_conversations: int = 10000,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: float = 86400.0,
+    ):
+        """Initialize the store."""
+        super().__init__(max_messages)
+        self.max_conversations = max_conversations
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # Ordered by last access, which is also expiry order
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def bytes_held(self) -> int:
+        """Total size of the stored history payloads."""
+        return self._bytes
+
+    async def get(self, conversation_id: str) -> list[dict]:
+        entry = self._entries.get(conversation_id)
+        if entry is None:
+            return []
+        expires_at, data = entry
+        if expires_at < time.monotonic():
+            self._remove(conversation_id)
+            self._report()
+            return []
+        self._entries[conversation_id] = (time.monotonic() + self.ttl_seconds, data)
+        self._entries.move_to_end(conversation_id)
+        return decode_history(data)
+
+    async def save(self, conversation_id: str, history: list[dict]) -> None:
+        data = encode_history(history[-self.max_messages:])
+        self._remove(conversation_id)
+        self._entries[conversation_id] = (time.monotonic() + self.ttl_seconds, data)
+        self._bytes += len(data)
+        self._evict()
+        self._report()
+
+    def _remove(self, conversation_id: str) -> None:
+        entry = self._entries.pop(conversation_id, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        while self._entries:
+            oldest_id, (expires_at, _) = next(iter(self._entries.items()))
+            if (
+                expires_at >= now
+                and len(self._entries) <= self.max_conversations
+                and self._bytes <= self.max_bytes
+            ):
+                break
+            self._remove(oldest_id)
+
+    def _report(self) -> None:
+        CONVERSATIONS_LIVE.set(len(self._entries))
+        CONVERSATION_BYTES.set(self._bytes)
+
+
+class RedisConversationStore(ConversationStore):
+    """Store backed by any Redis-protocol server, shared across replicas.
+
+    Takes a `redis.asyncio` compatible client, so a local fake can stand in
+    for the server. Each conversation expires `ttl_seconds` after its last
+    update. Live-conversation and byte gauges are only reported by the
+    in-process store; use the Redis server's own metrics here.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        max_messages: int = 10,
+        ttl_seconds: float = 86400.0,
+        key_prefix: str = "rag:conversation:",
+    ):
+        """Initialize the store."""
+        super().__init__(max_messages)
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.key_prefix = key_prefix
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisConversationStore":
+        """Create a store with a pooled client for `url`."""
+        from redis.asyncio import Redis
+
+        return cls(Redis.from_url(url), **kwargs)
+
+    async def get(self, conversation_id: str) -> list[dict]:
+        data: Optional[bytes] = await self.client.get(self.key_prefix + conversation_id)
+        return decode_history(data) if data else []
+
+    async def save(self, conversation_id: str, history: list[dict]) -> None:
+        data = encode_history(history[-self.max_messages:])
+        await self.client.set(self.key_prefix + conversation_id, data, ex=int(self.ttl_seconds))
+
+    async def close(self) -> None:
+        await self.client.aclose()
@@ -0,0 +1,182 @@
+"""Content-addressed embedding cache.
+
+Vectors are keyed by a digest of the normalized text and the embedding
+model, held as packed float32 arrays in a bounded in-memory LRU with TTL,
+and optionally persisted to a memory-mapped file so they survive restarts.
+"""
+import hashlib
+import logging
+import os
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+import numpy as np
+
+from .metrics import EMBEDDING_CACHE_EVICTIONS, EMBEDDING_CACHE_HITS, EMBEDDING_CACHE_MISSES
+
+logger = logging.getLogger(__name__)
+
+KEY_BYTES = 32
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different inputs share a cache entry."""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def cache_key(text: str, model: str) -> bytes:
+    """Return the content address of `text` embedded with `model`."""
+    digest = hashlib.sha256()
+    digest.update(model.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(normalize_text(text).encode("utf-8"))
+    return digest.digest()
+
+
+class DiskEmbeddingTier:
+    """Fixed-capacity ring of embeddings in a memory-mapped file.
+
+    Each slot holds the key digest, the write time and the float32 vector.
+    When the ring is full the oldest slot is overwritten. The file is owned
+    by a single process; give each worker its own directory.
+    """
+
+    def __init__(self, directory: str, capacity: int, ttl_seconds: float):
+        """Initialize the tier, reopening an existing cache file if present."""
+        self.directory = directory
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self._slots: Optional[np.memmap] = None
+        self._index: dict[bytes, int] = {}
+        self._cursor = 0
+        self._dimensions: Optional[int] = None
+
+        os.makedirs(directory, exist_ok=True)
+        existing = self._existing_dimensions()
+        if existing is not None:
+            self._open(existing)
+
+    def _path(self, dimensions: int) -> str:
+        return os.path.join(self.directory, f"embeddings-{dimensions}.bin")
+
+    def _existing_dimensions(self) -> Optional[int]:
+        for name in sorted(os.listdir(self.directory)):
+            if name.startswith("embeddings-") and name.endswith(".bin"):
+                return int(name[len("embeddings-"):-len(".bin")])
+        return None
+
+    def _open(self, dimensions: int) -> None:
+        dtype = np.dtype([("key", f"V{KEY_BYTES}"), ("ts", "<f8"), ("vec", "<f4", (dimensions,))])
+        path = self._path(dimensions)
+        mode = "r+" if os.path.exists(path) else "w+"
+        self._slots = np.memmap(path, dtype=dtype, mode=mode, shape=(self.capacity,))
+        self._dimensions = dimensions
+
+        timestamps = np.asarray(self._slots["ts"])
+        occupied = np.flatnonzero(timestamps > 0)
+        self._index = {bytes(self._slots["key"][slot]): int(slot) for slot in occupied}
+        # Empty slots have ts == 0, so this is the first free or the oldest slot
+        self._cursor = int(np.argmin(timestamps))
+        logger.info(f"Opened embedding cache file {path} with {len(self._index)} entries")
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        """Return a copy of the cached vector, or None."""
+        slot = self._index.get(key)
+        if slot is None or self._slots is None:
+            return None
+        if time.time() - float(self._slots["ts"][slot]) > self.ttl_seconds:
+            return None
+        return np.array(self._slots["vec"][slot], dtype=np.float32)
+
+    def put(self, key: bytes, vector: np.ndarray) -> None:
+        """Store a vector, overwriting the oldest slot when full."""
+        if self._slots is None:
+            self._open(len(vector))
+        if len(vector) != self._dimensions:
+            logger.warning(f"Skipping disk cache write: expected {self._dimensions} dimensions, got {len(vector)}")
+            return
+
+        slot = self._index.get(key)
+        if slot is None:
+            slot = self._cursor
+            self._cursor = (self._cursor + 1) % self.capacity
+            previous = bytes(self._slots["key"][slot])
+            if self._index.pop(previous, None) is not None:
+                EMBEDDING_CACHE_EVICTIONS.labels(tier="disk").inc()
+
+        self._slots["key"][slot] = np.void(key)
+        self._slots["ts"][slot] = time.time()
+        self._slots["vec"][slot] = vector
+        self._index[key] = slot
+
+    def close(self) -> None:
+        """Flush pending writes to disk."""
+        if self._slots is not None:
+            self._slots.flush()
+            self._slots = None
+
+
+class EmbeddingCache:
+    """Two-tier embedding cache: in-memory LRU with TTL, then optional disk."""
+
+    def __init__(
+        self,
+        max_entries: int = 5000,
+        ttl_seconds: float = 86400.0,
+        disk_directory: Optional[str] = None,
+        disk_capacity: int = 100000,
+    ):
+        """Initialize the cache. `disk_directory` enables the on-disk tier."""
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[bytes, tuple[float, np.ndarray]] = OrderedDict()
+        self.disk = DiskEmbeddingTier(disk_directory, disk_capacity, ttl_seconds) if disk_directory else None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, text: str, model: str) -> Optional[np.ndarray]:
+        """Look up the embedding of `text` for `model`."""
+        key = cache_key(text, model)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, vector = entry
+            if expires_at >= time.monotonic():
+                self._entries.move_to_end(key)
+                EMBEDDING_CACHE_HITS.labels(tier="memory").inc()
+                return vector
+            del self._entries[key]
+            EMBEDDING_CACHE_EVICTIONS.labels(tier="memory").inc()
+
+        if self.disk is not None:
+            vector = self.disk.get(key)
+            if vector is not None:
+                self._remember(key, vector)
+                EMBEDDING_CACHE_HITS.labels(tier="disk").inc()
+                return vector
+
+        EMBEDDING_CACHE_MISSES.inc()
+        return None
+
+    def put(self, text: str, model: str, embedding: Sequence[float]) -> np.ndarray:
+        """Store the embedding of `text` for `model` and return it packed."""
+        key = cache_key(text, model)
+        vector = np.asarray(embedding, dtype=np.float32)
+        self._remember(key, vector)
+        if self.disk is not None:
+            self.disk.put(key, vector)
+        return vector
+
+    def _remember(self, key: bytes, vector: np.ndarray) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            EMBEDDING_CACHE_EVICTIONS.labels(tier="memory").inc()
+
+    def close(self) -> None:
+        """Flush the on-disk tier."""
+        if self.disk is not None:
+            self.disk.close()
@@ -0,0 +1,265 @@
+"""Load balancing and failover across Azure OpenAI endpoints.
+
+One regional deployment's quota caps the whole service, so chat and
+embedding calls are spread over a pool of endpoints. Each call goes to the
+healthy endpoint with the fewest calls outstanding relative to its weight
+and its remaining token quota, which Azure reports in the
+`x-ratelimit-remaining-tokens` header of every response. An endpoint that
+answers 429 is ejected until its `retry-after` passes; one that keeps failing
+with connection errors, timeouts or 5xx is ejected for `ejection_seconds`.
+A failed call is tried again on the next best endpoint it has not used yet.
+
+Every endpoint must serve the same embedding model, or vectors from
+different endpoints would not be comparable.
+"""
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import httpx
+import openai
+from openai import DEFAULT_MAX_RETRIES, AsyncAzureOpenAI
+from opentelemetry import trace
+
+from .limiter import RETRYABLE_ERRORS, AdaptiveLimiter, OverloadedError, retry_after_seconds
+from .metrics import OPENAI_ENDPOINT_CALLS, OPENAI_ENDPOINT_HEALTHY, OPENAI_ENDPOINT_REMAINING_TOKENS, OPENAI_FAILOVERS
+
+logger = logging.getLogger(__name__)
+
+# Azure resets token quotas every minute, so older readings are ignored
+QUOTA_WINDOW_SECONDS = 60.0
+
+LimiterFactory = Callable[[str], Optional[AdaptiveLimiter]]
+
+
+@dataclass
+class OpenAIEndpoint:
+    """One Azure OpenAI resource and the deployments used on it."""
+
+    name: str
+    endpoint: str
+    api_key: str
+    chat_deployment: str
+    embedding_deployment: str
+    weight: float = 1.0
+
+
+@dataclass
+class _EndpointState:
+    """Runtime state of one endpoint in the pool."""
+
+    config: OpenAIEndpoint
+    client: AsyncAzureOpenAI
+    limiters: dict[str, Optional[AdaptiveLimiter]]
+    outstanding: int = 0
+    failures: int = 0
+    ejected_until: float = 0.0
+    remaining_tokens: Optional[int] = None
+    token_capacity: int = 0
+    quota_seen_at: float = 0.0
+    deployments: dict[str, str] = field(default_factory=dict)
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def headroom(self, now: float) -> float:
+        """Fraction of the token quota left, 1.0 when unknown or stale."""
+        if self.remaining_tokens is None or now - self.quota_seen_at > QUOTA_WINDOW_SECONDS:
+            return 1.0
+        return max(self.remaining_tokens / max(self.token_capacity, 1), 0.01)
+
+
+class OpenAIEndpointPool:
+    """Routes chat and embedding calls over weighted Azure OpenAI endpoints."""
+
+    def __init__(
+        self,
+        endpoints: list[OpenAIEndpoint],
+        api_version: str = "2024-02-15-preview",
+        http_client: Optional[httpx.AsyncClient] = None,
+        limiter_factory: Optional[LimiterFactory] = None,
+        failures_before_ejection: int = 3,
+        ejection_seconds: float = 30.0,
+    ):
+        """Initialize the pool.
+
+        `limiter_factory` is called with a name such as "chat/eastus" and
+        returns the adaptive limiter for that endpoint and call kind, or
+        None. With limiters in place the OpenAI clients' own retries are
+        turned off.
+        """
+        if not endpoints:
+            raise ValueError("At least one Azure OpenAI endpoint is required")
+        if len({endpoint.name for endpoint in endpoints}) != len(endpoints):
+            raise ValueError("Azure OpenAI endpoint names must be unique")
+
+        self.failures_before_ejection = failures_before_ejection
+        self.ejection_seconds = ejection_seconds
+        self._owns_http_client = http_client is None
+
+        self._endpoints: list[_EndpointState] = []
+        for endpoint in endpoints:
+            limiters = {}
+            for kind in ("chat", "embedding"):
+                limiters[kind] = limiter_factory(f"{kind}/{endpoint.name}") if limiter_factory else None
+            client = AsyncAzureOpenAI(
+                azure_endpoint=endpoint.endpoint,
+                api_key=endpoint.api_key,
+                api_version=api_version,
+                http_client=http_client,
+                max_retries=0 if any(limiters.values()) else DEFAULT_MAX_RETRIES,
+            )
+            self._endpoints.append(_EndpointState(
+                config=endpoint,
+                client=client,
+                limiters=limiters,
+                deployments={"chat": endpoint.chat_deployment, "embedding": endpoint.embedding_deployment},
+            ))
+            OPENAI_ENDPOINT_HEALTHY.labels(endpoint=endpoint.name).set(1)
+
+    @property
+    def endpoints(self) -> list[OpenAIEndpoint]:
+        return [state.config for state in self._endpoints]
+
+    async def chat_completion(self, deployment: Optional[str] = None, **kwargs):
+        """Create a chat completion (streamed with `stream=True`) on the best endpoint.
+
+        `deployment` overrides the endpoint's chat deployment for this call;
+        the call still counts against the endpoint's chat limiter.
+        """
+        return await self._call("chat", deployment=deployment, **kwargs)
+
+    async def embeddings(self, **kwargs):
+        """Create embeddings on the best endpoint."""
+        return await self._call("embedding", **kwargs)
+
+    async def _call(self, kind: str, deployment: Optional[str] = None, **kwargs):
+        tried: set[str] = set()
+        last_error: Optional[Exception] = None
+        while True:
+            state = self._pick(tried)
+            if state is None:
+                break
+            tried.add(state.config.name)
+            if last_error is not None:
+                OPENAI_FAILOVERS.labels(kind=kind).inc()
+                logger.warning(f"Retrying {kind} call on {state.config.name} after {type(last_error).__name__}")
+            try:
+                return await self._call_endpoint(state, kind, deployment, **kwargs)
+            except (*RETRYABLE_ERRORS, OverloadedError) as e:
+                self._on_failure(state, kind, e)
+                last_error = e
+
+        if isinstance(last_error, OverloadedError) or isinstance(last_error, openai.RateLimitError):
+            raise OverloadedError(f"All Azure OpenAI endpoints are busy for {kind}", self._retry_after()) from last_error
+        raise last_error
+
+    async def _call_endpoint(self, state: _EndpointState, kind: str, deployment: Optional[str], **kwargs):
+        resource = state.client.chat.completions if kind == "chat" else state.client.embeddings
+        limiter = state.limiters[kind]
+        model = deployment or state.deployments[kind]
+        trace.get_current_span().set_attribute("llm.endpoint", state.config.name)
+
+        state.outstanding += 1
+        try:
+            create = resource.with_raw_response.create
+            if limiter is not None:
+                raw = await limiter.call(create, model=model, **kwargs)
+            else:
+                raw = await create(model=model, **kwargs)
+        finally:
+            state.outstanding -= 1
+
+        self._update_quota(state, raw.headers)
+        state.failures = 0
+        OPENAI_ENDPOINT_HEALTHY.labels(endpoint=state.config.name).set(1)
+        OPENAI_ENDPOINT_CALLS.labels(endpoint=state.config.name, outcome="ok").inc()
+        return raw.parse()
+
+    def _pick(self, tried: set[str]) -> Optional[_EndpointState]:
+        """Pick the healthy untried endpoint with the lowest load for its weight and quota."""
+        now = time.monotonic()
+        healthy = [state for state in self._endpoints if state.config.name not in tried and state.healthy(now)]
+        if not healthy:
+            if tried:
+                return None
+            # Every endpoint is ejected: probe the one that comes back first
+            return min(self._endpoints, key=lambda state: state.ejected_until)
+        return min(
+            healthy,
+            key=lambda state: (
+                (state.outstanding + 1) / (state.config.weight * state.headroom(now)),
+                random.random(),
+            ),
+        )
+
+    def _update_quota(self, state: _EndpointState, headers: httpx.Headers) -> None:
+        remaining = headers.get("x-ratelimit-remaining-tokens")
+        if remaining is None:
+            return
+        try:
+            state.remaining_tokens = int(float(remaining))
+        except ValueError:
+            return
+        state.token_capacity = max(state.token_capacity, state.remaining_tokens)
+        state.quota_seen_at = time.monotonic()
+        OPENAI_ENDPOINT_REMAINING_TOKENS.labels(endpoint=state.config.name).set(state.remaining_tokens)
+
+    def _on_failure(self, state: _EndpointState, kind: str, error: Exception) -> None:
+        name = state.config.name
+        throttled = isinstance(error, openai.RateLimitError) or isinstance(error.__cause__, openai.RateLimitError)
+        OPENAI_ENDPOINT_CALLS.labels(endpoint=name, outcome="throttled" if throttled else "error").inc()
+
+        if throttled:
+            # The quota is spent until the server says otherwise
+            if isinstance(error, OverloadedError):
+                delay = error.retry_after
+            else:
+                delay = retry_after_seconds(error) or 1.0
+            state.remaining_tokens = 0
+            state.quota_seen_at = time.monotonic()
+            self._eject(state, delay, "throttled")
+        elif isinstance(error, OverloadedError):
+            # Shed by our own limiter: the endpoint is busy, not broken
+            return
+        else:
+            state.failures += 1
+            if state.failures >= self.failures_before_ejection:
+                state.failures = 0
+                self._eject(state, self.ejection_seconds, f"{kind} call failed with {type(error).__name__}")
+
+    def _eject(self, state: _EndpointState, seconds: float, reason: str) -> None:
+        now = time.monotonic()
+        if state.healthy(now):
+            logger.warning(f"Ejected Azure OpenAI endpoint {state.config.name} for {seconds:.1f}s: {reason}")
+        # Calls already in flight when the endpoint was ejected may fail too
+        state.ejected_until = max(state.ejected_until, now + seconds)
+        OPENAI_ENDPOINT_HEALTHY.labels(endpoint=state.config.name).set(0)
+
+    def _retry_after(self) -> float:
+        now = time.monotonic()
+        return max(min(state.ejected_until for state in self._endpoints) - now, 1.0)
+
+    def health(self) -> list[dict]:
+        """Describe each endpoint's load, quota and ejection state."""
+        now = time.monotonic()
+        report = []
+        for state in self._endpoints:
+            healthy = state.healthy(now)
+            OPENAI_ENDPOINT_HEALTHY.labels(endpoint=state.config.name).set(1 if healthy else 0)
+            report.append({
+                "name": state.config.name,
+                "healthy": healthy,
+                "outstanding": state.outstanding,
+                "remaining_tokens": state.remaining_tokens,
+                "weight": state.config.weight,
+            })
+        return report
+
+    async def close(self) -> None:
+        """Close the clients, leaving a shared HTTP client open for its owner."""
+        if self._owns_http_client:
+            for state in self._endpoints:
+                await state.client.close()
@@ -0,0 +1,13 @@
+"""Errors raised by the service layer and handled by the API.
+
+Kept free of SDK imports so `main` can catch them without loading the
+Azure clients at import time.
+"""
+
+
+class OverloadedError(Exception):
+    """Raised when a call is shed or stays throttled after every retry."""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
@@ -0,0 +1,351 @@
+"""Document ingestion: extract, chunk, embed and upload.
+
+Every stage is streaming. Text is extracted in blocks from a file object,
+cut into token windows as it arrives, embedded a batch at a time and
+uploaded to the search index in sized batches, so memory stays bounded by
+the batch sizes rather than the size of the document.
+
+Indexing is incremental. Chunk ids are derived from the content hash, and
+the document manifest lists the chunks already in the index, so unchanged
+chunks are never re-embedded and chunks that disappeared are deleted.
+"""
+import asyncio
+import codecs
+import hashlib
+import itertools
+import logging
+import os
+import time
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from typing import Awaitable, BinaryIO, Callable, Iterable, Iterator, Optional
+
+from .context import get_encoding
+from .endpoints import OpenAIEndpointPool
+from .manifest import DocumentManifest, ManifestStore, content_hash
+from .metrics import CHUNKS_DELETED, CHUNKS_INDEXED, CHUNKS_UNCHANGED
+from .retrieval import Retriever
+from .telemetry import record_usage, stage
+
+logger = logging.getLogger(__name__)
+
+READ_BLOCK_BYTES = 64 * 1024
+PARAGRAPHS_PER_BLOCK = 50
+
+
+def document_key(filename: str) -> str:
+    """Return a search-index-safe key for a document name."""
+    return hashlib.sha256(filename.encode("utf-8")).hexdigest()[:32]
+
+
+# -----------------------------------------------------------------------------
+# Extraction
+# -----------------------------------------------------------------------------
+
+class _TextCollector(HTMLParser):
+    """Incremental HTML-to-text parser that skips scripts and styles."""
+
+    SKIPPED_TAGS = {"script", "style", "noscript", "template"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: list[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED_TAGS:
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag in ("p", "div", "li", "br", "h1", "h2", "h3", "h4", "h5", "h6", "tr"):
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+    def drain(self) -> str:
+        text, self.parts = "".join(self.parts), []
+        return text
+
+
+def _read_text(file: BinaryIO) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    while block := file.read(READ_BLOCK_BYTES):
+        yield decoder.decode(block)
+    yield decoder.decode(b"", final=True)
+
+
+def _read_html(file: BinaryIO) -> Iterator[str]:
+    parser = _TextCollector()
+    for text in _read_text(file):
+        parser.feed(text)
+        yield parser.drain()
+    parser.close()
+    yield parser.drain()
+
+
+def _read_pdf(file: BinaryIO) -> Iterator[str]:
+    from pypdf import PdfReader
+
+    for page in PdfReader(file).pages:
+        yield (page.extract_text() or "") + "\n"
+
+
+def _read_docx(file: BinaryIO) -> Iterator[str]:
+    from docx import Document
+
+    paragraphs = (p.text for p in Document(file).paragraphs)
+    while block := list(itertools.islice(paragraphs, PARAGRAPHS_PER_BLOCK)):
+        yield "\n".join(block) + "\n"
+
+
+EXTRACTORS = {
+    ".pdf": _read_pdf,
+    ".docx": _read_docx,
+    ".html": _read_html,
+    ".htm": _read_html,
+}
+
+CONTENT_TYPES = {
+    "application/pdf": ".pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": ".docx",
+    "text/html": ".html",
+}
+
+
+def extract_text(file: BinaryIO, filename: str, content_type: Optional[str] = None) -> Iterator[str]:
+    """Yield the text of a document in blocks.
+
+    The format is chosen from the file extension, then the content type;
+    anything else is read as UTF-8 text (TXT, Markdown, CSV, ...).
+    """
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension not in EXTRACTORS:
+        extension = CONTENT_TYPES.get((content_type or "").split(";")[0].strip(), extension)
+    reader = EXTRACTORS.get(extension, _read_text)
+    return reader(file)
+
+
+# -----------------------------------------------------------------------------
+# Chunking
+# -----------------------------------------------------------------------------
+
+class TokenChunker:
+    """Cut streaming text into overlapping windows of `chunk_size` tokens."""
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200, encoding_name: str = "cl100k_base"):
+        """Initialize the chunker."""
+        if not 0 <= chunk_overlap < chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.encoding = get_encoding(encoding_name)
+
+    def chunks(self, pieces: Iterable[str]) -> Iterator[str]:
+        """Yield chunk texts as soon as enough tokens have arrived."""
+        stride = self.chunk_size - self.chunk_overlap
+        tokens: list[int] = []
+        carry = ""
+        emitted = False
+        for piece in pieces:
+            # Hold back the trailing partial word so tokens do not straddle blocks
+            text = carry + piece
+            cut = max(text.rfind(" "), text.rfind("\n"))
+            if cut < 0 and len(text) < READ_BLOCK_BYTES:
+                carry = text
+                continue
+            cut = cut if cut >= 0 else len(text) - 1
+            text, carry = text[:cut + 1], text[cut + 1:]
+            tokens.extend(self.encoding.encode_ordinary(text))
+            while len(tokens) >= self.chunk_size:
+                yield self.encoding.decode(tokens[:self.chunk_size])
+                del tokens[:stride]
+                emitted = True
+
+        if carry:
+            tokens.extend(self.encoding.encode_ordinary(carry))
+        while len(tokens) >= self.chunk_size:
+            yield self.encoding.decode(tokens[:self.chunk_size])
+            del tokens[:stride]
+            emitted = True
+        # The first `chunk_overlap` tokens left over are already in the last chunk
+        if tokens and (not emitted or len(tokens) > self.chunk_overlap):
+            yield self.encoding.decode(tokens)
+
+
+# -----------------------------------------------------------------------------
+# Pipeline
+# -----------------------------------------------------------------------------
+
+@dataclass
+class IngestionResult:
+    """What an ingestion run changed in the index."""
+
+    chunks: int
+    embedded: int
+    deleted: int
+    version: int
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.embedded or self.deleted)
+
+
+class IngestionPipeline:
+    """Streams a document through chunking, embedding and index upload."""
+
+    def __init__(
+        self,
+        openai_pool: OpenAIEndpointPool,
+        retriever: Retriever,
+        manifests: Optional[ManifestStore] = None,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        embedding_batch_size: int = 16,
+        upload_batch_size: int = 100,
+    ):
+        """Initialize the pipeline with the service's clients.
+
+        Without a manifest store every run re-embeds and uploads all chunks.
+        """
+        self.openai_pool = openai_pool
+        self.retriever = retriever
+        self.manifests = manifests
+        self.chunker = TokenChunker(chunk_size, chunk_overlap)
+        self.embedding_batch_size = embedding_batch_size
+        self.upload_batch_size = upload_batch_size
+
+    async def run(
+        self,
+        filename: str,
+        file: BinaryIO,
+        content_type: Optional[str] = None,
+        on_progress: Optional[Callable[[int], Awaitable[None]]] = None,
+    ) -> IngestionResult:
+        """Index a document, embedding and uploading only changed chunks.
+
+        `on_progress` is awaited with the number of chunks processed so far
+        after each upload batch.
+        """
+        key = document_key(filename)
+        title = os.path.basename(filename)
+        chunks = self.chunker.chunks(extract_text(file, filename, content_type))
+
+        previous = await self._load_manifest(key, filename)
+        current: dict[str, str] = {}
+        pending: list[dict] = []
+        embedded = 0
+        while True:
+            # Extraction and tokenization are blocking, so pull each batch in a thread
+            with stage("chunk"):
+                batch = await asyncio.to_thread(_take, chunks, self.embedding_batch_size)
+            if not batch:
+                break
+
+            new_chunks = []
+            unchanged = 0
+            for text in batch:
+                digest = content_hash(text)
+                chunk_id = f"{key}-{digest[:32]}"
+                # A chunk repeated within the document is indexed once and not counted again
+                if chunk_id in current:
+                    continue
+                current[chunk_id] = digest
+                if previous.chunks.get(chunk_id) == digest:
+                    unchanged += 1
+                else:
+                    new_chunks.append((chunk_id, text))
+            CHUNKS_UNCHANGED.inc(unchanged)
+            if not new_chunks:
+                continue
+
+            vectors = await self.embed_batch([text for _, text in new_chunks])
+            for (chunk_id, text), vector in zip(new_chunks, vectors):
+                pending.append({
+                    "id": chunk_id,
+                    "title": title,
+                    "content": text,
+                    "source": filename,
+                    "content_vector": vector,
+                })
+            embedded += len(new_chunks)
+
+            if len(pending) >= self.upload_batch_size:
+                await self.upload(pending[:self.upload_batch_size])
+                del pending[:self.upload_batch_size]
+                if on_progress is not None:
+                    await on_progress(len(current))
+
+        if pending:
+            await self.upload(pending)
+
+        # Delete stale chunks only after their replacements are searchable
+        stale = [chunk_id for chunk_id in previous.chunks if chunk_id not in current]
+        for i in range(0, len(stale), self.upload_batch_size):
+            await self.delete(stale[i:i + self.upload_batch_size])
+
+        version = previous.version
+        if embedded or stale or not previous.version:
+            version += 1
+            if self.manifests is not None:
+                await self.manifests.save(DocumentManifest(
+                    document_id=key,
+                    filename=filename,
+                    version=version,
+                    chunks=current,
+                    updated_at=time.time(),
+                ))
+
+        result = IngestionResult(chunks=len(current), embedded=embedded, deleted=len(stale), version=version)
+        logger.info(
+            f"Indexed {filename} v{version}: {result.chunks} chunks, "
+            f"{result.embedded} embedded, {result.deleted} deleted"
+        )
+        return result
+
+    async def _load_manifest(self, key: str, filename: str) -> DocumentManifest:
+        """Return the manifest for a document, rebuilding it from the index if lost."""
+        if self.manifests is None:
+            return DocumentManifest(document_id=key, filename=filename)
+        manifest = await self.manifests.load(key)
+        if manifest is None:
+            manifest = await self._manifest_from_index(key, filename)
+        return manifest
+
+    async def _manifest_from_index(self, key: str, filename: str) -> DocumentManifest:
+        """Hash the chunks the index already holds for a document."""
+        manifest = DocumentManifest(document_id=key, filename=filename)
+        try:
+            for result in await self.retriever.chunks_for_source(filename):
+                manifest.chunks[result["id"]] = content_hash(result.get("content") or "")
+        except Exception as e:
+            logger.warning(f"Could not rebuild manifest for {filename} from the index: {e}")
+        if manifest.chunks:
+            manifest.version = 1
+        return manifest
+
+    async def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        """Embed several texts with one API call."""
+        with stage("embed_batch", inputs=len(texts)):
+            response = await self.openai_pool.embeddings(input=texts)
+            record_usage("ingestion_embedding", response.usage)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    async def upload(self, documents: list[dict]) -> None:
+        """Merge or upload a batch of chunk documents into the index."""
+        with stage("upload", chunks=len(documents)):
+            await self.retriever.upsert(documents)
+        CHUNKS_INDEXED.inc(len(documents))
+
+    async def delete(self, chunk_ids: list[str]) -> None:
+        """Delete a batch of chunk documents from the index."""
+        with stage("delete", chunks=len(chunk_ids)):
+            await self.retriever.delete(chunk_ids)
+        CHUNKS_DELETED.inc(len(chunk_ids))
+
+
+def _take(iterator: Iterator[str], count: int) -> list[str]:
+    return list(itertools.islice(iterator, count))
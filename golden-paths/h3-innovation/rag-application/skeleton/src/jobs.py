@@ -0,0 +1,336 @@
+"""Background ingestion jobs.
+
+`POST /documents` spools the upload to disk and enqueues a job; a bounded
+pool of workers drains the queue through `RAGService.index_document`. The
+queue backend is pluggable: the in-process queue suits a single replica,
+the Redis queue lets any replica pick up work and report status, provided
+the spool directory is on storage all replicas share.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, BinaryIO, Optional
+
+from .metrics import (
+    DOCUMENTS_INDEXED,
+    INGESTION_CHUNKS_PER_SECOND,
+    INGESTION_DOCS_PER_SECOND,
+    INGESTION_JOBS,
+    INGESTION_QUEUE_DEPTH,
+    INGESTION_WORKERS_BUSY,
+)
+from .telemetry import stage
+
+logger = logging.getLogger(__name__)
+
+# Backoff between attempts to read the queue after a backend error
+QUEUE_RETRY_INITIAL_SECONDS = 0.5
+QUEUE_RETRY_MAX_SECONDS = 30.0
+
+
+class QueueFullError(Exception):
+    """Raised when the ingestion queue is at capacity."""
+
+
+@dataclass
+class IngestionJob:
+    """A document waiting for, or going through, ingestion."""
+
+    filename: str
+    path: str
+    content_type: Optional[str] = None
+    bytes_total: int = 0
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "queued"  # queued | running | succeeded | failed
+    bytes_read: int = 0
+    chunks: int = 0
+    chunks_embedded: int = 0
+    chunks_deleted: int = 0
+    version: Optional[int] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        """Return the public view of the job."""
+        data = asdict(self)
+        data.pop("path")
+        data["progress"] = round(self.bytes_read / self.bytes_total, 4) if self.bytes_total else 0.0
+        return data
+
+
+class JobQueue:
+    """Interface for ingestion queue backends."""
+
+    async def put(self, job: IngestionJob) -> None:
+        """Enqueue a job, raising QueueFullError when at capacity."""
+        raise NotImplementedError
+
+    async def get(self) -> IngestionJob:
+        """Wait for the next job."""
+        raise NotImplementedError
+
+    async def save(self, job: IngestionJob) -> None:
+        """Persist the status of a job."""
+        raise NotImplementedError
+
+    async def load(self, job_id: str) -> Optional[IngestionJob]:
+        """Return a job by id, or None."""
+        raise NotImplementedError
+
+    async def depth(self) -> int:
+        """Return the number of queued jobs."""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """Release backend resources."""
+
+
+class InMemoryJobQueue(JobQueue):
+    """Bounded asyncio queue with job status kept in process."""
+
+    def __init__(self, max_size: int = 100, max_finished: int = 1000):
+        """Initialize the queue. Only the last `max_finished` results are kept."""
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self._jobs: dict[str, IngestionJob] = {}
+        self._finished: deque = deque()
+        self.max_finished = max_finished
+
+    async def put(self, job: IngestionJob) -> None:
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError("Ingestion queue is full") from None
+        self._jobs[job.id] = job
+
+    async def get(self) -> IngestionJob:
+        return await self._queue.get()
+
+    async def save(self, job: IngestionJob) -> None:
+        self._jobs[job.id] = job
+        if job.status in ("succeeded", "failed"):
+            self._finished.append(job.id)
+            while len(self._finished) > self.max_finished:
+                self._jobs.pop(self._finished.popleft(), None)
+
+    async def load(self, job_id: str) -> Optional[IngestionJob]:
+        return self._jobs.get(job_id)
+
+    async def depth(self) -> int:
+        return self._queue.qsize()
+
+
+class RedisJobQueue(JobQueue):
+    """Durable queue on a Redis list with job status in Redis keys.
+
+    Takes a `redis.asyncio` compatible client. A job taken by a replica that
+    then crashes stays in the "running" state rather than being retried.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        max_size: int = 100,
+        key_prefix: str = "rag:ingestion:",
+        status_ttl_seconds: int = 7 * 86400,
+    ):
+        """Initialize the queue."""
+        self.client = client
+        self.max_size = max_size
+        self.queue_key = f"{key_prefix}queue"
+        self.job_prefix = f"{key_prefix}job:"
+        self.status_ttl_seconds = status_ttl_seconds
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisJobQueue":
+        """Create a queue with a pooled client for `url`."""
+        from redis.asyncio import Redis
+
+        return cls(Redis.from_url(url), **kwargs)
+
+    async def put(self, job: IngestionJob) -> None:
+        if await self.client.llen(self.queue_key) >= self.max_size:
+            raise QueueFullError("Ingestion queue is full")
+        await self.save(job)
+        await self.client.lpush(self.queue_key, job.id)
+
+    async def get(self) -> IngestionJob:
+        while True:
+            item = await self.client.brpop(self.queue_key, timeout=5)
+            if item is None:
+                continue
+            job = await self.load(item[1].decode() if isinstance(item[1], bytes) else item[1])
+            if job is not None:
+                return job
+
+    async def save(self, job: IngestionJob) -> None:
+        await self.client.set(self.job_prefix + job.id, json.dumps(asdict(job)), ex=self.status_ttl_seconds)
+
+    async def load(self, job_id: str) -> Optional[IngestionJob]:
+        data = await self.client.get(self.job_prefix + job_id)
+        return IngestionJob(**json.loads(data)) if data else None
+
+    async def depth(self) -> int:
+        return await self.client.llen(self.queue_key)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+class _ProgressReader:
+    """File wrapper that reports how far into the file the pipeline has read.
+
+    Progress is the file position, not a sum of reads: parsers such as pypdf
+    seek back and read parts of the file again.
+    """
+
+    def __init__(self, file: BinaryIO, job: IngestionJob):
+        self._file = file
+        self._job = job
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._file.read(size)
+        self._job.bytes_read = min(self._file.tell(), self._job.bytes_total)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+class _Throughput:
+    """Sliding-window docs/s and chunks/s, computed when metrics are scraped."""
+
+    def __init__(self, window_seconds: float = 60.0):
+        self.window_seconds = window_seconds
+        self._events: deque = deque()
+        INGESTION_DOCS_PER_SECOND.set_function(self.docs_per_second)
+        INGESTION_CHUNKS_PER_SECOND.set_function(self.chunks_per_second)
+
+    def record(self, chunks: int) -> None:
+        self._events.append((time.monotonic(), chunks))
+        self._prune()
+
+    def docs_per_second(self) -> float:
+        self._prune()
+        return len(self._events) / self.window_seconds
+
+    def chunks_per_second(self) -> float:
+        self._prune()
+        return sum(chunks for _, chunks in self._events) / self.window_seconds
+
+    def _prune(self) -> None:
+        cutoff = time.monotonic() - self.window_seconds
+        while self._events and self._events[0][0] < cutoff:
+            self._events.popleft()
+
+
+class IngestionWorkerPool:
+    """Fixed number of workers draining a job queue."""
+
+    def __init__(self, queue: JobQueue, rag_service, concurrency: int = 2):
+        """Initialize the pool. Call `start` inside the event loop."""
+        self.queue = queue
+        self.rag_service = rag_service
+        self.concurrency = concurrency
+        self._tasks: list[asyncio.Task] = []
+        self._throughput = _Throughput()
+
+    def start(self) -> None:
+        """Start the workers."""
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.concurrency)]
+        logger.info(f"Started {self.concurrency} ingestion workers")
+
+    async def stop(self) -> None:
+        """Cancel the workers and wait for them to exit."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, job: IngestionJob) -> IngestionJob:
+        """Enqueue a job, raising QueueFullError when the queue is full."""
+        await self.queue.put(job)
+        await self._update_depth()
+        return job
+
+    async def _worker(self, index: int) -> None:
+        # A queue backend error (Redis restarting, say) must not end the worker
+        delay = QUEUE_RETRY_INITIAL_SECONDS
+        while True:
+            try:
+                job = await self.queue.get()
+            except Exception as e:
+                logger.error(f"Ingestion worker {index} could not read the queue, retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, QUEUE_RETRY_MAX_SECONDS)
+                continue
+            delay = QUEUE_RETRY_INITIAL_SECONDS
+            INGESTION_WORKERS_BUSY.inc()
+            try:
+                await self._update_depth()
+                await self._run(job)
+            except Exception as e:
+                logger.error(f"Ingestion worker {index} failed on job {job.id}: {e}")
+            finally:
+                INGESTION_WORKERS_BUSY.dec()
+
+    async def _update_depth(self) -> None:
+        try:
+            INGESTION_QUEUE_DEPTH.set(await self.queue.depth())
+        except Exception as e:
+            logger.warning(f"Could not read the ingestion queue depth: {e}")
+
+    async def _save(self, job: IngestionJob) -> None:
+        """Record the job's status; a failure only leaves the status stale."""
+        try:
+            await self.queue.save(job)
+        except Exception as e:
+            logger.error(f"Could not save the status of ingestion job {job.id}: {e}")
+
+    async def _run(self, job: IngestionJob) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        await self._save(job)
+
+        async def on_progress(chunks: int) -> None:
+            job.chunks = chunks
+            await self._save(job)
+
+        try:
+            with stage("ingest", filename=job.filename, job_id=job.id), open(job.path, "rb") as file:
+                result = await self.rag_service.index_document(
+                    filename=job.filename,
+                    content=_ProgressReader(file, job),
+                    content_type=job.content_type,
+                    on_progress=on_progress,
+                )
+            job.chunks = result.chunks
+            job.chunks_embedded = result.embedded
+            job.chunks_deleted = result.deleted
+            job.version = result.version
+            job.status = "succeeded"
+            job.bytes_read = job.bytes_total
+            DOCUMENTS_INDEXED.inc()
+            self._throughput.record(job.chunks)
+        except asyncio.CancelledError:
+            job.status = "failed"
+            job.error = "Cancelled during shutdown"
+            raise
+        except Exception as e:
+            logger.error(f"Ingestion job {job.id} failed: {e}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            INGESTION_JOBS.labels(status=job.status).inc()
+            try:
+                os.remove(job.path)
+            except OSError:
+                pass
+            await asyncio.shield(self._save(job))
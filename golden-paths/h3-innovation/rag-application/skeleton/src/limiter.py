@@ -0,0 +1,202 @@
+"""Adaptive concurrency limiting for Azure OpenAI calls.
+
+Each limiter caps the calls in flight to one deployment and adjusts the cap
+AIMD style: every successful call adds `1 / limit` (about one per round of
+calls) while the limit is in use, and a 429 or a timeout halves it. With
+`latency_tolerance` set, so does a call much slower than the best recent
+latency; that signal only suits calls of roughly constant work, such as
+embeddings. Chat completion latency grows with the length of the answer, so
+chat limiters leave it unset. Calls over the limit wait in a FIFO
+queue; once `max_queue` are waiting, new calls fail fast with
+`OverloadedError` instead of piling up.
+
+Throttled and transient failures are retried after the server's
+`retry-after`, or a jittered exponential backoff when there is none. The
+OpenAI client's own retries should be turned off (`max_retries=0`) so the
+two do not multiply.
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+import openai
+
+from .errors import OverloadedError
+from .metrics import (
+    OPENAI_CONCURRENCY_LIMIT,
+    OPENAI_IN_FLIGHT,
+    OPENAI_QUEUE_WAIT,
+    OPENAI_RETRIES,
+    OPENAI_SHED,
+    OPENAI_THROTTLES,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Return the delay the server asked for, if any."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit with a bounded wait queue and retries."""
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int = 16,
+        min_limit: int = 1,
+        max_limit: int = 256,
+        max_queue: int = 100,
+        latency_tolerance: Optional[float] = 2.0,
+        backoff_ratio: float = 0.5,
+        max_retries: int = 3,
+        base_backoff: float = 0.5,
+        max_backoff: float = 20.0,
+    ):
+        """Initialize the limiter.
+
+        A call slower than `latency_tolerance` times the best recent latency
+        counts as a sign of overload; None relies on 429s and timeouts alone.
+        """
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.latency_tolerance = latency_tolerance
+        self.backoff_ratio = backoff_ratio
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._baseline: Optional[float] = None
+        self._last_decrease = 0.0
+        OPENAI_CONCURRENCY_LIMIT.labels(limiter=name).set(self.limit)
+
+    async def call(self, fn: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+        """Run `fn(*args, **kwargs)` under the limit, retrying transient failures."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.slot():
+                    return await fn(*args, **kwargs)
+            except RETRYABLE_ERRORS as e:
+                throttled = isinstance(e, openai.RateLimitError)
+                requested = retry_after_seconds(e)
+                if attempt == self.max_retries or (requested is not None and requested > self.max_backoff):
+                    if throttled:
+                        raise OverloadedError(f"{self.name} is throttled", retry_after=requested or 1.0) from e
+                    raise
+                # Full jitter spreads the retries of calls throttled together
+                delay = requested if requested is not None else random.uniform(
+                    0, min(self.max_backoff, self.base_backoff * 2 ** attempt)
+                )
+                OPENAI_RETRIES.labels(limiter=self.name, reason="throttled" if throttled else "error").inc()
+                logger.warning(f"{self.name} call failed ({type(e).__name__}), retry {attempt + 1} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+        raise AssertionError("unreachable")
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one unit of concurrency, adjusting the limit from the outcome."""
+        await self._acquire()
+        start = time.monotonic()
+        try:
+            yield
+        except (openai.RateLimitError, openai.APITimeoutError) as e:
+            if isinstance(e, openai.RateLimitError):
+                OPENAI_THROTTLES.labels(limiter=self.name).inc()
+            self._decrease()
+            raise
+        else:
+            self._on_success(time.monotonic() - start)
+        finally:
+            self._release()
+
+    async def _acquire(self) -> None:
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self._enter()
+            return
+        if len(self._waiters) >= self.max_queue:
+            OPENAI_SHED.labels(limiter=self.name).inc()
+            raise OverloadedError(f"{self.name} queue is full ({self.max_queue} waiting)")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        start = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the caller went away
+                self._release()
+            elif future in self._waiters:
+                self._waiters.remove(future)
+            raise
+        OPENAI_QUEUE_WAIT.labels(limiter=self.name).observe(time.monotonic() - start)
+
+    def _enter(self) -> None:
+        self.in_flight += 1
+        OPENAI_IN_FLIGHT.labels(limiter=self.name).set(self.in_flight)
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        # Hand freed slots straight to waiters, in arrival order
+        while self._waiters and self.in_flight < int(self.limit):
+            future = self._waiters.popleft()
+            if not future.done():
+                self._enter()
+                future.set_result(None)
+        OPENAI_IN_FLIGHT.labels(limiter=self.name).set(self.in_flight)
+
+    def _on_success(self, latency: float) -> None:
+        # The baseline follows drops at once and rises slowly
+        if self._baseline is None or latency < self._baseline:
+            self._baseline = latency
+        else:
+            self._baseline += (latency - self._baseline) * 0.01
+
+        if self.latency_tolerance is not None and latency > self._baseline * self.latency_tolerance:
+            self._decrease()
+        elif self.in_flight >= int(self.limit) - 1:
+            # Only grow when the limit is actually what holds calls back
+            self._set_limit(self.limit + 1 / self.limit)
+
+    def _decrease(self) -> None:
+        # Calls failing together count as one overload signal
+        now = time.monotonic()
+        if now - self._last_decrease < max(self._baseline or 0.0, 1.0):
+            return
+        self._last_decrease = now
+        self._set_limit(self.limit * self.backoff_ratio)
+
+    def _set_limit(self, limit: float) -> None:
+        self.limit = min(float(self.max_limit), max(float(self.min_limit), limit))
+        OPENAI_CONCURRENCY_LIMIT.labels(limiter=self.name).set(self.limit)
@@ -0,0 +1,393 @@
+"""In-process chunk index for offline and development use.
+
+Chunk vectors are unit-normalized rows of a float32 matrix, memory-mapped
+from `vectors-{dim}.f32` when a directory is given, and scored with one
+matrix-vector product. With `mode="ivf"` the rows are also clustered with
+k-means and a query only scores the rows of its `nprobe` nearest clusters.
+Chunk text lives in a BM25 inverted index for the keyword half of hybrid
+search, and hybrid results are fused with reciprocal rank, like Azure AI
+Search does.
+
+Writes append to `chunks.jsonl`, which is replayed on startup; the matrix
+file already holds the vectors. A partial last line left by a crash is
+dropped and the log rewritten.
+"""
+import asyncio
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Optional
+
+import numpy as np
+
+from .retrieval import Retriever, reciprocal_rank_fusion
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"\w+")
+
+INITIAL_CAPACITY = 1024
+ASSIGN_BLOCK_ROWS = 65536
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 256
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into lowercase word terms."""
+    return _TOKEN.findall(text.lower())
+
+
+class BM25Index:
+    """Inverted index scoring slots with Okapi BM25."""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        """Initialize an empty index."""
+        self.k1 = k1
+        self.b = b
+        self.postings: dict[str, dict[int, int]] = defaultdict(dict)
+        self.lengths: dict[int, int] = {}
+        self.total_length = 0
+
+    def add(self, slot: int, text: str) -> None:
+        """Index the text of a slot."""
+        terms = Counter(tokenize(text))
+        for term, frequency in terms.items():
+            self.postings[term][slot] = frequency
+        self.lengths[slot] = sum(terms.values())
+        self.total_length += self.lengths[slot]
+
+    def remove(self, slot: int, text: str) -> None:
+        """Remove a slot, given the text it was indexed with."""
+        for term in set(tokenize(text)):
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(slot, None)
+                if not posting:
+                    del self.postings[term]
+        self.total_length -= self.lengths.pop(slot, 0)
+
+    def search(self, query: str, top_k: int) -> list[tuple[int, float]]:
+        """Return the `top_k` (slot, score) pairs for a query."""
+        count = len(self.lengths)
+        if not count:
+            return []
+        average_length = self.total_length / count or 1.0
+        scores: dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for slot, frequency in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[slot] / average_length)
+                scores[slot] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+
+class LocalVectorIndex(Retriever):
+    """Retriever over an in-process vector matrix and BM25 index."""
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        mode: str = "exact",
+        nlist: int = 100,
+        nprobe: int = 8,
+        rrf_k: int = 60,
+    ):
+        """Initialize the index, loading it from `directory` if present.
+
+        Without a directory the index lives in memory only. `mode` is
+        "exact" or "ivf"; the IVF clusters are trained on first search once
+        there are `4 * nlist` chunks, and retrained when the index doubles.
+        """
+        if mode not in ("exact", "ivf"):
+            raise ValueError(f"Unknown local index mode: {mode}")
+        self.directory = directory
+        self.mode = mode
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.rrf_k = rrf_k
+
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._valid = np.zeros(0, dtype=bool)
+        self._chunks: list[Optional[dict]] = []
+        self._slots: dict[str, int] = {}
+        self._sources: dict[str, set[str]] = defaultdict(set)
+        self._free: list[int] = []
+        self._size = 0
+        self._bm25 = BM25Index()
+
+        self._centroids: Optional[np.ndarray] = None
+        self._lists = np.zeros(0, dtype=np.int32)
+        self._trained_count = 0
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    # -------------------------------------------------------------------------
+    # Retriever interface
+    # -------------------------------------------------------------------------
+
+    async def search(self, search_text: Optional[str], embedding: Optional[list[float]], top_k: int) -> list[dict]:
+        return await asyncio.to_thread(self._search, search_text, embedding, top_k)
+
+    async def upsert(self, documents: list[dict]) -> None:
+        await asyncio.to_thread(self._upsert, documents)
+
+    async def delete(self, chunk_ids: list[str]) -> None:
+        await asyncio.to_thread(self._delete, chunk_ids)
+
+    async def chunks_for_source(self, source: str) -> list[dict]:
+        with self._lock:
+            chunks = (self._chunks[self._slots[chunk_id]] for chunk_id in self._sources.get(source, ()))
+            return [{"id": chunk["id"], "content": chunk["content"]} for chunk in chunks]
+
+    async def close(self) -> None:
+        with self._lock:
+            if isinstance(self._vectors, np.memmap):
+                self._vectors.flush()
+
+    # -------------------------------------------------------------------------
+    # Queries
+    # -------------------------------------------------------------------------
+
+    def _search(self, search_text: Optional[str], embedding: Optional[list[float]], top_k: int) -> list[dict]:
+        with self._lock:
+            vector_hits = self._vector_search(embedding, top_k) if embedding is not None else None
+            keyword_hits = self._bm25.search(search_text, top_k) if search_text else None
+            vector_results = self._results(vector_hits) if vector_hits is not None else None
+            keyword_results = self._results(keyword_hits) if keyword_hits is not None else None
+
+        if vector_results is not None and keyword_results is not None:
+            return reciprocal_rank_fusion([keyword_results, vector_results], k=self.rrf_k, top_k=top_k)
+        return vector_results if vector_results is not None else keyword_results or []
+
+    def _vector_search(self, embedding: list[float], top_k: int) -> list[tuple[int, float]]:
+        if self._vectors is None or not self._slots:
+            return []
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+        if query.shape[0] != self._vectors.shape[1]:
+            raise ValueError(f"Query has {query.shape[0]} dimensions, index has {self._vectors.shape[1]}")
+
+        if self.mode == "ivf" and self._ivf_ready():
+            probes = np.argsort(self._centroids @ query)[-self.nprobe:]
+            candidates = np.flatnonzero(np.isin(self._lists[:self._size], probes) & self._valid[:self._size])
+        else:
+            candidates = np.flatnonzero(self._valid[:self._size])
+        if not len(candidates):
+            return []
+
+        scores = self._vectors[candidates] @ query
+        k = min(top_k, len(candidates))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(candidates[i]), float(scores[i])) for i in best]
+
+    def _results(self, hits: list[tuple[int, float]]) -> list[dict]:
+        return [{**self._chunks[slot], "@search.score": score} for slot, score in hits]
+
+    # -------------------------------------------------------------------------
+    # IVF clustering
+    # -------------------------------------------------------------------------
+
+    def _ivf_ready(self) -> bool:
+        count = len(self._slots)
+        if count < 4 * self.nlist:
+            return False
+        if self._centroids is None or count > 2 * self._trained_count:
+            self._train_ivf()
+        return True
+
+    def _train_ivf(self) -> None:
+        """Cluster the vectors with spherical k-means and assign every row."""
+        slots = np.flatnonzero(self._valid[:self._size])
+        rng = np.random.default_rng(0)
+        sample_size = min(len(slots), self.nlist * KMEANS_SAMPLE_PER_LIST)
+        sample = np.asarray(self._vectors[np.sort(rng.choice(slots, sample_size, replace=False))])
+        centroids = sample[rng.choice(len(sample), self.nlist, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for cluster in range(self.nlist):
+                members = sample[assignment == cluster]
+                if len(members):
+                    centroids[cluster] = members.mean(axis=0)
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+        self._centroids = centroids
+        self._lists = np.full(len(self._valid), -1, dtype=np.int32)
+        for start in range(0, len(slots), ASSIGN_BLOCK_ROWS):
+            block = slots[start:start + ASSIGN_BLOCK_ROWS]
+            self._lists[block] = np.argmax(self._vectors[block] @ centroids.T, axis=1)
+        self._trained_count = len(slots)
+        logger.info(f"Trained {self.nlist} IVF lists over {len(slots)} chunks")
+
+    # -------------------------------------------------------------------------
+    # Writes
+    # -------------------------------------------------------------------------
+
+    def _upsert(self, documents: list[dict]) -> None:
+        records = []
+        with self._lock:
+            for document in documents:
+                vector = _normalize(np.asarray(document["content_vector"], dtype=np.float32))
+                chunk = {
+                    "id": document["id"],
+                    "title": document.get("title", ""),
+                    "content": document.get("content", ""),
+                    "source": document.get("source", ""),
+                }
+                slot = self._slots.get(chunk["id"])
+                if slot is None:
+                    slot = self._allocate(vector.shape[0])
+                else:
+                    self._unindex(slot)
+                self._vectors[slot] = vector
+                self._index(slot, chunk)
+                if self._centroids is not None:
+                    self._lists[slot] = int(np.argmax(self._centroids @ vector))
+                records.append({"slot": slot, **chunk})
+            self._append_log(records)
+
+    def _delete(self, chunk_ids: list[str]) -> None:
+        records = []
+        with self._lock:
+            for chunk_id in chunk_ids:
+                slot = self._slots.get(chunk_id)
+                if slot is None:
+                    continue
+                self._unindex(slot)
+                self._free.append(slot)
+                records.append({"slot": slot, "deleted": True})
+            self._append_log(records)
+
+    def _index(self, slot: int, chunk: dict) -> None:
+        self._chunks[slot] = chunk
+        self._valid[slot] = True
+        self._slots[chunk["id"]] = slot
+        self._sources[chunk["source"]].add(chunk["id"])
+        self._bm25.add(slot, chunk["content"])
+        self._size = max(self._size, slot + 1)
+
+    def _unindex(self, slot: int) -> None:
+        chunk = self._chunks[slot]
+        if chunk is None:
+            return
+        self._bm25.remove(slot, chunk["content"])
+        self._slots.pop(chunk["id"], None)
+        ids = self._sources.get(chunk["source"])
+        if ids is not None:
+            ids.discard(chunk["id"])
+            if not ids:
+                del self._sources[chunk["source"]]
+        self._chunks[slot] = None
+        self._valid[slot] = False
+        if len(self._lists) > slot:
+            self._lists[slot] = -1
+
+    def _allocate(self, dim: int) -> int:
+        if self._vectors is not None and dim != self._vectors.shape[1]:
+            raise ValueError(f"Chunk has {dim} dimensions, index has {self._vectors.shape[1]}")
+        if self._free:
+            return self._free.pop()
+        if self._vectors is None or self._size >= len(self._vectors):
+            self._grow(dim, max(INITIAL_CAPACITY, 2 * self._size))
+        return self._size
+
+    def _grow(self, dim: int, capacity: int) -> None:
+        if self.directory:
+            if isinstance(self._vectors, np.memmap):
+                self._vectors.flush()
+            path = self._vectors_path(dim)
+            with open(path, "ab") as f:
+                f.truncate(capacity * dim * 4)
+            self._vectors = np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, dim))
+        else:
+            vectors = np.zeros((capacity, dim), dtype=np.float32)
+            if self._vectors is not None:
+                vectors[:len(self._vectors)] = self._vectors
+            self._vectors = vectors
+
+        extra = capacity - len(self._valid)
+        self._valid = np.concatenate([self._valid, np.zeros(extra, dtype=bool)])
+        self._lists = np.concatenate([self._lists, np.full(capacity - len(self._lists), -1, dtype=np.int32)])
+        self._chunks.extend([None] * extra)
+
+    # -------------------------------------------------------------------------
+    # Persistence
+    # -------------------------------------------------------------------------
+
+    def _vectors_path(self, dim: int) -> str:
+        return os.path.join(self.directory, f"vectors-{dim}.f32")
+
+    def _log_path(self) -> str:
+        return os.path.join(self.directory, "chunks.jsonl")
+
+    def _append_log(self, records: list[dict]) -> None:
+        if not self.directory or not records:
+            return
+        # Vectors reach the file before the log line that refers to them
+        if isinstance(self._vectors, np.memmap):
+            self._vectors.flush()
+        with open(self._log_path(), "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def _load(self) -> None:
+        matrices = [n for n in os.listdir(self.directory) if n.startswith("vectors-") and n.endswith(".f32")]
+        if not matrices:
+            return
+        dim = int(matrices[0][len("vectors-"):-len(".f32")])
+        capacity = os.path.getsize(os.path.join(self.directory, matrices[0])) // (dim * 4)
+        self._grow(dim, capacity)
+
+        lines = 0
+        torn = False
+        if os.path.exists(self._log_path()):
+            with open(self._log_path(), encoding="utf-8") as f:
+                for line in f:
+                    if torn:
+                        raise ValueError(f"{self._log_path()} has an undecodable record at line {lines}")
+                    lines += 1
+                    # A crash in `_append_log` can leave a partial last line; later appends would extend it
+                    torn = not line.endswith("\n")
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        torn = True
+                        continue
+                    slot = record.pop("slot")
+                    self._unindex(slot)
+                    if not record.get("deleted"):
+                        self._index(slot, record)
+        self._free = [int(slot) for slot in np.flatnonzero(~self._valid[:self._size])]
+        logger.info(f"Loaded local index with {len(self._slots)} chunks from {self.directory}")
+
+        if torn:
+            logger.warning(f"Dropping the incomplete last record of {self._log_path()}")
+        if torn or lines > 2 * len(self._slots) + INITIAL_CAPACITY:
+            self._compact_log()
+
+    def _compact_log(self) -> None:
+        """Rewrite the log with one line per live chunk."""
+        tmp_path = f"{self._log_path()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for slot in np.flatnonzero(self._valid[:self._size]):
+                record = {"slot": int(slot), **self._chunks[slot]}
+                f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        os.replace(tmp_path, self._log_path())
+
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
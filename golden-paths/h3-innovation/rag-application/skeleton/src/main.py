@@ -4,37 +4,95 @@ ${{values.name}} - RAG Application
 A Retrieval-Augmented Generation application built with FastAPI,
 Azure OpenAI, and Azure AI Search.
 """
+import asyncio
+import json
 import logging
+import math
+import os
+import shutil
+import time
 from contextlib import asynccontextmanager
-from typing import Optional
+from typing import TYPE_CHECKING, AsyncIterator, Optional
 
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
-from starlette.responses import Response
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST, REGISTRY
+from prometheus_client.openmetrics import exposition as openmetrics
+from starlette.responses import Response, StreamingResponse
 
 from .config import settings
-from .rag import RAGService
+from .conversations import ConversationStore, InMemoryConversationStore, RedisConversationStore
+from .errors import OverloadedError
+from .jobs import IngestionJob, IngestionWorkerPool, InMemoryJobQueue, JobQueue, QueueFullError, RedisJobQueue
+from .manifest import FileManifestStore, ManifestStore, RedisManifestStore
+from .metrics import (
+    CHAT_LATENCY,
+    CHAT_REQUESTS,
+    CHAT_TIME_TO_FIRST_TOKEN,
+    CHAT_TOKENS_PER_SECOND,
+)
+from .ratelimit import ConcurrencyLimiter, InMemoryRateLimiter, RateLimitMiddleware, RedisRateLimiter
+from .responses import FastJSONResponse
+from .telemetry import configure_tracing, stage, trace_exemplar
+
+# The modules that load the OpenAI and Azure SDKs, numpy and tiktoken are
+# imported in the lifespan and the factories below instead, so importing
+# this module stays cheap and backends that are not configured never load.
+if TYPE_CHECKING:
+    from .clients import ConnectionPools
+    from .endpoints import OpenAIEndpointPool
+    from .rag import RAGService
+    from .reranking import Reranker
+    from .retrieval import Retriever
 
 # Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Metrics
-CHAT_REQUESTS = Counter('rag_chat_requests_total', 'Total chat requests')
-CHAT_LATENCY = Histogram('rag_chat_latency_seconds', 'Chat request latency')
-DOCUMENTS_INDEXED = Counter('rag_documents_indexed_total', 'Total documents indexed')
-
 # RAG service instance
-rag_service: Optional[RAGService] = None
+rag_service: Optional["RAGService"] = None
+ingestion_workers: Optional[IngestionWorkerPool] = None
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager."""
-    global rag_service
+    global rag_service, ingestion_workers
+    from .clients import ConnectionPools
+    from .context import ContextAssembler
+    from .rag import RAGService
+
     logger.info("Initializing RAG service...")
+    started = time.perf_counter()
+    pools = await ConnectionPools(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive_connections,
+        keepalive_expiry=settings.http_keepalive_expiry,
+        timeout=settings.http_timeout,
+        search=settings.retriever_backend == "azure",
+    ).open()
+    embedding_cache = None
+    if settings.embedding_cache_enabled:
+        from .embedding_cache import EmbeddingCache
+
+        embedding_cache = EmbeddingCache(
+            max_entries=settings.embedding_cache_max_entries,
+            ttl_seconds=settings.embedding_cache_ttl_seconds,
+            disk_directory=settings.embedding_cache_dir or None,
+            disk_capacity=settings.embedding_cache_disk_capacity,
+        )
+    semantic_cache = None
+    if settings.semantic_cache_enabled:
+        from .semantic_cache import SemanticCache
+
+        semantic_cache = SemanticCache(
+            threshold=settings.semantic_cache_threshold,
+            max_entries=settings.semantic_cache_max_entries,
+            ttl_seconds=settings.semantic_cache_ttl_seconds,
+        )
+    openai_pool = create_openai_pool(pools)
     rag_service = RAGService(
         openai_endpoint=settings.azure_openai_endpoint,
         openai_key=settings.azure_openai_api_key,
@@ -42,10 +100,185 @@ async def lifespan(app: FastAPI):
         search_endpoint=settings.azure_search_endpoint,
         search_key=settings.azure_search_api_key,
         search_index=settings.azure_search_index,
+        embedding_deployment=settings.azure_openai_embedding_deployment,
+        api_version=settings.azure_openai_api_version,
+        http_client=pools.http_client,
+        search_transport=pools.search_transport,
+        retriever=create_retriever(),
+        openai_pool=openai_pool,
+        search_mode=settings.search_mode,
+        top_k=settings.search_top_k,
+        rrf_k=settings.search_rrf_k,
+        reranker=create_reranker(openai_pool),
+        rerank_candidates=settings.rerank_candidates,
+        embedding_batch_window_ms=settings.embedding_batch_window_ms,
+        embedding_batch_max_inputs=settings.embedding_batch_max_inputs,
+        embedding_cache=embedding_cache,
+        semantic_cache=semantic_cache,
+        conversation_store=create_conversation_store(),
+        manifest_store=create_manifest_store(),
+        context_assembler=ContextAssembler(
+            max_prompt_tokens=settings.max_tokens,
+            max_history_tokens=settings.max_history_tokens,
+            max_history_messages=settings.max_history_messages,
+            duplicate_threshold=settings.context_duplicate_threshold,
+        ),
+        chunk_size=settings.chunk_size,
+        chunk_overlap=settings.chunk_overlap,
+        embedding_batch_size=settings.embedding_batch_size,
+        upload_batch_size=settings.index_upload_batch_size,
+    )
+    os.makedirs(settings.ingestion_spool_dir, exist_ok=True)
+    ingestion_workers = IngestionWorkerPool(
+        create_job_queue(),
+        rag_service,
+        concurrency=settings.ingestion_workers,
     )
-    logger.info("RAG service initialized successfully")
+    ingestion_workers.start()
+    logger.info(f"RAG service initialized in {time.perf_counter() - started:.2f}s")
     yield
     logger.info("Shutting down RAG service...")
+    await ingestion_workers.stop()
+    await ingestion_workers.queue.close()
+    ingestion_workers = None
+    await rag_service.close()
+    await pools.aclose()
+    if rate_limiter is not None:
+        await rate_limiter.close()
+    rag_service = None
+
+
+def create_conversation_store() -> ConversationStore:
+    """Create the configured conversation history backend."""
+    if settings.conversation_store == "redis":
+        return RedisConversationStore.from_url(
+            settings.conversation_redis_url,
+            max_messages=settings.conversation_max_messages,
+            ttl_seconds=settings.conversation_ttl_seconds,
+        )
+    return InMemoryConversationStore(
+        max_messages=settings.conversation_max_messages,
+        max_conversations=settings.conversation_max_conversations,
+        max_bytes=settings.conversation_max_bytes,
+        ttl_seconds=settings.conversation_ttl_seconds,
+    )
+
+
+def create_openai_pool(pools: "ConnectionPools") -> "OpenAIEndpointPool":
+    """Create the pool of Azure OpenAI endpoints, each with its own limiters."""
+    from .endpoints import OpenAIEndpoint, OpenAIEndpointPool
+    from .limiter import AdaptiveLimiter
+
+    endpoints = [
+        OpenAIEndpoint(
+            name=endpoint.name,
+            endpoint=endpoint.endpoint,
+            api_key=endpoint.api_key,
+            chat_deployment=endpoint.deployment or settings.azure_openai_deployment,
+            embedding_deployment=endpoint.embedding_deployment or settings.azure_openai_embedding_deployment,
+            weight=endpoint.weight,
+        )
+        for endpoint in settings.azure_openai_endpoints
+    ] or [
+        OpenAIEndpoint(
+            name="default",
+            endpoint=settings.azure_openai_endpoint,
+            api_key=settings.azure_openai_api_key,
+            chat_deployment=settings.azure_openai_deployment,
+            embedding_deployment=settings.azure_openai_embedding_deployment,
+        )
+    ]
+    # With more than one endpoint a failed call is retried on another endpoint instead
+    max_retries = settings.openai_max_retries if len(endpoints) == 1 else 0
+
+    def create_limiter(name: str) -> Optional[AdaptiveLimiter]:
+        if not settings.openai_limiter_enabled:
+            return None
+        return AdaptiveLimiter(
+            name,
+            initial_limit=settings.openai_initial_concurrency,
+            max_limit=settings.openai_max_concurrency,
+            max_queue=settings.openai_max_queue,
+            # Chat latency follows the answer length, so only embeddings use the latency signal
+            latency_tolerance=settings.openai_latency_tolerance if name.startswith("embedding/") else None,
+            max_retries=max_retries,
+            max_backoff=settings.openai_max_backoff_seconds,
+        )
+
+    return OpenAIEndpointPool(
+        endpoints,
+        api_version=settings.azure_openai_api_version,
+        http_client=pools.http_client,
+        limiter_factory=create_limiter,
+        failures_before_ejection=settings.openai_failures_before_ejection,
+        ejection_seconds=settings.openai_ejection_seconds,
+    )
+
+
+def create_retriever() -> Optional["Retriever"]:
+    """Create the local retriever, or None for the Azure AI Search index."""
+    if settings.retriever_backend == "local":
+        from .local_index import LocalVectorIndex
+
+        return LocalVectorIndex(
+            directory=settings.local_index_dir or None,
+            mode=settings.local_index_mode,
+            nlist=settings.local_index_nlist,
+            nprobe=settings.local_index_nprobe,
+            rrf_k=settings.search_rrf_k,
+        )
+    return None
+
+
+def create_rate_limiter() -> Optional[InMemoryRateLimiter | RedisRateLimiter]:
+    """Create the per-client rate limiter, or None when rate limiting is off."""
+    if settings.rate_limit_per_second <= 0:
+        return None
+    if settings.rate_limit_backend == "redis":
+        return RedisRateLimiter.from_url(
+            settings.rate_limit_redis_url,
+            rate=settings.rate_limit_per_second,
+            burst=settings.rate_limit_burst,
+            key_prefix="rag:ratelimit:",
+        )
+    return InMemoryRateLimiter(rate=settings.rate_limit_per_second, burst=settings.rate_limit_burst)
+
+
+def create_reranker(openai_pool: "OpenAIEndpointPool") -> Optional["Reranker"]:
+    """Create the configured candidate reranker, if any."""
+    if settings.reranker == "local":
+        from .reranking import LocalReranker
+
+        return LocalReranker(lexical_weight=settings.rerank_lexical_weight)
+    if settings.reranker == "llm":
+        from .reranking import LLMReranker
+
+        # Grading shares the chat limiters and failover with answer generation
+        return LLMReranker(
+            openai_pool,
+            settings.rerank_llm_deployment or None,
+            batch_size=settings.rerank_llm_batch_size,
+        )
+    return None
+
+
+def create_manifest_store() -> Optional[ManifestStore]:
+    """Create the configured document manifest backend."""
+    if settings.manifest_backend == "redis":
+        return RedisManifestStore.from_url(settings.manifest_redis_url)
+    if settings.manifest_backend == "file":
+        return FileManifestStore(settings.manifest_dir)
+    return None
+
+
+def create_job_queue() -> JobQueue:
+    """Create the configured ingestion queue backend."""
+    if settings.ingestion_queue_backend == "redis":
+        return RedisJobQueue.from_url(
+            settings.ingestion_queue_redis_url,
+            max_size=settings.ingestion_queue_max_size,
+        )
+    return InMemoryJobQueue(max_size=settings.ingestion_queue_max_size)
 
 
 app = FastAPI(
@@ -53,6 +286,28 @@ app = FastAPI(
     description="${{values.description}}",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=FastJSONResponse if settings.fast_json_responses else JSONResponse,
+)
+
+if settings.tracing_enabled:
+    from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+
+    configure_tracing(
+        settings.otel_service_name,
+        sample_ratio=settings.tracing_sample_ratio,
+        otlp_endpoint=settings.otel_exporter_otlp_endpoint,
+    )
+    FastAPIInstrumentor.instrument_app(app, excluded_urls="health,ready,metrics")
+
+# Load protection (innermost, so rejections still get CORS headers)
+rate_limiter = create_rate_limiter()
+app.add_middleware(
+    RateLimitMiddleware,
+    rate_limiter=rate_limiter,
+    concurrency_limiter=ConcurrencyLimiter(
+        max_concurrency=settings.max_concurrent_requests,
+        queue_target=settings.queue_target_seconds,
+    ) if settings.max_concurrent_requests > 0 else None,
 )
 
 # CORS
@@ -94,12 +349,18 @@ async def ready():
     """Readiness check endpoint."""
     if rag_service is None:
         raise HTTPException(status_code=503, detail="Service not ready")
-    return {"status": "ready"}
+    return {"status": "ready", "openai_endpoints": rag_service.openai_pool.health()}
 
 
 @app.get("/metrics")
-async def metrics():
-    """Prometheus metrics endpoint."""
+async def metrics(request: Request):
+    """Prometheus metrics endpoint.
+
+    Exemplars (trace ids on latency buckets) are only part of the OpenMetrics
+    format, served when the scraper asks for it.
+    """
+    if "application/openmetrics-text" in request.headers.get("accept", ""):
+        return Response(content=openmetrics.generate_latest(REGISTRY), media_type=openmetrics.CONTENT_TYPE_LATEST)
     return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 
@@ -108,45 +369,133 @@ async def chat(request: ChatRequest):
     """Process a chat request using RAG."""
     CHAT_REQUESTS.inc()
 
-    with CHAT_LATENCY.time():
+    with stage("chat", histogram=CHAT_LATENCY, streaming=False):
         try:
             result = await rag_service.chat(
                 query=request.query,
                 conversation_id=request.conversation_id,
             )
-            return ChatResponse(
+            response = ChatResponse(
                 answer=result["answer"],
                 sources=result["sources"],
                 conversation_id=result["conversation_id"],
             )
+            # Returned as a response so the model is serialized once, by pydantic
+            return FastJSONResponse(response) if settings.fast_json_responses else response
+        except OverloadedError as e:
+            logger.warning(f"Chat shed: {e}")
+            raise HTTPException(
+                status_code=503,
+                detail="Service is overloaded, retry later",
+                headers={"Retry-After": str(math.ceil(e.retry_after))},
+            )
         except Exception as e:
             logger.error(f"Chat error: {e}")
             raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/documents")
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Process a chat request using RAG, streaming the answer as server-sent events.
+
+    Emits a `sources` event first, then one `token` event per piece of answer
+    text as it arrives from the model, and finally a `done` event.
+    """
+    CHAT_REQUESTS.inc()
+    return StreamingResponse(
+        _sse_events(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _sse_events(request: ChatRequest) -> AsyncIterator[str]:
+    """Format RAG stream events as SSE and record streaming latency."""
+    start = time.perf_counter()
+    first_token_at = None
+    tokens = 0
+
+    with stage("chat", histogram=CHAT_LATENCY, streaming=True):
+        try:
+            async for event in rag_service.chat_stream(
+                query=request.query,
+                conversation_id=request.conversation_id,
+            ):
+                name = event.pop("event")
+                if name == "token":
+                    tokens += 1
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        CHAT_TIME_TO_FIRST_TOKEN.observe(first_token_at - start, exemplar=trace_exemplar())
+                yield f"event: {name}\ndata: {json.dumps(event)}\n\n"
+        except OverloadedError as e:
+            logger.warning(f"Chat stream shed: {e}")
+            detail = {"detail": "Service is overloaded, retry later", "retry_after": math.ceil(e.retry_after)}
+            yield f"event: error\ndata: {json.dumps(detail)}\n\n"
+            return
+        except Exception as e:
+            logger.error(f"Chat stream error: {e}")
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+            return
+
+    if first_token_at is not None and tokens > 1:
+        elapsed = time.perf_counter() - first_token_at
+        if elapsed > 0:
+            CHAT_TOKENS_PER_SECOND.observe((tokens - 1) / elapsed)
+
+
+@app.post("/documents", status_code=202)
 async def upload_document(file: UploadFile = File(...)):
-    """Upload and index a document."""
+    """Upload a document and queue it for indexing.
+
+    Returns a job id; poll `GET /documents/jobs/{job_id}` for progress.
+    """
+    job = IngestionJob(filename=file.filename, path="", content_type=file.content_type)
+    job.path = os.path.join(settings.ingestion_spool_dir, job.id)
     try:
-        content = await file.read()
-        await rag_service.index_document(
-            filename=file.filename,
-            content=content,
-            content_type=file.content_type,
-        )
-        DOCUMENTS_INDEXED.inc()
-        return {"status": "accepted", "filename": file.filename}
+        job.bytes_total = await asyncio.to_thread(_spool_upload, file, job.path)
+        await ingestion_workers.submit(job)
+        return {"status": "accepted", "filename": file.filename, "job_id": job.id}
+    except QueueFullError:
+        _discard(job.path)
+        raise HTTPException(status_code=503, detail="Ingestion queue is full", headers={"Retry-After": "30"})
     except Exception as e:
+        _discard(job.path)
         logger.error(f"Document upload error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/documents/jobs/{job_id}")
+async def get_document_job(job_id: str):
+    """Report the status and progress of an ingestion job."""
+    job = await ingestion_workers.queue.load(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+def _spool_upload(file: UploadFile, path: str) -> int:
+    """Copy an upload to the spool directory and return its size."""
+    file.file.seek(0)
+    with open(path, "wb") as spool:
+        shutil.copyfileobj(file.file, spool, 1024 * 1024)
+        return spool.tell()
+
+
+def _discard(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
 @app.get("/documents")
 async def list_documents():
     """List indexed documents."""
     try:
         documents = await rag_service.list_documents()
-        return {"documents": documents}
+        body = {"documents": documents}
+        return FastJSONResponse(body) if settings.fast_json_responses else body
     except Exception as e:
         logger.error(f"List documents error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
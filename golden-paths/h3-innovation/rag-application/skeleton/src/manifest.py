@@ -0,0 +1,138 @@
+"""Per-document manifests of the chunks held in the search index.
+
+A manifest maps each chunk id of a document to the hash of its content and
+carries a version that increases whenever the indexed chunks change. On
+re-ingest only chunks whose hash is not in the manifest are embedded and
+uploaded, and chunks that disappeared are deleted.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Optional
+
+
+def content_hash(text: str) -> str:
+    """Return the content hash of a chunk."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class DocumentManifest:
+    """The indexed state of one document."""
+
+    document_id: str
+    filename: str
+    version: int = 0
+    chunks: dict[str, str] = field(default_factory=dict)  # chunk id -> content hash
+    updated_at: float = field(default_factory=time.time)
+
+    def summary(self) -> dict:
+        """Return the listing view of the manifest, without chunk hashes."""
+        return {
+            "id": self.document_id,
+            "filename": self.filename,
+            "version": self.version,
+            "chunks": len(self.chunks),
+            "updated_at": self.updated_at,
+        }
+
+
+class ManifestStore:
+    """Interface for manifest backends."""
+
+    async def load(self, document_id: str) -> Optional[DocumentManifest]:
+        """Return the manifest of a document, or None."""
+        raise NotImplementedError
+
+    async def save(self, manifest: DocumentManifest) -> None:
+        """Store a manifest, replacing any previous one."""
+        raise NotImplementedError
+
+    async def list(self) -> list[DocumentManifest]:
+        """Return every stored manifest."""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """Release backend resources."""
+
+
+class FileManifestStore(ManifestStore):
+    """One JSON file per document in a directory on a persistent volume."""
+
+    def __init__(self, directory: str):
+        """Initialize the store, creating the directory if needed."""
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, document_id: str) -> str:
+        return os.path.join(self.directory, f"{document_id}.json")
+
+    async def load(self, document_id: str) -> Optional[DocumentManifest]:
+        return await asyncio.to_thread(self._read, self._path(document_id))
+
+    async def save(self, manifest: DocumentManifest) -> None:
+        await asyncio.to_thread(self._write, manifest)
+
+    async def list(self) -> list[DocumentManifest]:
+        def read_all() -> list[DocumentManifest]:
+            paths = sorted(n for n in os.listdir(self.directory) if n.endswith(".json"))
+            manifests = (self._read(os.path.join(self.directory, n)) for n in paths)
+            return [m for m in manifests if m is not None]
+
+        return await asyncio.to_thread(read_all)
+
+    @staticmethod
+    def _read(path: str) -> Optional[DocumentManifest]:
+        try:
+            with open(path, encoding="utf-8") as f:
+                return DocumentManifest(**json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def _write(self, manifest: DocumentManifest) -> None:
+        path = self._path(manifest.document_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(asdict(manifest), f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+
+class RedisManifestStore(ManifestStore):
+    """Manifests in Redis, shared by every replica that ingests documents."""
+
+    def __init__(self, client: Any, key_prefix: str = "rag:manifest:"):
+        """Initialize the store with a `redis.asyncio` compatible client."""
+        self.client = client
+        self.key_prefix = key_prefix
+        self.index_key = f"{key_prefix}documents"
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisManifestStore":
+        """Create a store with a pooled client for `url`."""
+        from redis.asyncio import Redis
+
+        return cls(Redis.from_url(url), **kwargs)
+
+    async def load(self, document_id: str) -> Optional[DocumentManifest]:
+        data = await self.client.get(self.key_prefix + document_id)
+        return DocumentManifest(**json.loads(data)) if data else None
+
+    async def save(self, manifest: DocumentManifest) -> None:
+        await self.client.set(self.key_prefix + manifest.document_id, json.dumps(asdict(manifest)))
+        await self.client.sadd(self.index_key, manifest.document_id)
+
+    async def list(self) -> list[DocumentManifest]:
+        manifests = []
+        for document_id in sorted(await self.client.smembers(self.index_key)):
+            if isinstance(document_id, bytes):
+                document_id = document_id.decode()
+            manifest = await self.load(document_id)
+            if manifest is not None:
+                manifests.append(manifest)
+        return manifests
+
+    async def close(self) -> None:
+        await self.client.aclose()
@@ -0,0 +1,108 @@
+"""Prometheus metrics for the RAG application.
+
+All metrics live in the default registry, which `/metrics` exposes.
+"""
+from prometheus_client import Counter, Gauge, Histogram
+
+# Requests
+CHAT_REQUESTS = Counter('rag_chat_requests_total', 'Total chat requests')
+CHAT_LATENCY = Histogram('rag_chat_latency_seconds', 'Chat request latency')
+CHAT_TIME_TO_FIRST_TOKEN = Histogram(
+    'rag_chat_time_to_first_token_seconds',
+    'Time from a streaming chat request to its first answer token',
+    buckets=(0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0),
+)
+CHAT_TOKENS_PER_SECOND = Histogram(
+    'rag_chat_tokens_per_second',
+    'Answer tokens streamed per second after the first token',
+    buckets=(5, 10, 20, 30, 50, 75, 100, 150, 200, 300),
+)
+DOCUMENTS_INDEXED = Counter('rag_documents_indexed_total', 'Total documents indexed')
+CHUNKS_INDEXED = Counter('rag_chunks_indexed_total', 'Total document chunks uploaded to the search index')
+CHUNKS_UNCHANGED = Counter('rag_chunks_unchanged_total', 'Chunks skipped on re-ingest because their content hash was indexed')
+CHUNKS_DELETED = Counter('rag_chunks_deleted_total', 'Stale chunks deleted from the search index on re-ingest')
+
+# Background ingestion
+INGESTION_JOBS = Counter('rag_ingestion_jobs_total', 'Finished ingestion jobs', ['status'])
+INGESTION_QUEUE_DEPTH = Gauge('rag_ingestion_queue_depth', 'Ingestion jobs waiting in the queue')
+INGESTION_WORKERS_BUSY = Gauge('rag_ingestion_workers_busy', 'Ingestion workers processing a job')
+INGESTION_DOCS_PER_SECOND = Gauge('rag_ingestion_docs_per_second', 'Documents ingested per second over the last minute')
+INGESTION_CHUNKS_PER_SECOND = Gauge('rag_ingestion_chunks_per_second', 'Chunks ingested per second over the last minute')
+
+# Azure OpenAI token usage, from the `usage` field of each response
+TOKEN_USAGE = Counter('rag_tokens_total', 'Azure OpenAI tokens used', ['operation', 'type'])
+
+# Azure OpenAI concurrency limiting
+OPENAI_IN_FLIGHT = Gauge('rag_openai_in_flight', 'Azure OpenAI calls in flight', ['limiter'])
+OPENAI_CONCURRENCY_LIMIT = Gauge('rag_openai_concurrency_limit', 'Adaptive concurrency limit for Azure OpenAI calls', ['limiter'])
+OPENAI_QUEUE_WAIT = Histogram(
+    'rag_openai_queue_wait_seconds',
+    'Time calls waited for a concurrency slot',
+    ['limiter'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+OPENAI_THROTTLES = Counter('rag_openai_throttles_total', 'Azure OpenAI 429 responses', ['limiter'])
+OPENAI_RETRIES = Counter('rag_openai_retries_total', 'Azure OpenAI calls retried', ['limiter', 'reason'])
+OPENAI_SHED = Counter('rag_openai_shed_total', 'Azure OpenAI calls rejected because the wait queue was full', ['limiter'])
+OPENAI_ENDPOINT_CALLS = Counter('rag_openai_endpoint_calls_total', 'Azure OpenAI calls per endpoint', ['endpoint', 'outcome'])
+OPENAI_ENDPOINT_HEALTHY = Gauge('rag_openai_endpoint_healthy', 'Whether an Azure OpenAI endpoint takes traffic (0 while ejected)', ['endpoint'])
+OPENAI_ENDPOINT_REMAINING_TOKENS = Gauge(
+    'rag_openai_endpoint_remaining_tokens',
+    'Token quota left on an Azure OpenAI endpoint, from its rate limit headers',
+    ['endpoint'],
+)
+OPENAI_FAILOVERS = Counter('rag_openai_failovers_total', 'Azure OpenAI calls retried on another endpoint', ['kind'])
+
+# Prompt assembly
+PROMPT_TOKENS = Histogram(
+    'rag_prompt_tokens',
+    'Prompt tokens sent per chat request',
+    buckets=(250, 500, 1000, 2000, 3000, 4000, 6000, 8000, 16000, 32000),
+)
+PROMPT_TOKENS_SAVED = Histogram(
+    'rag_prompt_tokens_saved',
+    'Prompt tokens per chat request trimmed by the context budget and de-duplication',
+    buckets=(0, 100, 250, 500, 1000, 2000, 4000, 8000, 16000),
+)
+CONTEXT_CHUNKS_DROPPED = Counter(
+    'rag_context_chunks_dropped_total',
+    'Retrieved chunks left out of the prompt',
+    ['reason'],
+)
+
+# Pipeline stages
+STAGE_LATENCY = Histogram(
+    'rag_stage_latency_seconds',
+    'Latency of each RAG pipeline stage',
+    ['stage'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+# Re-ranking
+RERANK_LATENCY = Histogram(
+    'rag_rerank_latency_seconds',
+    'Latency of re-ranking retrieval candidates',
+    ['reranker'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+# Embedding cache and batching
+EMBEDDING_BATCH_SIZE = Histogram(
+    'rag_embedding_batch_size',
+    'Query embeddings sent per micro-batched API call',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+EMBEDDING_CACHE_HITS = Counter('rag_embedding_cache_hits_total', 'Embedding cache hits', ['tier'])
+EMBEDDING_CACHE_MISSES = Counter('rag_embedding_cache_misses_total', 'Embedding cache misses')
+EMBEDDING_CACHE_EVICTIONS = Counter('rag_embedding_cache_evictions_total', 'Embedding cache evictions', ['tier'])
+
+# Semantic answer cache
+SEMANTIC_CACHE_LOOKUPS = Counter('rag_semantic_cache_lookups_total', 'Semantic answer cache lookups', ['result'])
+SEMANTIC_CACHE_LATENCY_SAVED = Counter(
+    'rag_semantic_cache_latency_saved_seconds_total',
+    'Generation time avoided by semantic answer cache hits',
+)
+
+# Conversation store
+CONVERSATIONS_LIVE = Gauge('rag_conversations_live', 'Conversations held in the in-process store')
+CONVERSATION_BYTES = Gauge('rag_conversation_bytes', 'Bytes of history held in the in-process store')
@@ -1,15 +1,37 @@
 """RAG Service implementation."""
+import asyncio
+import io
+import time
 import uuid
 import logging
-from typing import Optional
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, BinaryIO, Callable, Optional, Union
 
-from azure.search.documents import SearchClient
-from azure.search.documents.models import VectorizedQuery
-from azure.core.credentials import AzureKeyCredential
-from openai import AzureOpenAI
+import httpx
+
+from .batching import EmbeddingBatcher
+from .context import ContextAssembler
+from .conversations import ConversationStore, InMemoryConversationStore
+from .endpoints import OpenAIEndpoint, OpenAIEndpointPool
+from .ingestion import IngestionPipeline, IngestionResult
+from .manifest import ManifestStore
+from .metrics import CONTEXT_CHUNKS_DROPPED, PROMPT_TOKENS, PROMPT_TOKENS_SAVED, RERANK_LATENCY, TOKEN_USAGE
+from .retrieval import AzureSearchRetriever, Retriever, reciprocal_rank_fusion
+from .telemetry import record_usage, stage
+
+if TYPE_CHECKING:
+    from azure.core.pipeline.transport import AsyncHttpTransport
+
+    from .embedding_cache import EmbeddingCache
+    from .reranking import Reranker
+    from .semantic_cache import SemanticCache
 
 logger = logging.getLogger(__name__)
 
+SYSTEM_PROMPT = """You are a helpful assistant that answers questions based on the provided context.
+Always cite your sources using [1], [2], etc. when referencing information from the context.
+If you cannot find the answer in the context, say so clearly.
+Be concise and accurate."""
+
 
 class RAGService:
     """Retrieval-Augmented Generation service."""
@@ -22,22 +44,94 @@ class RAGService:
         search_endpoint: str,
         search_key: str,
         search_index: str,
+        embedding_deployment: str = "text-embedding-3-large",
+        api_version: str = "2024-02-15-preview",
+        http_client: Optional[httpx.AsyncClient] = None,
+        search_transport: Optional["AsyncHttpTransport"] = None,
+        retriever: Optional[Retriever] = None,
+        openai_pool: Optional[OpenAIEndpointPool] = None,
+        search_mode: str = "hybrid",
+        top_k: int = 5,
+        rrf_k: int = 60,
+        reranker: Optional["Reranker"] = None,
+        rerank_candidates: int = 50,
+        embedding_batch_window_ms: float = 5.0,
+        embedding_batch_max_inputs: int = 64,
+        embedding_cache: Optional["EmbeddingCache"] = None,
+        semantic_cache: Optional["SemanticCache"] = None,
+        conversation_store: Optional[ConversationStore] = None,
+        manifest_store: Optional[ManifestStore] = None,
+        context_assembler: Optional[ContextAssembler] = None,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        embedding_batch_size: int = 16,
+        upload_batch_size: int = 100,
     ):
-        """Initialize RAG service."""
-        self.openai_client = AzureOpenAI(
-            azure_endpoint=openai_endpoint,
-            api_key=openai_key,
-            api_version="2024-02-15-preview",
-        )
-        self.openai_deployment = openai_deployment
+        """Initialize RAG service.
 
-        self.search_client = SearchClient(
-            endpoint=search_endpoint,
-            index_name=search_index,
-            credential=AzureKeyCredential(search_key),
-        )
+        Pass `http_client` and `search_transport` to share connection pools
+        owned by the caller; otherwise each client opens its own. Pass a
+        `retriever` to search a different index than Azure AI Search, such
+        as the local in-process index.
+
+        Pass an `openai_pool` to balance Azure OpenAI calls over several
+        endpoints, each with its own concurrency limits; otherwise all calls
+        go to `openai_endpoint`.
+
+        `search_mode` is either "hybrid", which embeds the query and then runs
+        a single hybrid query, or "pipelined", which runs the keyword query
+        while the embedding is computed and fuses both result lists.
+
+        With a `reranker`, retrieval over-fetches `rerank_candidates` results
+        and the reranker keeps the best `top_k`.
+
+        Query embeddings from concurrent chats are sent together when they
+        arrive within `embedding_batch_window_ms`; 0 sends each on its own.
+        """
+        if search_mode not in ("hybrid", "pipelined"):
+            raise ValueError(f"Unknown search mode: {search_mode}")
+
+        if openai_pool is None:
+            openai_pool = OpenAIEndpointPool(
+                [OpenAIEndpoint("default", openai_endpoint, openai_key, openai_deployment, embedding_deployment)],
+                api_version=api_version,
+                http_client=http_client,
+            )
+        self.openai_pool = openai_pool
+        self.embedding_deployment = embedding_deployment
+
+        if retriever is None:
+            retriever = AzureSearchRetriever.connect(search_endpoint, search_index, search_key, transport=search_transport)
+        self.retriever = retriever
+
+        self.search_mode = search_mode
+        self.top_k = top_k
+        self.rrf_k = rrf_k
+        self.reranker = reranker
+        self.rerank_candidates = max(rerank_candidates, top_k)
+        self.embedding_cache = embedding_cache
+        self.embedding_batcher = None
+        if embedding_batch_window_ms > 0:
+            self.embedding_batcher = EmbeddingBatcher(
+                self._embed_texts,
+                max_batch_size=embedding_batch_max_inputs,
+                max_wait_ms=embedding_batch_window_ms,
+            )
+        self.semantic_cache = semantic_cache
 
-        self.conversations: dict = {}
+        self.conversations = conversation_store or InMemoryConversationStore()
+        self.context_assembler = context_assembler or ContextAssembler()
+
+        self.manifests = manifest_store
+        self.ingestion = IngestionPipeline(
+            self.openai_pool,
+            self.retriever,
+            manifests=manifest_store,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            embedding_batch_size=embedding_batch_size,
+            upload_batch_size=upload_batch_size,
+        )
 
     async def chat(
         self,
@@ -46,29 +140,37 @@ class RAGService:
     ) -> dict:
         """Process a chat query with RAG."""
         # Get or create conversation
-        if conversation_id is None:
-            conversation_id = str(uuid.uuid4())
-            self.conversations[conversation_id] = []
-
-        history = self.conversations.get(conversation_id, [])
-
-        # Generate embedding for query
-        embedding = await self._get_embedding(query)
+        history = await self._load_history(conversation_id)
+        conversation_id = conversation_id or str(uuid.uuid4())
 
         # Search for relevant documents
-        results = self._search_documents(embedding, query)
+        embedding, results = await self._retrieve(query)
+
+        # Answers depend on the conversation, so only first turns are cached
+        use_semantic_cache = self.semantic_cache is not None and not history
+        cached = self.semantic_cache.lookup(embedding) if use_semantic_cache else None
 
-        # Build context from search results
-        context = self._build_context(results)
-        sources = [{"id": r["id"], "title": r.get("title", ""), "score": r["@search.score"]} for r in results]
+        if cached is not None:
+            answer, sources = cached.answer, cached.sources
+        else:
+            # Pack search results and history into the prompt budget
+            messages, _ = self._assemble_messages(query, results, history)
+            sources = self._sources(results)
 
-        # Generate response
-        answer = await self._generate_response(query, context, history)
+            # Generate response
+            start = time.perf_counter()
+            answer = await self._generate_response(messages)
+            if use_semantic_cache:
+                self.semantic_cache.put(
+                    embedding,
+                    answer,
+                    sources,
+                    document_ids=self._cited_document_ids(results),
+                    generation_seconds=time.perf_counter() - start,
+                )
 
         # Update conversation history
-        history.append({"role": "user", "content": query})
-        history.append({"role": "assistant", "content": answer})
-        self.conversations[conversation_id] = history[-10:]  # Keep last 10 messages
+        await self._update_history(conversation_id, history, query, answer)
 
         return {
             "answer": answer,
@@ -76,72 +178,266 @@ class RAGService:
             "conversation_id": conversation_id,
         }
 
+    async def chat_stream(
+        self,
+        query: str,
+        conversation_id: Optional[str] = None,
+    ) -> AsyncIterator[dict]:
+        """Process a chat query with RAG, yielding events as they are ready.
+
+        Yields a "sources" event once retrieval finishes, a "token" event for
+        each piece of answer text from the model, then a "done" event.
+        """
+        history = await self._load_history(conversation_id)
+        conversation_id = conversation_id or str(uuid.uuid4())
+        embedding, results = await self._retrieve(query)
+
+        use_semantic_cache = self.semantic_cache is not None and not history
+        cached = self.semantic_cache.lookup(embedding) if use_semantic_cache else None
+
+        if cached is not None:
+            yield {"event": "sources", "sources": cached.sources, "conversation_id": conversation_id}
+            yield {"event": "token", "content": cached.answer}
+            answer = cached.answer
+        else:
+            sources = self._sources(results)
+            yield {"event": "sources", "sources": sources, "conversation_id": conversation_id}
+
+            messages, prompt_tokens = self._assemble_messages(query, results, history)
+            parts = []
+            usage = None
+            start = time.perf_counter()
+            with stage("generate", streaming=True):
+                # The endpoint's limiter slot is held until the response starts streaming
+                stream = await self.openai_pool.chat_completion(
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=1000,
+                    stream=True,
+                )
+                async for chunk in stream:
+                    # Usage only arrives when the API version sends it on the last chunk
+                    usage = getattr(chunk, "usage", None) or usage
+                    # Azure sends a leading chunk with content filter results and no choices
+                    if not chunk.choices or not chunk.choices[0].delta.content:
+                        continue
+                    parts.append(chunk.choices[0].delta.content)
+                    yield {"event": "token", "content": parts[-1]}
+
+                if usage is not None:
+                    record_usage("chat", usage)
+                else:
+                    # Estimate from the assembled prompt and one token per streamed delta
+                    TOKEN_USAGE.labels(operation="chat", type="prompt").inc(prompt_tokens)
+                    TOKEN_USAGE.labels(operation="chat", type="completion").inc(len(parts))
+
+            answer = "".join(parts)
+            if use_semantic_cache:
+                self.semantic_cache.put(
+                    embedding,
+                    answer,
+                    sources,
+                    document_ids=self._cited_document_ids(results),
+                    generation_seconds=time.perf_counter() - start,
+                )
+
+        await self._update_history(conversation_id, history, query, answer)
+        yield {"event": "done", "conversation_id": conversation_id}
+
+    async def _retrieve(self, query: str) -> tuple[list[float], list]:
+        """Embed the query, search for relevant documents and rerank them."""
+        fetch_k = self.rerank_candidates if self.reranker is not None else self.top_k
+        if self.search_mode == "pipelined":
+            embedding, results = await self._pipelined_search(query, fetch_k)
+        else:
+            embedding = await self._get_embedding(query)
+            results = await self._search_documents(embedding, query, fetch_k)
+
+        if self.reranker is not None:
+            histogram = RERANK_LATENCY.labels(reranker=self.reranker.name)
+            with stage("rerank", histogram=histogram, candidates=len(results)):
+                results = await self.reranker.rerank(query, results, self.top_k)
+        return embedding, results
+
+    async def _load_history(self, conversation_id: Optional[str]) -> list:
+        """Return the stored history of a conversation."""
+        if conversation_id is None:
+            return []
+        return await self.conversations.get(conversation_id)
+
+    async def _update_history(self, conversation_id: str, history: list, query: str, answer: str) -> None:
+        """Append a turn to the conversation history."""
+        with stage("history"):
+            await self.conversations.append(
+                conversation_id,
+                history,
+                {"role": "user", "content": query},
+                {"role": "assistant", "content": answer},
+            )
+
     async def _get_embedding(self, text: str) -> list[float]:
-        """Generate embedding for text."""
-        response = self.openai_client.embeddings.create(
-            model="text-embedding-3-large",
-            input=text,
-        )
-        return response.data[0].embedding
-
-    def _search_documents(self, embedding: list[float], query: str, top_k: int = 5) -> list:
-        """Search for relevant documents."""
-        vector_query = VectorizedQuery(
-            vector=embedding,
-            k_nearest_neighbors=top_k,
-            fields="content_vector",
-        )
+        """Generate embedding for text, served from the cache when possible."""
+        with stage("embed") as span:
+            if self.embedding_cache is not None:
+                cached = self.embedding_cache.get(text, self.embedding_deployment)
+                span.set_attribute("rag.embedding_cache_hit", cached is not None)
+                if cached is not None:
+                    return cached.tolist()
 
-        results = self.search_client.search(
-            search_text=query,
-            vector_queries=[vector_query],
-            select=["id", "title", "content", "source"],
-            top=top_k,
-        )
+            if self.embedding_batcher is not None:
+                embedding = await self.embedding_batcher.embed(text)
+            else:
+                embedding = (await self._embed_texts([text]))[0]
+
+            if self.embedding_cache is not None:
+                self.embedding_cache.put(text, self.embedding_deployment, embedding)
+            return embedding
+
+    async def _embed_texts(self, texts: list[str]) -> list[list[float]]:
+        """Embed several texts with one API call."""
+        with stage("embed_request", inputs=len(texts)):
+            response = await self.openai_pool.embeddings(input=texts)
+            record_usage("embedding", response.usage)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    async def _search_documents(self, embedding: list[float], query: str, top_k: int = 5) -> list:
+        """Search for relevant documents with a single hybrid query."""
+        with stage("search", top_k=top_k):
+            return await self._search(query, embedding, top_k)
+
+    async def _pipelined_search(self, query: str, top_k: int = 5) -> tuple[list[float], list]:
+        """Overlap the keyword query with the embedding call.
+
+        The BM25 half of hybrid search does not need the query vector, so it
+        starts immediately. The vector query follows the embedding, and both
+        result lists are merged with reciprocal-rank fusion. Returns the query
+        embedding and the fused results.
+        """
+        keyword_task = asyncio.create_task(self._keyword_search(query, top_k))
+        try:
+            embedding = await self._get_embedding(query)
+            with stage("vector_search", top_k=top_k):
+                vector_results = await self._search(None, embedding, top_k)
+            keyword_results = await keyword_task
+        except BaseException:
+            keyword_task.cancel()
+            raise
+
+        with stage("fuse"):
+            results = reciprocal_rank_fusion([keyword_results, vector_results], k=self.rrf_k, top_k=top_k)
+        return embedding, results
 
-        return list(results)
+    async def _keyword_search(self, query: str, top_k: int) -> list:
+        """Run the keyword-only half of hybrid search."""
+        with stage("keyword_search", top_k=top_k):
+            return await self._search(query, None, top_k)
 
-    def _build_context(self, results: list) -> str:
-        """Build context string from search results."""
-        context_parts = []
-        for i, result in enumerate(results, 1):
-            content = result.get("content", "")
-            title = result.get("title", f"Document {i}")
-            context_parts.append(f"[{i}] {title}:\n{content}\n")
-        return "\n".join(context_parts)
+    async def _search(self, search_text: Optional[str], embedding: Optional[list[float]], top_k: int) -> list:
+        """Query the search index with text, a vector, or both."""
+        return await self.retriever.search(search_text, embedding, top_k)
 
-    async def _generate_response(self, query: str, context: str, history: list) -> str:
+    @staticmethod
+    def _cited_document_ids(results: list) -> set[str]:
+        """Return the chunk ids and source documents behind an answer."""
+        document_ids = {r["id"] for r in results}
+        document_ids.update(r["source"] for r in results if r.get("source"))
+        return document_ids
+
+    @staticmethod
+    def _sources(results: list) -> list[dict]:
+        """Return the source citations for search results."""
+        sources = []
+        for r in results:
+            source = {"id": r["id"], "title": r.get("title", ""), "score": r["@search.score"]}
+            if "@search.reranker_score" in r:
+                source["reranker_score"] = r["@search.reranker_score"]
+            sources.append(source)
+        return sources
+
+    def _assemble_messages(self, query: str, results: list, history: list) -> tuple[list[dict], int]:
+        """Build the chat messages within the prompt token budget.
+
+        Returns the messages and their estimated prompt tokens.
+        """
+        with stage("context", results=len(results)) as span:
+            prompt = self.context_assembler.assemble(SYSTEM_PROMPT, query, results, history)
+            span.set_attribute("rag.prompt_tokens", prompt.prompt_tokens)
+            span.set_attribute("rag.chunks_used", prompt.chunks_used)
+        PROMPT_TOKENS.observe(prompt.prompt_tokens)
+        PROMPT_TOKENS_SAVED.observe(prompt.tokens_saved)
+        CONTEXT_CHUNKS_DROPPED.labels(reason="duplicate").inc(prompt.duplicates_dropped)
+        CONTEXT_CHUNKS_DROPPED.labels(reason="budget").inc(prompt.over_budget_dropped)
+        return self._build_messages(query, prompt.context, prompt.history), prompt.prompt_tokens
+
+    async def _generate_response(self, messages: list[dict]) -> str:
         """Generate response using OpenAI."""
-        system_prompt = """You are a helpful assistant that answers questions based on the provided context.
-Always cite your sources using [1], [2], etc. when referencing information from the context.
-If you cannot find the answer in the context, say so clearly.
-Be concise and accurate."""
+        with stage("generate", streaming=False):
+            response = await self.openai_pool.chat_completion(
+                messages=messages,
+                temperature=0.7,
+                max_tokens=1000,
+            )
+            record_usage("chat", response.usage)
 
+        return response.choices[0].message.content
+
+    @staticmethod
+    def _build_messages(query: str, context: str, history: list) -> list[dict]:
+        """Build the chat completion messages."""
         messages = [
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": f"Context:\n{context}\n\nQuestion: {query}"},
         ]
 
-        # Add conversation history
-        for msg in history[-4:]:  # Last 4 messages for context
+        # Add conversation history, already trimmed to its budget
+        for msg in history:
             messages.insert(-1, msg)
 
-        response = self.openai_client.chat.completions.create(
-            model=self.openai_deployment,
-            messages=messages,
-            temperature=0.7,
-            max_tokens=1000,
-        )
+        return messages
 
-        return response.choices[0].message.content
+    async def index_document(
+        self,
+        filename: str,
+        content: Union[bytes, BinaryIO],
+        content_type: Optional[str] = None,
+        on_progress: Optional[Callable[[int], Awaitable[None]]] = None,
+    ) -> IngestionResult:
+        """Index a document for RAG, re-embedding only changed chunks.
 
-    async def index_document(self, filename: str, content: bytes, content_type: str) -> None:
-        """Index a document for RAG."""
-        # TODO: Implement document processing and indexing
+        `content` may be a file object, which is read incrementally, so large
+        uploads never need to be held in memory.
+        """
         logger.info(f"Indexing document: {filename}")
-        pass
+        file = io.BytesIO(content) if isinstance(content, bytes) else content
+        result = await self.ingestion.run(filename, file, content_type, on_progress=on_progress)
+        if result.changed:
+            self.invalidate_documents([filename])
+        return result
+
+    def invalidate_documents(self, document_ids: list[str]) -> None:
+        """Drop cached answers that cite re-indexed documents."""
+        if self.semantic_cache is not None:
+            dropped = self.semantic_cache.invalidate(document_ids)
+            if dropped:
+                logger.info(f"Invalidated {dropped} cached answers")
 
     async def list_documents(self) -> list[dict]:
-        """List indexed documents."""
-        # TODO: Implement document listing
-        return []
+        """List indexed documents with their manifest versions."""
+        if self.manifests is None:
+            return []
+        return [manifest.summary() for manifest in await self.manifests.list()]
+
+    async def close(self) -> None:
+        """Close the Azure clients.
+
+        Shared connection pools are left open for their owner to close.
+        """
+        if self.embedding_batcher is not None:
+            await self.embedding_batcher.close()
+        await self.retriever.close()
+        await self.openai_pool.close()
+        if self.embedding_cache is not None:
+            self.embedding_cache.close()
+        await self.conversations.close()
+        if self.manifests is not None:
+            await self.manifests.close()
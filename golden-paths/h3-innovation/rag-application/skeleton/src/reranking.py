@@ -0,0 +1,152 @@
+"""Re-ranking of over-fetched retrieval candidates.
+
+Retrieval fetches more candidates than the prompt needs and a reranker
+scores them against the query, so the few chunks that reach the prompt
+are the best of a wider pool. Scorers are pluggable: the local scorer
+combines BM25 over the candidate set with the retrieval score and needs no
+network call, while the LLM scorer asks a chat deployment to grade the
+passages. Scores are written to `@search.reranker_score`, the field Azure
+AI Search uses for its own semantic ranker.
+"""
+import asyncio
+import json
+import logging
+from collections import Counter
+from typing import Optional
+
+import numpy as np
+
+from .local_index import tokenize
+from .telemetry import record_usage
+
+logger = logging.getLogger(__name__)
+
+
+class Reranker:
+    """Interface for candidate scorers."""
+
+    name = "base"
+
+    async def score(self, query: str, candidates: list[dict]) -> np.ndarray:
+        """Return one relevance score per candidate, higher is better."""
+        raise NotImplementedError
+
+    async def rerank(self, query: str, candidates: list[dict], top_k: int) -> list[dict]:
+        """Return the `top_k` candidates by reranker score."""
+        if not candidates:
+            return []
+        scores = np.asarray(await self.score(query, candidates), dtype=np.float64)
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return [{**candidates[i], "@search.reranker_score": float(scores[i])} for i in order]
+
+
+def _min_max(values: np.ndarray) -> np.ndarray:
+    spread = values.max() - values.min()
+    return (values - values.min()) / spread if spread > 0 else np.ones_like(values)
+
+
+def _retrieval_scores(candidates: list[dict]) -> np.ndarray:
+    return np.array([c.get("@search.score") or 0.0 for c in candidates], dtype=np.float64)
+
+
+class LocalReranker(Reranker):
+    """BM25 over the candidate set blended with the retrieval score.
+
+    Term frequencies of all candidates form one matrix, so the whole set is
+    scored with a handful of array operations.
+    """
+
+    name = "local"
+
+    def __init__(self, lexical_weight: float = 0.5, k1: float = 1.2, b: float = 0.75):
+        """Initialize the scorer. The retrieval score gets `1 - lexical_weight`."""
+        self.lexical_weight = lexical_weight
+        self.k1 = k1
+        self.b = b
+
+    async def score(self, query: str, candidates: list[dict]) -> np.ndarray:
+        return await asyncio.to_thread(self._score, query, candidates)
+
+    def _score(self, query: str, candidates: list[dict]) -> np.ndarray:
+        terms = sorted(set(tokenize(query)))
+        retrieval = _min_max(_retrieval_scores(candidates))
+        if not terms:
+            return retrieval
+
+        counts = [Counter(tokenize(c.get("content", ""))) for c in candidates]
+        frequencies = np.array([[doc[t] for t in terms] for doc in counts], dtype=np.float64)
+        lengths = np.array([sum(doc.values()) for doc in counts], dtype=np.float64)
+
+        document_frequency = (frequencies > 0).sum(axis=0)
+        idf = np.log(1 + (len(candidates) - document_frequency + 0.5) / (document_frequency + 0.5))
+        norm = self.k1 * (1 - self.b + self.b * lengths / max(lengths.mean(), 1.0))
+        bm25 = (idf * frequencies * (self.k1 + 1) / (frequencies + norm[:, None])).sum(axis=1)
+
+        return self.lexical_weight * _min_max(bm25) + (1 - self.lexical_weight) * retrieval
+
+
+class LLMReranker(Reranker):
+    """Grade passages with a chat deployment, several passages per call.
+
+    Batches are sent concurrently through the same endpoint pool as chat,
+    so grading calls share its adaptive limits and failover. Passages in a
+    batch whose call is shed or fails, or whose reply cannot be parsed, rank
+    below the graded ones, in retrieval order.
+    """
+
+    name = "llm"
+
+    SYSTEM_PROMPT = (
+        "Rate how well each passage helps answer the question, from 0 (irrelevant) to 10 (answers it). "
+        'Reply only with JSON: {"scores": [...]}, one number per passage, in order.'
+    )
+
+    def __init__(
+        self,
+        openai_pool,
+        deployment: Optional[str] = None,
+        batch_size: int = 20,
+        max_passage_chars: int = 1200,
+    ):
+        """Initialize the scorer with an `OpenAIEndpointPool`.
+
+        `deployment` defaults to each endpoint's chat deployment.
+        """
+        self.openai_pool = openai_pool
+        self.deployment = deployment
+        self.batch_size = batch_size
+        self.max_passage_chars = max_passage_chars
+
+    async def score(self, query: str, candidates: list[dict]) -> np.ndarray:
+        batches = [candidates[i:i + self.batch_size] for i in range(0, len(candidates), self.batch_size)]
+        grades = await asyncio.gather(*(self._grade(query, batch) for batch in batches))
+        # The retrieval score only breaks ties between equal grades
+        scores = _min_max(_retrieval_scores(candidates)) * 1e-3
+        for start, batch_grades in zip(range(0, len(candidates), self.batch_size), grades):
+            if batch_grades is not None:
+                scores[start:start + len(batch_grades)] += batch_grades / 10
+        return scores
+
+    async def _grade(self, query: str, batch: list[dict]) -> Optional[np.ndarray]:
+        passages = "\n\n".join(
+            f"[{i}] {c.get('content', '')[:self.max_passage_chars]}" for i, c in enumerate(batch, 1)
+        )
+        try:
+            response = await self.openai_pool.chat_completion(
+                deployment=self.deployment,
+                messages=[
+                    {"role": "system", "content": self.SYSTEM_PROMPT},
+                    {"role": "user", "content": f"Question: {query}\n\nPassages:\n{passages}"},
+                ],
+                temperature=0,
+                max_tokens=8 * len(batch) + 20,
+            )
+            record_usage("rerank", response.usage)
+            content = response.choices[0].message.content or ""
+            grades = json.loads(content[content.index("{"):content.rindex("}") + 1])["scores"]
+            if len(grades) != len(batch):
+                raise ValueError(f"expected {len(batch)} scores, got {len(grades)}")
+            return np.asarray(grades, dtype=np.float64)
+        except Exception as e:
+            logger.warning(f"LLM rerank of {len(batch)} passages failed, keeping retrieval order: {e}")
+            return None
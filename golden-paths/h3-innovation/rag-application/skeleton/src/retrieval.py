@@ -0,0 +1,131 @@
+"""Retrievers and helpers shared by the RAG search modes.
+
+A retriever owns the chunk index: it answers keyword, vector and hybrid
+queries and applies the writes made by ingestion. Results are dicts with
+`id`, `title`, `content`, `source` and `@search.score`, the shape Azure AI
+Search returns, whichever backend produced them.
+"""
+import logging
+from typing import TYPE_CHECKING, Any, Iterable, Optional
+
+if TYPE_CHECKING:
+    from azure.search.documents.aio import SearchClient
+
+logger = logging.getLogger(__name__)
+
+
+def reciprocal_rank_fusion(
+    result_lists: Iterable[list[dict]],
+    k: int = 60,
+    top_k: Optional[int] = None,
+) -> list[dict]:
+    """Merge ranked result lists with reciprocal-rank fusion.
+
+    Each document scores `sum(1 / (k + rank))` over the lists it appears in.
+    The fused score replaces `@search.score` so callers see the same result
+    shape as a single Azure AI Search query.
+    """
+    scores: dict[str, float] = {}
+    documents: dict[str, dict] = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, 1):
+            doc_id = result["id"]
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+            documents.setdefault(doc_id, result)
+
+    ranked = sorted(scores, key=scores.__getitem__, reverse=True)
+    if top_k is not None:
+        ranked = ranked[:top_k]
+    return [{**documents[doc_id], "@search.score": scores[doc_id]} for doc_id in ranked]
+
+
+class Retriever:
+    """Interface for chunk index backends."""
+
+    async def search(self, search_text: Optional[str], embedding: Optional[list[float]], top_k: int) -> list[dict]:
+        """Query with text, a vector, or both (hybrid)."""
+        raise NotImplementedError
+
+    async def upsert(self, documents: list[dict]) -> None:
+        """Insert or replace chunk documents, including their `content_vector`."""
+        raise NotImplementedError
+
+    async def delete(self, chunk_ids: list[str]) -> None:
+        """Remove chunk documents by id."""
+        raise NotImplementedError
+
+    async def chunks_for_source(self, source: str) -> list[dict]:
+        """Return the `id` and `content` of every chunk of a document."""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """Release backend resources."""
+
+
+class AzureSearchRetriever(Retriever):
+    """Retriever backed by an Azure AI Search index."""
+
+    def __init__(self, search_client: "SearchClient"):
+        """Initialize the retriever with an async search client."""
+        self.search_client = search_client
+
+    @classmethod
+    def connect(cls, endpoint: str, index_name: str, api_key: str, transport: Optional[Any] = None) -> "AzureSearchRetriever":
+        """Create a retriever with its own search client.
+
+        The Azure Search SDK is imported here, so services on the local
+        retriever never load it.
+        """
+        from azure.core.credentials import AzureKeyCredential
+        from azure.search.documents.aio import SearchClient
+
+        search_kwargs = {"transport": transport} if transport is not None else {}
+        return cls(SearchClient(
+            endpoint=endpoint,
+            index_name=index_name,
+            credential=AzureKeyCredential(api_key),
+            **search_kwargs,
+        ))
+
+    async def search(self, search_text: Optional[str], embedding: Optional[list[float]], top_k: int) -> list[dict]:
+        from azure.search.documents.models import VectorizedQuery
+
+        vector_queries = None
+        if embedding is not None:
+            vector_queries = [
+                VectorizedQuery(
+                    vector=embedding,
+                    k_nearest_neighbors=top_k,
+                    fields="content_vector",
+                )
+            ]
+
+        results = await self.search_client.search(
+            search_text=search_text,
+            vector_queries=vector_queries,
+            select=["id", "title", "content", "source"],
+            top=top_k,
+        )
+
+        return [result async for result in results]
+
+    async def upsert(self, documents: list[dict]) -> None:
+        results = await self.search_client.merge_or_upload_documents(documents=documents)
+        failed = [r.key for r in results if not r.succeeded]
+        if failed:
+            raise RuntimeError(f"Failed to index {len(failed)} chunks, first: {failed[0]}")
+
+    async def delete(self, chunk_ids: list[str]) -> None:
+        await self.search_client.delete_documents(documents=[{"id": chunk_id} for chunk_id in chunk_ids])
+
+    async def chunks_for_source(self, source: str) -> list[dict]:
+        escaped = source.replace("'", "''")
+        results = await self.search_client.search(
+            search_text="*",
+            filter=f"source eq '{escaped}'",
+            select=["id", "content"],
+        )
+        return [result async for result in results]
+
+    async def close(self) -> None:
+        await self.search_client.close()
@@ -0,0 +1,145 @@
+"""Semantic answer cache keyed by query-embedding similarity.
+
+Answers are stored next to the unit-normalized embedding of the query that
+produced them. A lookup is a single matrix-vector product over all cached
+embeddings; expired entries are evicted first, and the best remaining match
+is returned when its cosine similarity reaches the configured threshold.
+
+The cache is keyed on the question alone and lives in one process: any
+caller asking a similar question gets the same answer, and only ingestion
+in this process invalidates it. It is off by default.
+"""
+import time
+from dataclasses import dataclass, field
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+from .metrics import SEMANTIC_CACHE_LATENCY_SAVED, SEMANTIC_CACHE_LOOKUPS
+
+
+@dataclass
+class CachedAnswer:
+    """A generated answer and the sources it cites."""
+
+    answer: str
+    sources: list[dict]
+    document_ids: frozenset[str]
+    generation_seconds: float
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class SemanticCache:
+    """Nearest-neighbour cache of answers over a NumPy embedding matrix."""
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 1000, ttl_seconds: float = 3600.0):
+        """Initialize the cache. The matrix is allocated on first insert."""
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._vectors: Optional[np.ndarray] = None
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._created = np.zeros(max_entries, dtype=np.float64)
+        self._entries: list[Optional[CachedAnswer]] = [None] * max_entries
+        self._slots_by_document: dict[str, set[int]] = {}
+
+    def __len__(self) -> int:
+        return int(self._valid.sum())
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding: Sequence[float]) -> Optional[CachedAnswer]:
+        """Return the cached answer for the most similar query, or None."""
+        if self._vectors is None or not self._valid.any():
+            SEMANTIC_CACHE_LOOKUPS.labels(result="miss").inc()
+            return None
+
+        query = self._normalize(embedding)
+        if query.shape[0] != self._vectors.shape[1]:
+            SEMANTIC_CACHE_LOOKUPS.labels(result="miss").inc()
+            return None
+
+        expired = self._valid & (time.monotonic() - self._created > self.ttl_seconds)
+        for slot in np.flatnonzero(expired):
+            self._evict(int(slot))
+        if not self._valid.any():
+            SEMANTIC_CACHE_LOOKUPS.labels(result="miss").inc()
+            return None
+
+        scores = self._vectors @ query
+        scores[~self._valid] = -np.inf
+        slot = int(np.argmax(scores))
+        entry = self._entries[slot]
+
+        if entry is None or scores[slot] < self.threshold:
+            SEMANTIC_CACHE_LOOKUPS.labels(result="miss").inc()
+            return None
+
+        SEMANTIC_CACHE_LOOKUPS.labels(result="hit").inc()
+        SEMANTIC_CACHE_LATENCY_SAVED.inc(entry.generation_seconds)
+        return entry
+
+    def put(
+        self,
+        embedding: Sequence[float],
+        answer: str,
+        sources: list[dict],
+        document_ids: Iterable[str],
+        generation_seconds: float = 0.0,
+    ) -> None:
+        """Cache an answer for the query with this embedding."""
+        vector = self._normalize(embedding)
+        if self._vectors is None:
+            self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+        elif vector.shape[0] != self._vectors.shape[1]:
+            return
+
+        free = np.flatnonzero(~self._valid)
+        slot = int(free[0]) if len(free) else int(np.argmin(self._created))
+        if self._valid[slot]:
+            self._evict(slot)
+
+        entry = CachedAnswer(
+            answer=answer,
+            sources=sources,
+            document_ids=frozenset(document_ids),
+            generation_seconds=generation_seconds,
+        )
+        self._vectors[slot] = vector
+        self._valid[slot] = True
+        self._created[slot] = entry.created_at
+        self._entries[slot] = entry
+        for document_id in entry.document_ids:
+            self._slots_by_document.setdefault(document_id, set()).add(slot)
+
+    def invalidate(self, document_ids: Iterable[str]) -> int:
+        """Drop every answer that cites one of `document_ids`."""
+        slots: set[int] = set()
+        for document_id in document_ids:
+            slots |= self._slots_by_document.get(document_id, set())
+        for slot in slots:
+            self._evict(slot)
+        return len(slots)
+
+    def clear(self) -> None:
+        """Drop all cached answers."""
+        for slot in np.flatnonzero(self._valid):
+            self._evict(int(slot))
+
+    def _evict(self, slot: int) -> None:
+        entry = self._entries[slot]
+        if entry is not None:
+            for document_id in entry.document_ids:
+                slots = self._slots_by_document.get(document_id)
+                if slots is not None:
+                    slots.discard(slot)
+                    if not slots:
+                        del self._slots_by_document[document_id]
+        self._entries[slot] = None
+        self._valid[slot] = False
+        self._created[slot] = 0.0
@@ -0,0 +1,82 @@
+"""Tracing and per-stage timing for the RAG request lifecycle.
+
+Every pipeline stage runs inside `stage()`, which opens an OpenTelemetry
+span and records the stage duration in a Prometheus histogram. Without a
+configured tracer provider the spans are no-ops. With one, traces are
+sampled at `sample_ratio`, and histogram observations made inside a
+sampled trace carry its trace id as an exemplar, so a slow bucket in
+Grafana links straight to a trace.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from opentelemetry import trace
+
+from .metrics import STAGE_LATENCY, TOKEN_USAGE
+
+logger = logging.getLogger(__name__)
+
+tracer = trace.get_tracer("rag")
+
+
+def configure_tracing(service_name: str, sample_ratio: float = 0.05, otlp_endpoint: str = "") -> None:
+    """Install a sampled tracer provider, exporting over OTLP/HTTP if an endpoint is set.
+
+    Sampling follows the parent span, so a trace started upstream keeps its
+    decision across services.
+    """
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name}),
+        sampler=ParentBased(TraceIdRatioBased(sample_ratio)),
+    )
+    if otlp_endpoint:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=otlp_endpoint)))
+    trace.set_tracer_provider(provider)
+    logger.info(f"Tracing enabled, sampling {sample_ratio:.0%} of traces")
+
+
+def trace_exemplar() -> Optional[dict]:
+    """Return an exemplar for the current trace, if it is sampled."""
+    context = trace.get_current_span().get_span_context()
+    if context.is_valid and context.trace_flags.sampled:
+        return {"trace_id": format(context.trace_id, "032x")}
+    return None
+
+
+@contextmanager
+def stage(name: str, histogram=None, **attributes) -> Iterator[trace.Span]:
+    """Run a pipeline stage in a span and time it.
+
+    The duration goes to `histogram`, a labelled histogram child, or to
+    `rag_stage_latency_seconds{stage=name}` by default.
+    """
+    with tracer.start_as_current_span(f"rag.{name}", attributes=attributes) as span:
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            child = histogram if histogram is not None else STAGE_LATENCY.labels(stage=name)
+            child.observe(time.perf_counter() - start, exemplar=trace_exemplar())
+
+
+def record_usage(operation: str, usage) -> None:
+    """Count the tokens reported in an OpenAI `usage` object."""
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    TOKEN_USAGE.labels(operation=operation, type="prompt").inc(prompt_tokens)
+    if completion_tokens:
+        TOKEN_USAGE.labels(operation=operation, type="completion").inc(completion_tokens)
+    span = trace.get_current_span()
+    span.set_attribute("llm.usage.prompt_tokens", prompt_tokens)
+    span.set_attribute("llm.usage.completion_tokens", completion_tokens)